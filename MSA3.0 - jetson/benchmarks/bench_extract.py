@@ -0,0 +1,106 @@
+"""Per-message cost of pulling total_flight_time out of OSD payloads.
+
+Usage:
+    python -m benchmarks.bench_extract [--n 20000] [--rounds 5] [--json]
+
+Compares the old path (json.loads of the decoded payload, then a recursive walk)
+against TotalFlightTimeExtractor on aircraft OSD (field present) and dock/RC OSD
+(field absent) samples. Cases run interleaved for ``--rounds`` rounds and the
+best round is reported, so run order and machine noise do not favour one case.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Callable
+
+from msa3_flytime.extract import TotalFlightTimeExtractor, _orjson, stdlib_loads
+
+from .samples import AIRCRAFT_OSD, DOCK_OSD, RC_OSD, encode
+
+
+def _legacy_find(payload: Any) -> float | None:
+    # Pre-extractor implementation, kept here as the baseline.
+    if payload is None:
+        return None
+    if isinstance(payload, (int, float)):
+        return float(payload)
+    if isinstance(payload, dict):
+        if "total_flight_time" in payload and isinstance(payload["total_flight_time"], (int, float)):
+            return float(payload["total_flight_time"])
+        for key in ("data", "osd", "state", "payload"):
+            if key in payload:
+                v = _legacy_find(payload.get(key))
+                if v is not None:
+                    return v
+        for _, v in list(payload.items())[:50]:
+            vv = _legacy_find(v)
+            if vv is not None:
+                return vv
+    if isinstance(payload, list):
+        for item in payload[:50]:
+            v = _legacy_find(item)
+            if v is not None:
+                return v
+    return None
+
+
+def _legacy(_sn: str, raw: bytes) -> float | None:
+    text = raw.decode("utf-8", errors="ignore")
+    return _legacy_find(json.loads(text) if text else None)
+
+
+def _time_per_msg(fn: Callable[[str, bytes], Any], payloads: list[tuple[str, bytes]], n: int) -> float:
+    count = len(payloads)
+    t0 = time.perf_counter()
+    for i in range(n):
+        sn, raw = payloads[i % count]
+        fn(sn, raw)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def run(n: int, rounds: int = 5) -> dict[str, Any]:
+    drones = [f"1581F5FHD23{i:04d}" for i in range(100)]
+    aircraft = [(sn, encode(AIRCRAFT_OSD)) for sn in drones]
+    no_field = [(sn, encode(DOCK_OSD)) for sn in drones] + [(sn, encode(RC_OSD)) for sn in drones]
+
+    cases: dict[str, Callable[[str, bytes], Any]] = {"legacy": _legacy}
+    cases["extractor_stdlib"] = TotalFlightTimeExtractor(loads=stdlib_loads).extract
+    if _orjson is not None:
+        cases["extractor_orjson"] = TotalFlightTimeExtractor(loads=_orjson.loads).extract
+
+    results: dict[str, Any] = {"n": n, "rounds": rounds, "payload_bytes": len(aircraft[0][1]), "us_per_msg": {}}
+    best: dict[str, dict[str, float]] = {}
+    for fn in cases.values():
+        fn(*aircraft[0])  # warm up / learn path
+    for _ in range(max(1, rounds)):
+        for name, fn in cases.items():
+            row = best.setdefault(name, {"aircraft_osd": float("inf"), "no_field_osd": float("inf")})
+            row["aircraft_osd"] = min(row["aircraft_osd"], _time_per_msg(fn, aircraft, n))
+            row["no_field_osd"] = min(row["no_field_osd"], _time_per_msg(fn, no_field, n))
+    for name, row in best.items():
+        results["us_per_msg"][name] = {k: round(v, 3) for k, v in row.items()}
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=20000, help="messages per case and round")
+    ap.add_argument("--rounds", type=int, default=5, help="interleaved rounds; the best is reported")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = run(args.n, args.rounds)
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"payload size: {results['payload_bytes']} bytes, {args.n} msgs per case, best of {args.rounds} rounds")
+    print(f"{'case':<20}{'aircraft us/msg':>18}{'no-field us/msg':>18}")
+    for name, r in results["us_per_msg"].items():
+        print(f"{name:<20}{r['aircraft_osd']:>18.2f}{r['no_field_osd']:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
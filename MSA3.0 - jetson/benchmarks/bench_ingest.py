@@ -0,0 +1,132 @@
+"""MQTT ingest throughput of MqttRunner.handle_message for a synthetic fleet.
+
+Usage:
+    python -m benchmarks.bench_ingest [--drones 500] [--messages 50000] [--writer]
+                                      [--drone-rate 0] [--json]
+
+Drives the message handler directly (no broker) against a fresh SQLite file,
+with writes either inline or through the group-commit OsdWriter (--writer).
+Reports messages per second and p50/p99/max handling latency. With
+--drone-rate the per-drone ingest limit is on, so most of a fast replay is
+held back before parsing (the held newest values are drained at the end).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+def latency_summary_us(latencies: list[float]) -> dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "p50_us": round(percentile(values, 50) * 1e6, 2),
+        "p99_us": round(percentile(values, 99) * 1e6, 2),
+        "max_us": round((values[-1] if values else 0.0) * 1e6, 2),
+    }
+
+
+def run(
+    drones: int, messages: int, use_writer: bool, gateway_ratio: float, db_dir: str, drone_rate: float = 0.0
+) -> dict[str, Any]:
+    os.environ["SQLITE_PATH"] = str(Path(db_dir) / "bench_ingest.sqlite3")
+    os.environ["INGEST_DRONE_RATE"] = str(drone_rate)
+    # Imported after SQLITE_PATH is set; load_config reads the environment.
+    from msa3_flytime.config import load_config
+    from msa3_flytime.db import SqliteStore
+    from msa3_flytime.mqtt_client import MqttRunner
+    from msa3_flytime.writer import OsdWriter
+
+    from .fleet import SyntheticFleet
+
+    cfg = load_config()
+    store = SqliteStore(cfg)
+    writer = OsdWriter.from_config(cfg, store) if use_writer else None
+    runner = MqttRunner(cfg, store, writer=writer)
+    stop = threading.Event()
+    t_writer = None
+    if writer is not None:
+        t_writer = threading.Thread(target=writer.run_forever, args=(stop,), daemon=True)
+        t_writer.start()
+
+    stream = list(SyntheticFleet(drones).messages(messages, gateway_ratio=gateway_ratio))
+    latencies: list[float] = []
+    handle = runner.handle_message
+    clock = time.perf_counter
+
+    t0 = clock()
+    for topic, payload in stream:
+        t = clock()
+        handle(topic, payload)
+        latencies.append(clock() - t)
+    elapsed = clock() - t0
+    deferred = runner.limiter.pending() if runner.limiter is not None else 0
+    if runner.limiter is not None:
+        # Let every drone's bucket refill once, then apply the held newest values.
+        time.sleep(1.0 / drone_rate)
+        runner.drain_deferred()
+
+    drain_s = 0.0
+    if writer is not None and t_writer is not None:
+        t = clock()
+        stop.set()
+        t_writer.join()
+        drain_s = clock() - t
+
+    result: dict[str, Any] = {
+        "drones": drones,
+        "messages": len(stream),
+        "writer": use_writer,
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(len(stream) / elapsed, 1) if elapsed else 0.0,
+        "latency": latency_summary_us(latencies),
+        "extractor": runner.extractor.stats(),
+        "held_at_end": deferred,
+    }
+    if writer is not None:
+        result["writer_drain_s"] = round(drain_s, 3)
+        result["writer_stats"] = writer.stats()
+    store.close()
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--drones", type=int, default=500)
+    ap.add_argument("--messages", type=int, default=50000)
+    ap.add_argument("--gateway-ratio", type=float, default=1.0, help="dock/RC messages per aircraft message")
+    ap.add_argument("--writer", action="store_true", help="use the group-commit OsdWriter")
+    ap.add_argument("--drone-rate", type=float, default=0.0, help="per-drone ingest limit, messages/s (0 = off)")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        result = run(args.drones, args.messages, args.writer, args.gateway_ratio, db_dir, args.drone_rate)
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    lat = result["latency"]
+    mode = "writer" if args.writer else "inline"
+    print(f"{result['messages']} msgs, {result['drones']} drones, {mode} writes")
+    print(f"throughput: {result['msgs_per_s']:.0f} msgs/s")
+    print(f"latency:    p50 {lat['p50_us']:.1f} us  p99 {lat['p99_us']:.1f} us  max {lat['max_us']:.1f} us")
+    if "writer_drain_s" in result:
+        print(f"writer:     drained in {result['writer_drain_s']:.3f} s, {result['writer_stats']['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
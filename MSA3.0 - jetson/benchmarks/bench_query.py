@@ -0,0 +1,196 @@
+"""Read-path latency of /api/summary and /api/drone/<sn>/range under concurrency.
+
+Usage:
+    python -m benchmarks.bench_query [--drones 1000] [--years 2] [--clients 8]
+                                     [--requests 400] [--cache-entries 0]
+                                     [--mode threaded|asyncio] [--json]
+
+Fills a fresh SQLite file with ``--years`` of daily t_fly_time history for the
+synthetic fleet, starts the HTTP server on a loopback port and has ``--clients``
+threads issue random-range requests. The response cache is off by default so
+every request reaches SQLite.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from .bench_ingest import latency_summary_us
+
+_STATIC_DIR = Path(__file__).resolve().parent.parent / "msa3_flytime" / "static"
+
+_INSERT_DAY = """
+INSERT INTO t_fly_time (
+  drone_sn, fly_date, fly_date_time, revised_start_time,
+  today_start_total_flight_time, total_flight_time, today_flight_time
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+""".strip()
+
+
+def fill_history(store: Any, fleet: Any, start: dt.date, end: dt.date) -> int:
+    rows = 0
+    with store._write() as conn:
+        conn.executemany(
+            "INSERT INTO t_drone (drone_sn, drone_type, drone_version) VALUES (?, ?, ?)",
+            [(d.sn, "M30T", "v1") for d in fleet.drones],
+        )
+        batch: list[tuple[Any, ...]] = []
+        for row in fleet.history(start, end):
+            batch.append(row)
+            if len(batch) >= 10000:
+                rows += len(batch)
+                conn.executemany(_INSERT_DAY, batch)
+                batch.clear()
+        if batch:
+            rows += len(batch)
+            conn.executemany(_INSERT_DAY, batch)
+        store._touch(everything=True)
+    with store._write() as conn:
+        conn.execute("ANALYZE")
+    return rows
+
+
+def _random_range(rng: random.Random, start: dt.date, end: dt.date, max_days: int) -> tuple[dt.date, dt.date]:
+    span = (end - start).days
+    a = start + dt.timedelta(days=rng.randint(0, span))
+    b = min(end, a + dt.timedelta(days=rng.randint(0, max_days)))
+    return a, b
+
+
+def _client(
+    base: str, kind: str, count: int, seed: int, sns: list[str], start: dt.date, end: dt.date
+) -> list[float]:
+    rng = random.Random(seed)
+    latencies: list[float] = []
+    for _ in range(count):
+        if kind == "summary":
+            a, b = _random_range(rng, start, end, 366)
+            url = f"{base}/api/summary?start={a}&end={b}"
+        else:
+            a, b = _random_range(rng, start, end, 92)
+            url = f"{base}/api/drone/{rng.choice(sns)}/range?start={a}&end={b}"
+        t = time.perf_counter()
+        with urllib.request.urlopen(url) as resp:
+            resp.read()
+        latencies.append(time.perf_counter() - t)
+    return latencies
+
+
+def _measure(
+    base: str, kind: str, clients: int, requests: int, sns: list[str], start: dt.date, end: dt.date
+) -> dict[str, Any]:
+    per_client = max(1, requests // clients)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(_client, base, kind, per_client, i, sns, start, end) for i in range(clients)]
+        latencies = [lat for f in futures for lat in f.result()]
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency": latency_summary_us(latencies),
+    }
+
+
+def run(
+    drones: int, years: int, clients: int, requests: int, cache_entries: int, db_dir: str, mode: str = "threaded"
+) -> dict[str, Any]:
+    os.environ["SQLITE_PATH"] = str(Path(db_dir) / "bench_query.sqlite3")
+    os.environ["SQLITE_READ_POOL_SIZE"] = str(max(clients, 1))
+    from msa3_flytime.config import load_config
+    from msa3_flytime.db import SqliteStore
+    from msa3_flytime.http_server import serve
+
+    from .fleet import SyntheticFleet
+
+    cfg = load_config()
+    store = SqliteStore(cfg)
+    fleet = SyntheticFleet(drones)
+    end = dt.date.today() - dt.timedelta(days=1)
+    start = end - dt.timedelta(days=365 * years - 1)
+
+    t = time.perf_counter()
+    rows = fill_history(store, fleet, start, end)
+    fill_s = time.perf_counter() - t
+
+    server = serve(
+        store,
+        "127.0.0.1",
+        0,
+        str(_STATIC_DIR),
+        cache_entries=cache_entries,
+        mode=mode,
+        workers=cfg.http_workers,
+        queue_max=max(cfg.http_queue_max, clients),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    sns = [d.sn for d in fleet.drones]
+
+    try:
+        result: dict[str, Any] = {
+            "drones": drones,
+            "years": years,
+            "rows": rows,
+            "fill_s": round(fill_s, 3),
+            "db_bytes": os.path.getsize(cfg.sqlite_path),
+            "clients": clients,
+            "cache_entries": cache_entries,
+            "mode": mode,
+            "summary": _measure(base, "summary", clients, requests, sns, start, end),
+            "drone_range": _measure(base, "range", clients, requests, sns, start, end),
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        store.close()
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--drones", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=2)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=400, help="requests per endpoint (split across clients)")
+    ap.add_argument("--cache-entries", type=int, default=0, help="HTTP response cache size (0 = off)")
+    ap.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded", help="HTTP server mode")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        result = run(
+            args.drones, args.years, args.clients, args.requests, args.cache_entries, db_dir, mode=args.mode
+        )
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(
+        f"{result['rows']} rows ({result['drones']} drones x {result['years']} years), "
+        f"filled in {result['fill_s']:.1f} s, {result['db_bytes'] / 1e6:.1f} MB"
+    )
+    print(f"{'endpoint':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ("summary", "drone_range"):
+        r = result[name]
+        lat = r["latency"]
+        print(
+            f"{name:<14}{r['req_per_s']:>10.1f}{lat['p50_us'] / 1000:>10.2f}"
+            f"{lat['p99_us'] / 1000:>10.2f}{lat['max_us'] / 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Multi-site sync: bytes and time for a full and an incremental pull.
+
+Usage:
+    python -m benchmarks.bench_sync [--nodes 3] [--drones 200] [--days 365]
+                                    [--shared 0] [--changes 50] [--batch 5000]
+                                    [--json]
+
+Fills ``--nodes`` fresh SQLite files with ``--days`` of history for their
+own drones (``--shared`` of them also fly at every other site), serves each
+on a loopback port and pulls them all into an aggregator database. Then
+``--changes`` day rows per node are updated and pulled again: the second
+pull should move only those rows. The aggregator's range totals are checked
+against the sum of the nodes'.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import datetime as dt
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from .bench_query import _STATIC_DIR, fill_history
+
+
+def _sync_bytes(metric: Any, nodes: list[tuple[str, str]]) -> int:
+    return int(sum(metric.value((name,)) for name, _ in nodes))
+
+
+def _mutate(store: Any, changes: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with store._write() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id FROM t_fly_time").fetchall()]
+        for row_id in rng.sample(ids, min(changes, len(ids))):
+            extra = rng.randint(60, 1800)
+            conn.execute(
+                "UPDATE t_fly_time SET total_flight_time = total_flight_time + ?,"
+                " today_flight_time = today_flight_time + ? WHERE id = ?",
+                (extra, extra, row_id),
+            )
+        store._touch(everything=True)
+
+
+def _totals(store: Any, start: dt.date, end: dt.date) -> dict[str, int]:
+    return {r["drone_sn"]: int(r["total_seconds"]) for r in store.summary_by_range(start, end)}
+
+
+def run(
+    nodes: int, drones: int, days: int, changes: int, batch: int, db_dir: str, shared: int = 0
+) -> dict[str, Any]:
+    os.environ["SQLITE_PATH"] = str(Path(db_dir) / "aggregator.sqlite3")
+    from msa3_flytime.config import load_config
+    from msa3_flytime.db import SqliteStore
+    from msa3_flytime.http_server import serve
+    from msa3_flytime.sync import SYNC_BYTES, SyncAggregator
+
+    from .fleet import SyntheticFleet
+
+    cfg = load_config()
+    end = dt.date.today() - dt.timedelta(days=1)
+    start = end - dt.timedelta(days=days - 1)
+
+    stores: list[Any] = []
+    servers: list[Any] = []
+    node_urls: list[tuple[str, str]] = []
+    for i in range(nodes):
+        store = SqliteStore(dataclasses.replace(cfg, sqlite_path=str(Path(db_dir) / f"node{i}.sqlite3")))
+        fill_history(store, SyntheticFleet(shared, seed=i + 1), start, end)
+        fill_history(store, SyntheticFleet(drones - shared, seed=i + 1, first=shared + i * drones), start, end)
+        server = serve(store, "127.0.0.1", 0, str(_STATIC_DIR), cache_entries=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stores.append(store)
+        servers.append(server)
+        node_urls.append((f"node{i}", f"http://127.0.0.1:{server.server_address[1]}"))
+
+    aggregator_store = SqliteStore(cfg)
+    aggregator = SyncAggregator(aggregator_store, node_urls, batch=batch)
+
+    def pull() -> dict[str, Any]:
+        before = _sync_bytes(SYNC_BYTES, node_urls)
+        t = time.perf_counter()
+        results = aggregator.pull_all()
+        elapsed = time.perf_counter() - t
+        errors = {n: r for n, r in results.items() if not isinstance(r, int)}
+        if errors:
+            raise RuntimeError(f"sync pull failed: {errors}")
+        return {
+            "rows": sum(results.values()),
+            "bytes": _sync_bytes(SYNC_BYTES, node_urls) - before,
+            "elapsed_s": round(elapsed, 3),
+        }
+
+    try:
+        full = pull()
+        for i, store in enumerate(stores):
+            _mutate(store, changes, seed=100 + i)
+        incremental = pull()
+
+        expected: dict[str, int] = {}
+        for store in stores:
+            for sn, seconds in _totals(store, start, end).items():
+                expected[sn] = expected.get(sn, 0) + seconds
+        result: dict[str, Any] = {
+            "nodes": nodes,
+            "drones": drones,
+            "shared": shared,
+            "days": days,
+            "changes_per_node": changes,
+            "full": full,
+            "incremental": incremental,
+            "totals_match": _totals(aggregator_store, start, end) == expected,
+        }
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        for store in stores:
+            store.close()
+        aggregator_store.close()
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--nodes", type=int, default=3)
+    ap.add_argument("--drones", type=int, default=200)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--shared", type=int, default=0, help="drones (of --drones) that fly at every site")
+    ap.add_argument("--changes", type=int, default=50, help="day rows updated per node before the second pull")
+    ap.add_argument("--batch", type=int, default=5000, help="rows per /api/sync/changes request")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        result = run(args.nodes, args.drones, args.days, args.changes, args.batch, db_dir, args.shared)
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(
+        f"{result['nodes']} nodes x {result['drones']} drones ({result['shared']} shared) x {result['days']} days"
+    )
+    print(f"{'pull':<13}{'rows':>10}{'bytes':>12}{'seconds':>10}")
+    for name in ("full", "incremental"):
+        r = result[name]
+        print(f"{name:<13}{r['rows']:>10}{r['bytes']:>12}{r['elapsed_s']:>10.3f}")
+    print(f"aggregator totals match the nodes: {result['totals_match']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Synthetic DJI fleet: OSD message streams and flight-time history.
+
+Each drone sits behind a dock/RC gateway. Aircraft OSD carries a
+total_flight_time that grows while the drone is airborne; dock and RC OSD on the
+same gateway do not carry the field, which is what the MQTT handler sees on a
+real broker (roughly one aircraft message per gateway message).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import random
+from dataclasses import dataclass
+from typing import Iterator
+
+from .samples import DOCK_OSD, RC_OSD, aircraft_osd, encode
+
+
+@dataclass
+class SyntheticDrone:
+    sn: str
+    gateway: str
+    total: int
+    flying: bool = False
+
+
+def osd_topic(sn: str) -> str:
+    return f"thing/product/{sn}/osd"
+
+
+class SyntheticFleet:
+    def __init__(self, drones: int, seed: int = 1, first: int = 0):
+        self._rng = random.Random(seed)
+        self.drones = [
+            SyntheticDrone(
+                sn=f"1581F5FHD{i:06d}",
+                gateway=f"4TADKAQ{i:07d}",
+                total=self._rng.randint(3_600, 2_000_000),
+            )
+            for i in range(first, first + drones)
+        ]
+
+    def messages(
+        self,
+        count: int,
+        start_ms: int = 1_708_848_000_000,
+        osd_hz: float = 1.0,
+        gateway_ratio: float = 1.0,
+        flying_ratio: float = 0.3,
+    ) -> Iterator[tuple[str, bytes]]:
+        """Yield (topic, payload) round-robin over the fleet at ``osd_hz`` per drone.
+
+        ``gateway_ratio`` gateway (dock/RC) messages are mixed in per aircraft
+        message; ``flying_ratio`` of the drones are airborne at any time.
+        """
+        rng = self._rng
+        dock = encode(DOCK_OSD)
+        rc = encode(RC_OSD)
+        step_ms = int(1000 / max(osd_hz, 0.001))
+        gateway_budget = 0.0
+        sent = 0
+        tick = 0
+        while sent < count:
+            now_ms = start_ms + tick * step_ms
+            for drone in self.drones:
+                if sent >= count:
+                    return
+                if rng.random() < 0.01:
+                    drone.flying = rng.random() < flying_ratio
+                if drone.flying:
+                    drone.total += max(1, int(step_ms / 1000))
+                yield osd_topic(drone.sn), encode(aircraft_osd(drone.total, now_ms, drone.gateway))
+                sent += 1
+
+                gateway_budget += gateway_ratio
+                while gateway_budget >= 1.0 and sent < count:
+                    gateway_budget -= 1.0
+                    yield osd_topic(drone.gateway), dock if rng.random() < 0.5 else rc
+                    sent += 1
+            tick += 1
+
+    def history(
+        self, start: dt.date, end: dt.date, fly_probability: float = 0.4
+    ) -> Iterator[tuple[str, str, str, int, int, int, int]]:
+        """Yield t_fly_time rows for [start, end], ordered by drone then day.
+
+        Columns: drone_sn, fly_date, fly_date_time, revised_start_time,
+        today_start_total_flight_time, total_flight_time, today_flight_time.
+        """
+        rng = self._rng
+        days = (end - start).days + 1
+        for drone in self.drones:
+            total = drone.total
+            for offset in range(days):
+                day = start + dt.timedelta(days=offset)
+                today = rng.randint(600, 4 * 3600) if rng.random() < fly_probability else 0
+                fly_date = day.isoformat()
+                yield (drone.sn, fly_date, f"{fly_date} 00:00:00", 1, total, total + today, today)
+                total += today
+            drone.total = total
@@ -0,0 +1,169 @@
+"""DJI Cloud API OSD payload samples used by the benchmarks.
+
+Shapes follow thing/product/<sn>/osd messages as published by DJI docks and
+pilot gateways (aircraft OSD carries total_flight_time under ``data``; dock and
+RC OSD do not). Values are anonymised.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+from typing import Any
+
+AIRCRAFT_OSD: dict[str, Any] = {
+    "tid": "6a7bfe89-c386-4043-b600-b518e10096cc",
+    "bid": "42a19f36-5117-4520-bd13-fd61d818d52e",
+    "timestamp": 1708848000000,
+    "gateway": "4TADKAQ000002J",
+    "data": {
+        "mode_code": 5,
+        "gear": 1,
+        "horizontal_speed": 6.4,
+        "vertical_speed": 0.1,
+        "latitude": 24.998012,
+        "longitude": 121.301445,
+        "height": 182.3,
+        "elevation": 120.1,
+        "attitude_pitch": -2.3,
+        "attitude_roll": 0.7,
+        "attitude_head": 134,
+        "home_distance": 812.5,
+        "wind_speed": 31,
+        "wind_direction": 4,
+        "is_near_area_limit": 0,
+        "is_near_height_limit": 0,
+        "total_flight_distance": 482113.2,
+        "total_flight_sorties": 418,
+        "total_flight_time": 536912,
+        "track_id": "",
+        "position_state": {"gps_number": 18, "is_fixed": 2, "quality": 5, "rtk_number": 28},
+        "battery": {
+            "capacity_percent": 68,
+            "landing_power": 0,
+            "remain_flight_time": 1230,
+            "return_home_power": 22,
+            "batteries": [
+                {
+                    "capacity_percent": 68,
+                    "firmware_version": "01.02.03.04",
+                    "index": 0,
+                    "loop_times": 97,
+                    "sn": "4ERKL3100A00NN",
+                    "sub_type": 0,
+                    "temperature": 36.8,
+                    "type": 0,
+                    "voltage": 24612,
+                    "high_voltage_storage_days": 0,
+                },
+                {
+                    "capacity_percent": 67,
+                    "firmware_version": "01.02.03.04",
+                    "index": 1,
+                    "loop_times": 96,
+                    "sn": "4ERKL3100A00NP",
+                    "sub_type": 0,
+                    "temperature": 37.1,
+                    "type": 0,
+                    "voltage": 24588,
+                    "high_voltage_storage_days": 0,
+                },
+            ],
+        },
+        "storage": {"total": 59836000, "used": 1253000},
+        "maintain_status": {
+            "maintain_status_array": [
+                {"last_maintain_flight_sorties": 0, "last_maintain_flight_time": 0, "last_maintain_time": 0,
+                 "last_maintain_type": 1, "state": 0},
+            ]
+        },
+        "distance_limit_status": {"distance_limit": 5000, "is_near_distance_limit": 0, "state": 1},
+        "obstacle_avoidance": {"downside": 1, "horizon": 1, "upside": 1},
+        "cameras": [
+            {
+                "camera_mode": 1,
+                "payload_index": "53-0-0",
+                "photo_state": 0,
+                "record_time": 0,
+                "recording_state": 0,
+                "remain_photo_num": 4312,
+                "remain_record_duration": 0,
+                "zoom_factor": 5.0,
+                "liveview_world_region": {"bottom": 0.56, "left": 0.46, "right": 0.54, "top": 0.44},
+            }
+        ],
+        "payloads": [
+            {"gimbal_pitch": -34.2, "gimbal_roll": 0, "gimbal_yaw": 134.1, "measure_target_altitude": 0,
+             "measure_target_distance": 0, "measure_target_error_state": 0, "measure_target_latitude": 0,
+             "measure_target_longitude": 0, "payload_index": "53-0-0", "version": 1, "zoom_factor": 5.0},
+        ],
+    },
+}
+
+DOCK_OSD: dict[str, Any] = {
+    "tid": "c5e1f0a4-3b71-4e0a-9d2b-6a4f4a0b7c11",
+    "bid": "5d40ab2e-8e0b-4c55-a1d7-5d9a7b3d2e90",
+    "timestamp": 1708848000500,
+    "gateway": "4TADKAQ000002J",
+    "data": {
+        "mode_code": 0,
+        "cover_state": 0,
+        "putter_state": 0,
+        "supplement_light_state": 0,
+        "emergency_stop_state": 0,
+        "flighttask_step_code": 5,
+        "network_state": {"type": 2, "quality": 4, "rate": 9.8},
+        "drone_in_dock": 0,
+        "drone_charge_state": {"state": 0, "capacity_percent": 100},
+        "rainfall": 0,
+        "wind_speed": 3.1,
+        "environment_temperature": 24.5,
+        "temperature": 27.2,
+        "humidity": 61,
+        "latitude": 24.998001,
+        "longitude": 121.301421,
+        "height": 21.4,
+        "alternate_land_point": {"latitude": 24.998101, "longitude": 121.301521, "height": 21.4, "safe_land_height": 30},
+        "first_power_on": 1689734400000,
+        "positionState": {"gps_number": 20, "is_calibration": 1, "is_fixed": 2, "quality": 5, "rtk_number": 30},
+        "storage": {"total": 117000000, "used": 10233000},
+        "electric_supply_voltage": 223,
+        "working_voltage": 25231,
+        "working_current": 1420,
+        "backup_battery": {"voltage": 26011, "temperature": 24.1, "switch": 0},
+        "job_number": 1203,
+        "acc_time": 18221031,
+        "activation_time": 1689734400,
+        "maintain_status": {"maintain_status_array": [{"state": 0, "last_maintain_type": 17, "last_maintain_time": 0,
+                                                       "last_maintain_work_sorties": 0}]},
+    },
+}
+
+RC_OSD: dict[str, Any] = {
+    "tid": "1f0b4e0d-2ab4-4a1b-8f4d-29a1f06f5a77",
+    "bid": "b7a1a2c0-94d9-4d5b-8d33-8b0cf3e6ad02",
+    "timestamp": 1708848000900,
+    "gateway": "5YSZKAE00C0013",
+    "data": {
+        "capacity_percent": 81,
+        "latitude": 24.997988,
+        "longitude": 121.301401,
+        "height": 20.9,
+        "wireless_link": {"dongle_number": 0, "4g_link_state": 0, "sdr_link_state": 1, "link_workmode": 0,
+                          "sdr_quality": 5, "4g_quality": 0, "4g_uav_quality": 0, "4g_gnd_quality": 0,
+                          "sdr_freq_band": 2.4, "4g_freq_band": 0},
+    },
+}
+
+
+def aircraft_osd(total_flight_time: int, timestamp_ms: int, gateway: str | None = None) -> dict[str, Any]:
+    msg = copy.deepcopy(AIRCRAFT_OSD)
+    msg["timestamp"] = int(timestamp_ms)
+    msg["data"]["total_flight_time"] = int(total_flight_time)
+    if gateway is not None:
+        msg["gateway"] = gateway
+    return msg
+
+
+def encode(msg: dict[str, Any]) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode("utf-8")
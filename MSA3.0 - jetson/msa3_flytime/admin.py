@@ -0,0 +1,139 @@
+"""Maintenance commands for the flight time database.
+
+Usage:
+    python -m msa3_flytime.admin init-days --from YYYY-MM-DD
+    python -m msa3_flytime.admin rebuild-cum
+    python -m msa3_flytime.admin replay [--dir DIR] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+    python -m msa3_flytime.admin archive [--dir DIR] [--year YYYY]
+    python -m msa3_flytime.admin vacuum
+    python -m msa3_flytime.admin sync-pull
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import logging
+from pathlib import Path
+
+from .config import load_config
+from .db import SqliteStore
+from .recorder import iter_records, segments_for_range
+from .replay import replay_records
+from .sync import SyncAggregator
+
+logger = logging.getLogger(__name__)
+
+
+def _date(value: str) -> dt.date:
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date (YYYY-MM-DD): {value}") from None
+
+
+def _cmd_init_days(store: SqliteStore, args: argparse.Namespace) -> None:
+    now = dt.datetime.now()
+    if args.start > now.date():
+        raise SystemExit("--from must not be in the future")
+    inserted = store.init_days_for_all_drones(args.start, now)
+    logger.info("Backfilled day rows from %s inserted=%s", args.start, inserted)
+
+
+def _cmd_rebuild_cum(store: SqliteStore, args: argparse.Namespace) -> None:
+    rows = store.rebuild_cum_flight_time()
+    logger.info("Rebuilt cumulative flight time rows_corrected=%s", rows)
+
+
+def _cmd_replay(store: SqliteStore, args: argparse.Namespace) -> None:
+    directory = args.dir or load_config().osd_record_dir
+    if not directory:
+        raise SystemExit("--dir is required when OSD_RECORD_DIR is not set")
+    if args.start and args.end and args.end < args.start:
+        raise SystemExit("--to must be >= --from")
+    segments = segments_for_range(Path(directory), args.start, args.end)
+    if not segments:
+        raise SystemExit(f"no OSD segments found in {directory}")
+    logger.info("Replaying %s segment(s) from %s", len(segments), directory)
+    stats = replay_records(store, iter_records(segments), args.start, args.end, batch_rows=args.batch_rows)
+    logger.info(
+        "Replay done records=%s totals=%s skipped=%s day_rows=%s transactions=%s elapsed_s=%s",
+        stats.records, stats.totals, stats.skipped, stats.day_rows, stats.transactions, stats.elapsed_s,
+    )
+
+
+def _cmd_archive(store: SqliteStore, args: argparse.Namespace) -> None:
+    cfg = load_config()
+    directory = args.dir or cfg.archive_dir
+    if not directory:
+        raise SystemExit("--dir is required when ARCHIVE_DIR is not set")
+    if args.year is not None:
+        day_rows, samples = store.archive_year(args.year, directory)
+        logger.info("Archived year=%s day_rows=%s sample_blocks=%s", args.year, day_rows, samples)
+    else:
+        years = store.archive_closed_years(directory, dt.date.today(), cfg.archive_grace_days)
+        logger.info("Archived closed years %s", years or "(none due)")
+    logger.info("Archived years now: %s", store.archived_years())
+
+
+def _cmd_vacuum(store: SqliteStore, args: argparse.Namespace) -> None:
+    store.vacuum(incremental=True)
+    store.checkpoint("TRUNCATE")
+    logger.info("Vacuumed database; incremental auto-vacuum enabled")
+
+
+def _cmd_sync_pull(store: SqliteStore, args: argparse.Namespace) -> None:
+    cfg = load_config()
+    if not cfg.sync_nodes:
+        raise SystemExit("SYNC_NODES is not set")
+    results = SyncAggregator(store, cfg.sync_nodes, cfg.sync_batch_rows, cfg.sync_timeout_s).pull_all()
+    for node in store.sync_nodes():
+        logger.info(
+            "Node %s pulled=%s seq=%s rows=%s error=%s",
+            node["node"], results.get(node["node"]), node["seq"], node["rows"], node["error"],
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+
+    ap = argparse.ArgumentParser(prog="python -m msa3_flytime.admin", description="MSA3 flytime maintenance")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init-days", help="insert missing day rows for all drones from a date through today")
+    p.add_argument("--from", dest="start", type=_date, required=True)
+    p.set_defaults(func=_cmd_init_days)
+
+    p = sub.add_parser(
+        "rebuild-cum", aliases=["rebuild-rollups"], help="recompute cum_flight_time from the daily seconds"
+    )
+    p.set_defaults(func=_cmd_rebuild_cum)
+
+    p = sub.add_parser("replay", help="re-derive day rows from recorded OSD segments (OSD_RECORD_DIR)")
+    p.add_argument("--dir", help="segment directory (default: OSD_RECORD_DIR)")
+    p.add_argument("--from", dest="start", type=_date)
+    p.add_argument("--to", dest="end", type=_date)
+    p.add_argument("--batch-rows", type=int, default=20000, help="day rows per transaction")
+    p.set_defaults(func=_cmd_replay)
+
+    p = sub.add_parser("archive", help="move closed years of day rows into per-year SQLite files")
+    p.add_argument("--dir", help="archive directory (default: ARCHIVE_DIR)")
+    p.add_argument("--year", type=int, help="archive this year now (default: every closed year past ARCHIVE_GRACE_DAYS)")
+    p.set_defaults(func=_cmd_archive)
+
+    p = sub.add_parser("vacuum", help="rewrite the database once and enable incremental vacuum (stop the service first)")
+    p.set_defaults(func=_cmd_vacuum)
+
+    p = sub.add_parser("sync-pull", help="pull changed rows from every SYNC_NODES site once")
+    p.set_defaults(func=_cmd_sync_pull)
+
+    args = ap.parse_args(argv)
+    store = SqliteStore(load_config())
+    try:
+        args.func(store, args)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
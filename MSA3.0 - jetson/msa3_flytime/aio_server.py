@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+
+from .http_server import (
+    HTTP_REQUESTS,
+    LAST_CHUNK,
+    FlyTimeApp,
+    Request,
+    Response,
+    chunk_frame,
+    error_response,
+    route_label,
+)
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECTIONS = REGISTRY.gauge("msa3_http_open_connections", "Open HTTP connections (asyncio server).")
+HTTP_PENDING = REGISTRY.gauge("msa3_http_executor_pending", "API requests queued or running on the DB executor.")
+HTTP_SHED = REGISTRY.counter(
+    "msa3_http_shed_total", "Requests refused by the asyncio server (queue_full, timeout, connections).", ["reason"]
+)
+
+_MAX_HEADER_BYTES = 16 * 1024
+# API routes that never touch SQLite; their streams are consumed on the event loop.
+_INLINE_API = ("/api/live",)
+
+
+class _BadRequest(Exception):
+    pass
+
+
+def _parse_head(head: bytes) -> tuple[str, str, str, dict[str, str]]:
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise _BadRequest("malformed request line") from None
+    if not version.startswith("HTTP/1."):
+        raise _BadRequest("unsupported HTTP version")
+    headers: dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise _BadRequest("malformed header")
+        headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+class AsyncHttpServer:
+    """asyncio HTTP/1.1 front end for FlyTimeApp.
+
+    Connections are cheap coroutines with keep-alive; only /api/* requests go
+    to a fixed-size thread pool (the SQLite work). At most ``workers +
+    queue_max`` API requests are admitted at once; the rest get 503, and a
+    request not answered within ``request_timeout`` gets 504. Static assets are
+    served from memory on the event loop.
+    """
+
+    def __init__(
+        self,
+        app: FlyTimeApp,
+        host: str,
+        port: int,
+        workers: int = 4,
+        queue_max: int = 64,
+        request_timeout: float = 15.0,
+        keepalive_timeout: float = 15.0,
+        max_connections: int = 256,
+    ):
+        self.app = app
+        self._workers = max(1, workers)
+        self._admit = self._workers + max(0, queue_max)
+        self._request_timeout = request_timeout
+        self._keepalive_timeout = keepalive_timeout
+        self._max_connections = max(1, max_connections)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="http-db")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._connections = 0
+        self._tasks: set[asyncio.Task] = set()
+
+        self._loop = asyncio.new_event_loop()
+        self._stopped = threading.Event()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_connection, host, port, limit=_MAX_HEADER_BYTES)
+        )
+        self.server_address = self._server.sockets[0].getsockname()[:2]
+
+        HTTP_CONNECTIONS.set_callback(lambda: self._connections)
+        HTTP_PENDING.set_callback(lambda: self._pending)
+
+    # -- lifecycle (same shape as socketserver) --
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        try:
+            self._loop.run_until_complete(self._serve(poll_interval))
+        finally:
+            self._executor.shutdown(wait=False)
+            self._loop.close()
+
+    async def _serve(self, poll_interval: float) -> None:
+        while not self._stopped.is_set():
+            await asyncio.sleep(poll_interval)
+        self._server.close()
+        # Idle keep-alive connections would otherwise hold shutdown up.
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+
+    def server_close(self) -> None:
+        self._stopped.set()
+
+    # -- per connection --
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._connections >= self._max_connections:
+            HTTP_SHED.inc(labels=("connections",))
+            writer.close()
+            return
+        self._connections += 1
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self._keepalive_timeout)
+                except asyncio.LimitOverrunError:
+                    await self._write(writer, error_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE), False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                try:
+                    method, target, version, headers = _parse_head(head)
+                    length = int(headers.get("content-length") or 0)
+                except (_BadRequest, ValueError):
+                    await self._write(writer, error_response(HTTPStatus.BAD_REQUEST), False)
+                    break
+                if length:
+                    await reader.readexactly(length)  # no API takes a body: read and ignored
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                resp = await self._dispatch(Request(target, headers, method))
+                chunked = version == "HTTP/1.1"
+                if resp.stream is not None and not chunked:
+                    keep_alive = False
+                await self._write(writer, resp, keep_alive, chunked)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown: end the connection quietly.
+            pass
+        finally:
+            self._connections -= 1
+            self._tasks.discard(task)  # type: ignore[arg-type]
+            writer.close()
+
+    async def _dispatch(self, request: Request) -> Response:
+        if not request.path.startswith("/api/") or request.path.split("?", 1)[0] in _INLINE_API:
+            # In-memory static assets and live streams: no point hopping threads.
+            return self.app.handle(request)
+
+        with self._pending_lock:
+            if self._pending >= self._admit:
+                HTTP_SHED.inc(labels=("queue_full",))
+                resp = error_response(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy")
+                resp.headers.append(("Retry-After", "1"))
+                HTTP_REQUESTS.inc(labels=(route_label(request.path.split("?", 1)[0]), "503"))
+                return resp
+            self._pending += 1
+
+        fut: Future[Response] = self._executor.submit(self.app.handle, request)
+        try:
+            resp = await asyncio.wait_for(asyncio.wrap_future(fut), self._request_timeout)
+        except asyncio.TimeoutError:
+            # Released when the work really ends (a timed-out query keeps its slot).
+            fut.add_done_callback(self._release)
+            HTTP_SHED.inc(labels=("timeout",))
+            HTTP_REQUESTS.inc(labels=(route_label(request.path.split("?", 1)[0]), "504"))
+            return error_response(HTTPStatus.GATEWAY_TIMEOUT, "Query timed out")
+        except Exception:
+            self._release(fut)
+            logger.exception("HTTP handler failed path=%s", request.path)
+            return error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        if resp.stream is None:
+            self._release(fut)
+        else:
+            # A streamed response keeps its admission slot until fully sent;
+            # each chunk is produced on the executor (it reads SQLite).
+            resp.stream = self._stream_on_executor(resp.stream, fut)
+        return resp
+
+    async def _stream_on_executor(self, stream, fut: Future):  # -> AsyncIterator[bytes]
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                data = await loop.run_in_executor(self._executor, next, stream, None)
+                if data is None:
+                    return
+                yield data
+        finally:
+            await loop.run_in_executor(self._executor, stream.close)
+            self._release(fut)
+
+    def _release(self, _fut: Future) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def _write(
+        self, writer: asyncio.StreamWriter, resp: Response, keep_alive: bool, chunked: bool = True
+    ) -> None:
+        status = HTTPStatus(resp.status)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Date: {formatdate(usegmt=True)}"]
+        lines.extend(f"{name}: {value}" for name, value in resp.header_block(chunked))
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if resp.stream is not None:
+            stream = resp.stream
+            try:
+                if hasattr(stream, "__aiter__"):
+                    async for data in stream:  # type: ignore[union-attr]
+                        writer.write(chunk_frame(data) if chunked else data)
+                        await writer.drain()  # back-pressure: memory stays flat
+                else:
+                    for data in stream:
+                        writer.write(chunk_frame(data) if chunked else data)
+                        await writer.drain()
+                if chunked:
+                    writer.write(LAST_CHUNK)
+            finally:
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()  # type: ignore[union-attr]
+                else:
+                    resp.close()
+        elif resp.body and resp.status != HTTPStatus.NOT_MODIFIED:
+            writer.write(resp.body)
+        await writer.drain()
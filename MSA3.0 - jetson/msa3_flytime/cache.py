@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable
+
+from .db import WriteVersions
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip() == etag for tag in if_none_match.split(","))
+
+
+@dataclass(frozen=True)
+class CacheScope:
+    """What a cached response depends on; None dates mean 'no date range'."""
+
+    start: dt.date | None = None
+    end: dt.date | None = None
+    drone_sn: str | None = None
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    version: int
+    scope: CacheScope
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """Bounded LRU of encoded API responses, invalidated by store write versions.
+
+    An entry stays valid until a write touches one of its days (and, for
+    drone-scoped entries, its drone) after the entry was computed.
+    """
+
+    def __init__(self, versions: WriteVersions, max_entries: int):
+        self._versions = versions
+        self._max_entries = max(0, max_entries)
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+        scope = entry.scope
+        if self._versions.changed_since(entry.version, scope.start, scope.end, scope.drone_sn):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, version: int, scope: CacheScope, body: bytes) -> CachedResponse:
+        entry = CachedResponse(version=version, scope=scope, body=body, etag=make_etag(body))
+        if self._max_entries == 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
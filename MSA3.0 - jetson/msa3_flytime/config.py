@@ -7,14 +7,77 @@ from dataclasses import dataclass
 @dataclass(frozen=True)
 class Config:
     sqlite_path: str
+    sqlite_read_pool_size: int
+    sqlite_read_pool_timeout_s: float
+    sqlite_statement_cache: int
+    sqlite_cache_kib: int
+    sqlite_mmap_mb: int
+    storage_profile: str
+    sqlite_journal_size_limit_mb: int
+    sqlite_wal_autocheckpoint: int
+    sqlite_temp_store_memory: bool
+    sqlite_page_size: int
 
     mqtt_host: str
     mqtt_port: int
     mqtt_username: str | None
     mqtt_password: str | None
+    mqtt_workers: int
+    mqtt_shared_group: str | None
 
     http_host: str
     http_port: int
+    http_cache_entries: int
+    http_past_max_age_s: int
+    http_static_dev: bool
+    http_server: str
+    http_workers: int
+    http_queue_max: int
+    http_request_timeout_s: float
+    http_keepalive_s: float
+    http_max_connections: int
+    http_page_max: int
+    live_interval_s: float
+    live_max_clients: int
+
+    ingest_queue_max: int
+    ingest_batch_size: int
+    ingest_linger_ms: int
+    ingest_put_timeout_ms: int
+    ingest_min_flush_s: float
+    ingest_drone_rate: float
+    ingest_drone_burst: float
+    ingest_global_rate: float
+    ingest_global_burst: float
+
+    init_backfill_days: int
+
+    archive_dir: str | None
+    archive_grace_days: int
+
+    maint_idle_s: float
+    maint_max_defer_s: float
+    maint_optimize_s: float
+    maint_checkpoint_s: float
+    maint_vacuum_s: float
+    maint_vacuum_pages: int
+
+    osd_record_dir: str | None
+    osd_record_rotate_mb: int
+    osd_record_keep_days: int
+
+    flight_samples: bool
+    flight_sample_flush_s: float
+    flight_session_gap_s: float
+
+    log_dir: str
+    log_file_level: str
+
+    # (name, base URL) of each site to pull from; empty = not an aggregator.
+    sync_nodes: tuple[tuple[str, str], ...]
+    sync_interval_s: float
+    sync_batch_rows: int
+    sync_timeout_s: float
 
 
 def _getenv_int(name: str, default: int) -> int:
@@ -24,23 +87,172 @@ def _getenv_int(name: str, default: int) -> int:
     return int(value)
 
 
+def _getenv_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+def _getenv_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 def load_config() -> Config:
     sqlite_path = os.getenv("SQLITE_PATH", os.path.join("data", "msa3_flytime.sqlite3"))
+    sqlite_read_pool_size = max(1, _getenv_int("SQLITE_READ_POOL_SIZE", 4))
+    sqlite_read_pool_timeout_s = _getenv_float("SQLITE_READ_POOL_TIMEOUT_S", 10.0)
+    sqlite_statement_cache = _getenv_int("SQLITE_STATEMENT_CACHE", 128)
+    sqlite_cache_kib = _getenv_int("SQLITE_CACHE_KIB", 8192)
+    sqlite_mmap_mb = _getenv_int("SQLITE_MMAP_MB", 64)
+    # low_wear: fewer, larger writes for SD cards / eMMC; changes the defaults below.
+    storage_profile = (os.getenv("STORAGE_PROFILE") or "default").strip().lower()
+    if storage_profile not in ("default", "low_wear"):
+        storage_profile = "default"
+    low_wear = storage_profile == "low_wear"
+    sqlite_journal_size_limit_mb = _getenv_int("SQLITE_JOURNAL_SIZE_LIMIT_MB", 4 if low_wear else -1)
+    sqlite_wal_autocheckpoint = max(0, _getenv_int("SQLITE_WAL_AUTOCHECKPOINT", 4000 if low_wear else 1000))
+    sqlite_temp_store_memory = _getenv_bool("SQLITE_TEMP_STORE_MEMORY", low_wear)
+    sqlite_page_size = _getenv_int("SQLITE_PAGE_SIZE", 0)
+    if sqlite_page_size not in (0, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536):
+        sqlite_page_size = 0
 
     mqtt_host = os.getenv("MQTT_HOST", "127.0.0.1")
     mqtt_port = _getenv_int("MQTT_PORT", 1883)
     mqtt_username = os.getenv("MQTT_USERNAME") or None
     mqtt_password = os.getenv("MQTT_PASSWORD") or None
+    mqtt_workers = max(1, _getenv_int("MQTT_WORKERS", 1))
+    mqtt_shared_group = os.getenv("MQTT_SHARED_GROUP", "msa3_flytime") or None
 
     http_host = os.getenv("HTTP_HOST", "0.0.0.0")
     http_port = _getenv_int("HTTP_PORT", 8000)
+    http_cache_entries = _getenv_int("HTTP_CACHE_ENTRIES", 256)
+    http_past_max_age_s = _getenv_int("HTTP_PAST_MAX_AGE_S", 3600)
+    http_static_dev = _getenv_bool("HTTP_STATIC_DEV", False)
+    http_server = (os.getenv("HTTP_SERVER") or "threaded").strip().lower()
+    if http_server not in ("threaded", "asyncio"):
+        http_server = "threaded"
+    http_workers = max(1, _getenv_int("HTTP_WORKERS", sqlite_read_pool_size))
+    http_queue_max = max(0, _getenv_int("HTTP_QUEUE_MAX", 64))
+    http_request_timeout_s = _getenv_float("HTTP_REQUEST_TIMEOUT_S", 15.0)
+    http_keepalive_s = _getenv_float("HTTP_KEEPALIVE_S", 15.0)
+    http_max_connections = max(1, _getenv_int("HTTP_MAX_CONNECTIONS", 256))
+    http_page_max = max(1, _getenv_int("HTTP_PAGE_MAX", 500))
+    live_interval_s = max(0.1, _getenv_float("LIVE_INTERVAL_S", 1.0))
+    live_max_clients = max(1, _getenv_int("LIVE_MAX_CLIENTS", 64))
+
+    ingest_queue_max = _getenv_int("INGEST_QUEUE_MAX", 5000)
+    ingest_batch_size = _getenv_int("INGEST_BATCH_SIZE", 500)
+    ingest_linger_ms = _getenv_int("INGEST_LINGER_MS", 200)
+    ingest_put_timeout_ms = _getenv_int("INGEST_PUT_TIMEOUT_MS", 1000)
+    ingest_min_flush_s = max(0.0, _getenv_float("INGEST_MIN_FLUSH_S", 30.0 if low_wear else 0.0))
+    ingest_drone_rate = max(0.0, _getenv_float("INGEST_DRONE_RATE", 0.0))
+    ingest_drone_burst = max(1.0, _getenv_float("INGEST_DRONE_BURST", 10.0))
+    ingest_global_rate = max(0.0, _getenv_float("INGEST_GLOBAL_RATE", 0.0))
+    ingest_global_burst = max(0.0, _getenv_float("INGEST_GLOBAL_BURST", 0.0))
+
+    init_backfill_days = _getenv_int("INIT_BACKFILL_DAYS", 0)
+
+    archive_dir = os.getenv("ARCHIVE_DIR") or None
+    archive_grace_days = max(0, _getenv_int("ARCHIVE_GRACE_DAYS", 35))
+
+    maint_idle_s = max(0.0, _getenv_float("MAINT_IDLE_S", 30.0))
+    maint_max_defer_s = max(0.0, _getenv_float("MAINT_MAX_DEFER_S", 3600.0))
+    maint_optimize_s = max(0.0, _getenv_float("MAINT_OPTIMIZE_S", 6 * 3600.0))
+    maint_checkpoint_s = max(0.0, _getenv_float("MAINT_CHECKPOINT_S", 3600.0 if low_wear else 900.0))
+    maint_vacuum_s = max(0.0, _getenv_float("MAINT_VACUUM_S", 24 * 3600.0))
+    maint_vacuum_pages = max(1, _getenv_int("MAINT_VACUUM_PAGES", 2048))
+
+    osd_record_dir = os.getenv("OSD_RECORD_DIR") or None
+    osd_record_rotate_mb = max(1, _getenv_int("OSD_RECORD_ROTATE_MB", 64))
+    osd_record_keep_days = max(0, _getenv_int("OSD_RECORD_KEEP_DAYS", 35))
+
+    flight_samples = _getenv_bool("FLIGHT_SAMPLES", False)
+    flight_sample_flush_s = max(1.0, _getenv_float("FLIGHT_SAMPLE_FLUSH_S", 300.0))
+    flight_session_gap_s = max(0.0, _getenv_float("FLIGHT_SESSION_GAP_S", 60.0))
+
+    log_dir = os.getenv("LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+    log_file_level = (os.getenv("LOG_FILE_LEVEL") or ("WARNING" if low_wear else "INFO")).strip().upper()
+    if log_file_level not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        log_file_level = "INFO"
+
+    # SYNC_NODES=name=http://host:8000,... (a bare URL is named after its host:port)
+    sync_nodes = []
+    for item in (os.getenv("SYNC_NODES") or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep:
+            name, url = item.split("//")[-1].rstrip("/"), item
+        sync_nodes.append((name.strip(), url.strip().rstrip("/")))
+    sync_interval_s = max(1.0, _getenv_float("SYNC_INTERVAL_S", 300.0))
+    sync_batch_rows = max(1, _getenv_int("SYNC_BATCH_ROWS", 5000))
+    sync_timeout_s = max(1.0, _getenv_float("SYNC_TIMEOUT_S", 30.0))
 
     return Config(
         sqlite_path=sqlite_path,
+        sqlite_read_pool_size=sqlite_read_pool_size,
+        sqlite_read_pool_timeout_s=sqlite_read_pool_timeout_s,
+        sqlite_statement_cache=sqlite_statement_cache,
+        sqlite_cache_kib=sqlite_cache_kib,
+        sqlite_mmap_mb=sqlite_mmap_mb,
+        storage_profile=storage_profile,
+        sqlite_journal_size_limit_mb=sqlite_journal_size_limit_mb,
+        sqlite_wal_autocheckpoint=sqlite_wal_autocheckpoint,
+        sqlite_temp_store_memory=sqlite_temp_store_memory,
+        sqlite_page_size=sqlite_page_size,
         mqtt_host=mqtt_host,
         mqtt_port=mqtt_port,
         mqtt_username=mqtt_username,
         mqtt_password=mqtt_password,
+        mqtt_workers=mqtt_workers,
+        mqtt_shared_group=mqtt_shared_group,
         http_host=http_host,
         http_port=http_port,
+        http_cache_entries=http_cache_entries,
+        http_past_max_age_s=http_past_max_age_s,
+        http_static_dev=http_static_dev,
+        http_server=http_server,
+        http_workers=http_workers,
+        http_queue_max=http_queue_max,
+        http_request_timeout_s=http_request_timeout_s,
+        http_keepalive_s=http_keepalive_s,
+        http_max_connections=http_max_connections,
+        http_page_max=http_page_max,
+        live_interval_s=live_interval_s,
+        live_max_clients=live_max_clients,
+        ingest_queue_max=ingest_queue_max,
+        ingest_batch_size=ingest_batch_size,
+        ingest_linger_ms=ingest_linger_ms,
+        ingest_put_timeout_ms=ingest_put_timeout_ms,
+        ingest_min_flush_s=ingest_min_flush_s,
+        ingest_drone_rate=ingest_drone_rate,
+        ingest_drone_burst=ingest_drone_burst,
+        ingest_global_rate=ingest_global_rate,
+        ingest_global_burst=ingest_global_burst,
+        init_backfill_days=init_backfill_days,
+        archive_dir=archive_dir,
+        archive_grace_days=archive_grace_days,
+        maint_idle_s=maint_idle_s,
+        maint_max_defer_s=maint_max_defer_s,
+        maint_optimize_s=maint_optimize_s,
+        maint_checkpoint_s=maint_checkpoint_s,
+        maint_vacuum_s=maint_vacuum_s,
+        maint_vacuum_pages=maint_vacuum_pages,
+        osd_record_dir=osd_record_dir,
+        osd_record_rotate_mb=osd_record_rotate_mb,
+        osd_record_keep_days=osd_record_keep_days,
+        flight_samples=flight_samples,
+        flight_sample_flush_s=flight_sample_flush_s,
+        flight_session_gap_s=flight_session_gap_s,
+        log_dir=log_dir,
+        log_file_level=log_file_level,
+        sync_nodes=tuple(sync_nodes),
+        sync_interval_s=sync_interval_s,
+        sync_batch_rows=sync_batch_rows,
+        sync_timeout_s=sync_timeout_s,
     )
@@ -1,12 +1,105 @@
 from __future__ import annotations
 
 import datetime as dt
+import logging
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import wraps
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, TypeVar
 
 from .config import Config
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+# Day-row columns shared by t_fly_time and its per-year archives.
+_DAY_COLUMNS = (
+    "drone_sn, fly_date_time, fly_date, revised_start_time,"
+    " today_start_total_flight_time, total_flight_time, today_flight_time, created_at, updated_at"
+)
+
+# summary_page sort keys; drone_sn breaks ties (NULL type/version sort as '').
+SUMMARY_SORTS = {
+    "total": "total_seconds",
+    "sn": "drone_sn",
+    "type": "COALESCE(drone_type, '')",
+    "version": "COALESCE(drone_version, '')",
+}
+SUMMARY_GROUPS = {"type": "drone_type", "version": "drone_version"}
+
+# Columns sent by changes_since and merged by apply_sync_batch.
+SYNC_DRONE_COLUMNS = ("drone_sn", "drone_type", "drone_version")
+SYNC_DAY_COLUMNS = (
+    "drone_sn", "fly_date", "fly_date_time", "revised_start_time",
+    "today_start_total_flight_time", "total_flight_time", "today_flight_time",
+)
+
+# Schema of a per-year archive file (archive_year).
+_ARCHIVE_SCHEMA = """
+CREATE TABLE t_fly_time (
+  drone_sn TEXT NOT NULL,
+  fly_date_time TEXT NOT NULL,
+  fly_date TEXT NOT NULL,
+  revised_start_time INTEGER NOT NULL,
+  today_start_total_flight_time INTEGER NOT NULL,
+  total_flight_time INTEGER NOT NULL,
+  today_flight_time INTEGER NOT NULL,
+  created_at TEXT NOT NULL,
+  updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX uk_t_fly_time_drone_date ON t_fly_time (drone_sn, fly_date);
+CREATE INDEX idx_t_fly_time_drone_date_secs ON t_fly_time (drone_sn, fly_date, today_flight_time);
+
+CREATE TABLE t_flight_sample (
+  drone_sn TEXT NOT NULL,
+  hour_start INTEGER NOT NULL,
+  sample_count INTEGER NOT NULL,
+  data BLOB NOT NULL
+);
+CREATE UNIQUE INDEX uk_t_flight_sample_drone_hour ON t_flight_sample (drone_sn, hour_start);
+CREATE INDEX ix_t_flight_sample_hour ON t_flight_sample (hour_start);
+"""
+
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "msa3_db_call_seconds", "SqliteStore method latency in seconds.", ["method"]
+)
+DB_CALL_ERRORS = REGISTRY.counter(
+    "msa3_db_call_errors_total", "SqliteStore method calls that raised.", ["method"]
+)
+DB_TRANSACTIONS = REGISTRY.counter(
+    "msa3_db_transactions_total", "Write transactions by outcome.", ["outcome"]
+)
+SQLITE_WAL_FRAMES = REGISTRY.counter(
+    "msa3_sqlite_wal_frames_total", "WAL frames (one page each) appended by this process's write transactions."
+)
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def _timed(func: _F) -> _F:
+    labels = (func.__name__,)
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            DB_CALL_ERRORS.inc(labels=labels)
+            raise
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - t0, labels)
+
+    return wrapper  # type: ignore[return-value]
 
 
 class DbError(RuntimeError):
@@ -30,6 +123,37 @@ class FlyTimeDay:
     today_flight_time: int
 
 
+@dataclass(frozen=True)
+class OsdEvent:
+    drone_sn: str
+    at: dt.datetime
+    total: int
+    # Set on the first OSD of the day: seeds and revises today's start total.
+    first_total: int | None = None
+    new_drone: bool = False
+
+
+@dataclass(frozen=True)
+class ReplayedDay:
+    """One drone-day re-derived from recorded OSD: first and last total seen."""
+
+    drone_sn: str
+    day: dt.date
+    last_at: dt.datetime
+    first_total: int
+    last_total: int
+
+
+@dataclass(frozen=True)
+class SampleBlock:
+    """Encoded flight samples of one drone for one hour (see samples.py)."""
+
+    drone_sn: str
+    hour_start: int  # epoch seconds
+    sample_count: int
+    data: bytes
+
+
 def _dt_to_text(value: dt.datetime) -> str:
     # Match yyyy-MM-dd HH:mm:ss
     v = value.replace(microsecond=0)
@@ -44,68 +168,566 @@ def _text_to_dt(value: str) -> dt.datetime:
         return dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
 
 
+@dataclass
+class _Touched:
+    days: set[dt.date]
+    drones: set[str] | None
+    drone_list: bool = False
+    everything: bool = False
+    dirty: bool = False
+
+
+# Block levels kept by WriteVersions: 2**22 days covers every date.toordinal().
+_DAY_LEVELS = 22
+
+
+class WriteVersions:
+    """Monotonic data version plus the last version that touched each day and drone.
+
+    Lets readers (the HTTP response cache) tell whether anything they depend on
+    was written since they computed a result. Days are kept as the newest
+    version per aligned block of 2**level days, so a range check reads at most
+    two blocks per level however many days were ever written.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = 0
+        self._everything = 0
+        self._drone_list = 0
+        self._any_drone = 0
+        # (level, ordinal >> level) -> newest version of any day in that block.
+        self._day_blocks: dict[tuple[int, int], int] = {}
+        self._drones: dict[str, int] = {}
+
+    def current(self) -> int:
+        with self._lock:
+            return self._version
+
+    def bump(
+        self,
+        days: Iterable[dt.date] = (),
+        drones: Iterable[str] | None = (),
+        drone_list: bool = False,
+        everything: bool = False,
+    ) -> None:
+        """Record a committed write; drones=None means every drone may be affected."""
+        with self._lock:
+            self._version += 1
+            v = self._version
+            if everything:
+                self._everything = v
+                return
+            if drone_list:
+                self._drone_list = v
+            blocks = self._day_blocks
+            for day in days:
+                o = day.toordinal()
+                for level in range(_DAY_LEVELS):
+                    blocks[(level, o >> level)] = v
+            if drones is None:
+                self._any_drone = v
+            else:
+                for sn in drones:
+                    self._drones[sn] = v
+
+    def changed_since(
+        self,
+        version: int,
+        start: dt.date | None = None,
+        end: dt.date | None = None,
+        drone_sn: str | None = None,
+    ) -> bool:
+        with self._lock:
+            if self._everything > version:
+                return True
+            if drone_sn is None:
+                if self._drone_list > version:
+                    return True
+            elif self._drones.get(drone_sn, 0) <= version and self._any_drone <= version:
+                return False
+            if start is None or end is None:
+                return False
+            blocks = self._day_blocks
+            lo, hi = start.toordinal(), end.toordinal()
+            level = 0
+            while lo <= hi:
+                if lo & 1:
+                    if blocks.get((level, lo), 0) > version:
+                        return True
+                    lo += 1
+                if not hi & 1:
+                    if blocks.get((level, hi), 0) > version:
+                        return True
+                    hi -= 1
+                lo >>= 1
+                hi >>= 1
+                level += 1
+            return False
+
+
 class SqliteStore:
+    """SQLite access with one long-lived writer and a pool of read-only connections.
+
+    Writes are serialised on the writer connection; HTTP handler threads check
+    out reader connections so queries never wait on connection setup.
+    """
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._path = str(Path(cfg.sqlite_path))
         Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._write_lock = threading.RLock()
+        self._writer: sqlite3.Connection | None = None
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+        self.versions = WriteVersions()
+        self._touched: _Touched | None = None
+        # WAL accounting from the wal-index header (see _count_wal_frames).
+        self._shm: Any = None
+        self._wal_frames = 0
+        self._wal_salt = b""
+        self._wal_frames_written = 0
+        self._wal_page_size = 0
+
         self.init_schema()
+        # year -> archive file; only ranges reaching these years read them.
+        self._archives: dict[int, str] = self._load_archives()
 
-    def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self._path, timeout=30)
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=self._cfg.sqlite_statement_cache,
+        )
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self._cfg.sqlite_cache_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self._cfg.sqlite_mmap_mb) * 1024 * 1024}")
+        if self._cfg.sqlite_temp_store_memory:
+            conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            # Only take effect on a new, empty database (existing ones: admin vacuum).
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            if self._cfg.sqlite_page_size:
+                conn.execute(f"PRAGMA page_size={int(self._cfg.sqlite_page_size)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA wal_autocheckpoint={int(self._cfg.sqlite_wal_autocheckpoint)}")
+            if self._cfg.sqlite_journal_size_limit_mb >= 0:
+                limit = int(self._cfg.sqlite_journal_size_limit_mb * 1024 * 1024)
+                conn.execute(f"PRAGMA journal_size_limit={limit}")
         return conn
 
-    def init_schema(self) -> None:
-        migrations_path = Path(__file__).resolve().parent / "migrations.sql"
-        sql = migrations_path.read_text(encoding="utf-8")
-        conn = self._conn()
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Check out the writer connection; commits on success, rolls back on error."""
+        with self._write_lock:
+            conn = self._writer_connection()
+            self._touched = _Touched(days=set(), drones=set())
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                DB_TRANSACTIONS.inc(labels=("rollback",))
+                raise
+            finally:
+                touched, self._touched = self._touched, None
+            DB_TRANSACTIONS.inc(labels=("commit",))
+            self._count_wal_frames()
+            # Publish the new data version only once the write is visible.
+            if touched.dirty:
+                self.versions.bump(touched.days, touched.drones, touched.drone_list, touched.everything)
+
+    def _wal_header(self) -> tuple[int, bytes] | None:
+        """(mxFrame, salts) from the wal-index header in the -shm file.
+
+        mxFrame is the number of valid frames in the WAL; the salts change
+        whenever the WAL restarts from the beginning. Caller holds _write_lock.
+        """
         try:
-            conn.executescript(sql)
-            conn.commit()
+            if self._shm is None:
+                self._shm = open(self._path + "-shm", "rb", buffering=0)
+            self._shm.seek(0)
+            header = self._shm.read(48)
+        except OSError:
+            return None
+        if len(header) < 48:
+            return None
+        page_size = int.from_bytes(header[14:16], sys.byteorder)
+        self._wal_page_size = 65536 if page_size == 1 else page_size
+        return int.from_bytes(header[16:20], sys.byteorder), header[32:40]
+
+    def _count_wal_frames(self) -> None:
+        """Add the WAL frames written since the last call to SQLITE_WAL_FRAMES.
+
+        Exact while this process is the only writer.
+        """
+        header = self._wal_header()
+        if header is None:
+            return
+        frames, salt = header
+        delta = frames - self._wal_frames if salt == self._wal_salt else frames
+        self._wal_frames, self._wal_salt = frames, salt
+        if delta > 0:
+            self._wal_frames_written += delta
+            SQLITE_WAL_FRAMES.inc(delta)
+
+    @_timed
+    def storage_stats(self) -> dict[str, Any]:
+        """Database and WAL sizes plus bytes this process has appended to the WAL."""
+        with self._read() as conn:
+            page_size = int(conn.execute("PRAGMA page_size").fetchone()[0])
+            page_count = int(conn.execute("PRAGMA page_count").fetchone()[0])
+            freelist = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+
+        def size(path: str) -> int:
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+
+        frames = self._wal_frames_written
+        return {
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_count": freelist,
+            "db_bytes": size(self._path),
+            "wal_bytes": size(self._path + "-wal"),
+            "wal_frames_written": frames,
+            # Each frame is a 24-byte header plus one page.
+            "wal_bytes_written": frames * ((self._wal_page_size or page_size) + 24),
+        }
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        # Caller holds _write_lock.
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+            # Frames already in the WAL were not written by us.
+            self._close_shm()
+            header = self._wal_header()
+            if header is not None:
+                self._wal_frames, self._wal_salt = header
+        return self._writer
+
+    def _touch(
+        self,
+        days: Iterable[dt.date] = (),
+        drones: Iterable[str] | None = (),
+        drone_list: bool = False,
+        everything: bool = False,
+    ) -> None:
+        """Note what the current write transaction changes (see WriteVersions)."""
+        t = self._touched
+        if t is None:
+            return
+        t.dirty = True
+        t.days.update(days)
+        if drones is None or t.drones is None:
+            t.drones = None
+        else:
+            t.drones.update(drones)
+        t.drone_list = t.drone_list or drone_list
+        t.everything = t.everything or everything
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        """Check out a read-only connection from the pool."""
+        conn: sqlite3.Connection | None = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                if self._reader_count < self._cfg.sqlite_read_pool_size:
+                    self._reader_count += 1
+                    try:
+                        conn = self._connect(read_only=True)
+                    except Exception:
+                        self._reader_count -= 1
+                        raise
+        if conn is None:
+            try:
+                conn = self._readers.get(timeout=self._cfg.sqlite_read_pool_timeout_s)
+            except queue.Empty:
+                raise DbError("SQLite read pool exhausted") from None
+        try:
+            yield conn
         finally:
-            conn.close()
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._close_shm()
+        self._close_readers()
+
+    def _close_readers(self) -> None:
+        """Close the idle pooled read connections (they reopen on demand)."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._reader_lock:
+                self._reader_count -= 1
 
+    def _close_shm(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+        self._wal_frames, self._wal_salt = 0, b""
+
+    @_timed
+    def init_schema(self) -> None:
+        """Apply pending migrations/NNNN_*.sql files, tracked by PRAGMA user_version."""
+        with self._write() as conn:
+            current = int(conn.execute("PRAGMA user_version").fetchone()[0])
+            for path in sorted(MIGRATIONS_DIR.glob("[0-9][0-9][0-9][0-9]_*.sql")):
+                version = int(path.name[:4])
+                if version <= current:
+                    continue
+                sql = path.read_text(encoding="utf-8")
+                logger.info("Applying schema migration %s", path.name)
+                try:
+                    # One transaction per migration: a failed upgrade leaves the
+                    # database at the previous version.
+                    conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version={version};\nCOMMIT;")
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    raise DbError(f"Schema migration {path.name} failed") from e
+                current = version
+
+    # -- per-year archives --
+
+    def _load_archives(self) -> dict[int, str]:
+        with self._read() as conn:
+            return {int(r[0]): str(r[1]) for r in conn.execute("SELECT year, path FROM t_archive")}
+
+    def archived_years(self) -> list[int]:
+        return sorted(self._archives)
+
+    def _attach_archives(self, conn: sqlite3.Connection, years: Iterable[int]) -> list[str]:
+        """Attach the archives of ``years`` to ``conn`` (once per connection); returns schema names."""
+        attached = {r[1] for r in conn.execute("PRAGMA database_list")}
+        names: list[str] = []
+        for year in years:
+            name = f"arc_{year}"
+            if name not in attached:
+                conn.execute(f"ATTACH DATABASE ? AS {name}", (self._archives[year],))
+            names.append(name)
+        return names
+
+    def _day_tables(self, conn: sqlite3.Connection, start: dt.date, end: dt.date) -> list[str]:
+        """t_fly_time tables holding days in [start, end]: main plus any archives reached."""
+        years = [y for y in sorted(self._archives) if start.year <= y <= end.year]
+        return ["main.t_fly_time"] + [f"{name}.t_fly_time" for name in self._attach_archives(conn, years)]
+
+    def _day_source(self, conn: sqlite3.Connection, start: dt.date, end: dt.date) -> str:
+        """FROM source for day rows in [start, end]; a UNION ALL only when archives are reached."""
+        tables = self._day_tables(conn, start, end)
+        if len(tables) == 1:
+            return "t_fly_time"
+        return "(" + " UNION ALL ".join(f"SELECT {_DAY_COLUMNS} FROM {t}" for t in tables) + ")"
+
+    @_timed
+    def archive_year(self, year: int, archive_dir: str) -> tuple[int, int]:
+        """Move one closed year of day rows and flight samples into ``archive_dir``.
+
+        The archive file is written and synced first; the rows are then deleted
+        and the file registered in t_archive in one transaction, so a crash
+        leaves either the live rows or the archive, never both. Writes wait
+        while the year is copied. Returns (day_rows, sample_blocks).
+        """
+        if year in self._archives:
+            raise DbError(f"year {year} is already archived")
+        if year >= dt.date.today().year:
+            raise DbError(f"year {year} is not closed yet")
+        first_day, last_day = f"{year:04d}-01-01", f"{year:04d}-12-31"
+        first_hour = int(dt.datetime(year, 1, 1).timestamp())
+        end_hour = int(dt.datetime(year + 1, 1, 1).timestamp())
+
+        directory = Path(archive_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = (directory / f"msa3_flytime_{year}.sqlite3").resolve()
+        tmp = path.with_name(path.name + ".tmp")
+
+        with self._write_lock:
+            if tmp.exists():
+                tmp.unlink()
+            arc = sqlite3.connect(str(tmp))
+            try:
+                arc.executescript(_ARCHIVE_SCHEMA)
+                arc.execute("ATTACH DATABASE ? AS live", (self._path,))
+                day_rows = arc.execute(
+                    f"INSERT INTO t_fly_time ({_DAY_COLUMNS}) SELECT {_DAY_COLUMNS} FROM live.t_fly_time"
+                    " WHERE fly_date BETWEEN ? AND ? ORDER BY drone_sn, fly_date",
+                    (first_day, last_day),
+                ).rowcount
+                sample_rows = arc.execute(
+                    "INSERT INTO t_flight_sample (drone_sn, hour_start, sample_count, data)"
+                    " SELECT drone_sn, hour_start, sample_count, data FROM live.t_flight_sample"
+                    " WHERE hour_start >= ? AND hour_start < ? ORDER BY drone_sn, hour_start",
+                    (first_hour, end_hour),
+                ).rowcount
+                arc.commit()
+                arc.execute("DETACH DATABASE live")
+            finally:
+                arc.close()
+            with open(tmp, "rb+") as f:
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+
+            with self._write() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM t_fly_time WHERE fly_date BETWEEN ? AND ?", (first_day, last_day)
+                ).rowcount
+                deleted_samples = conn.execute(
+                    "DELETE FROM t_flight_sample WHERE hour_start >= ? AND hour_start < ?", (first_hour, end_hour)
+                ).rowcount
+                if deleted != day_rows or deleted_samples != sample_rows:
+                    raise DbError(f"archive {year}: copied rows do not match live rows")
+                # Per-node copies of synced days (aggregator) are not needed once archived.
+                conn.execute("DELETE FROM t_sync_fly_time WHERE fly_date BETWEEN ? AND ?", (first_day, last_day))
+                conn.execute(
+                    "INSERT INTO t_archive (year, path, day_rows, sample_rows) VALUES (?, ?, ?, ?)",
+                    (year, str(path), day_rows, sample_rows),
+                )
+                # Same results either way; drop cached responses computed mid-move.
+                self._touch(everything=True)
+            self._archives[year] = str(path)
+        logger.info("Archived year=%s day_rows=%s sample_blocks=%s path=%s", year, day_rows, sample_rows, path)
+        return day_rows, sample_rows
+
+    @_timed
+    def archive_closed_years(self, archive_dir: str, today: dt.date, grace_days: int) -> list[int]:
+        """Archive every year that ended at least ``grace_days`` ago and still has live rows."""
+        with self._read() as conn:
+            first = conn.execute("SELECT MIN(fly_date) FROM t_fly_time").fetchone()[0]
+        if not first:
+            return []
+        done: list[int] = []
+        for year in range(int(first[:4]), today.year):
+            if today < dt.date(year + 1, 1, 1) + dt.timedelta(days=grace_days) or year in self._archives:
+                continue
+            self.archive_year(year, archive_dir)
+            done.append(year)
+        return done
+
+    # -- upkeep (scheduler jobs) --
+
+    @_timed
+    def optimize(self) -> str:
+        """Refresh query planner statistics; a full ANALYZE the first time."""
+        with self._write_lock:
+            conn = self._writer_connection()
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone()
+            if has_stats is None:
+                conn.execute("ANALYZE")
+                conn.commit()
+                return "analyze"
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("PRAGMA optimize").fetchall()
+            conn.commit()
+            return "optimize"
+
+    @_timed
+    def checkpoint(self, mode: str = "TRUNCATE") -> tuple[int, int, int]:
+        """PRAGMA wal_checkpoint(mode); returns (busy, wal_pages, checkpointed_pages)."""
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"unknown checkpoint mode: {mode}")
+        with self._write_lock:
+            row = self._writer_connection().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return int(row[0]), int(row[1]), int(row[2])
+
+    @_timed
+    def incremental_vacuum(self, pages: int) -> int:
+        """Return up to ``pages`` free pages to the filesystem; 0 unless auto_vacuum=INCREMENTAL."""
+        with self._write_lock:
+            conn = self._writer_connection()
+            if int(conn.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+                return 0
+            before = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+            # Each step frees one page; execute() would stop after the first.
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return before - int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+
+    @_timed
+    def vacuum(self, incremental: bool = True) -> None:
+        """Rewrite the whole database (offline use).
+
+        Switches on incremental auto-vacuum and applies SQLITE_PAGE_SIZE, which
+        needs the rollback journal for the duration of the VACUUM.
+        """
+        with self._write_lock:
+            conn = self._writer_connection()
+            conn.execute(f"PRAGMA auto_vacuum={'INCREMENTAL' if incremental else 'NONE'}")
+            page_size = int(self._cfg.sqlite_page_size)
+            if page_size and page_size != int(conn.execute("PRAGMA page_size").fetchone()[0]):
+                # Leaving WAL needs the only connection to the database.
+                self._close_readers()
+                self._close_shm()
+                conn.execute("PRAGMA journal_mode=DELETE")
+                conn.execute(f"PRAGMA page_size={page_size}")
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA journal_mode=WAL")
+            else:
+                conn.execute("VACUUM")
+
+    @_timed
     def ping(self) -> None:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             conn.execute("SELECT 1").fetchall()
-            conn.commit()
-        finally:
-            conn.close()
 
+    def _upsert_drone(
+        self,
+        conn: sqlite3.Connection,
+        drone_sn: str,
+        drone_type: str | None,
+        version: str | None,
+    ) -> None:
+        conn.execute(
+            """
+            INSERT INTO t_drone (drone_sn, drone_type, drone_version, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(drone_sn) DO UPDATE SET
+              drone_type = COALESCE(excluded.drone_type, t_drone.drone_type),
+              drone_version = COALESCE(excluded.drone_version, t_drone.drone_version),
+              updated_at = CURRENT_TIMESTAMP
+            """.strip(),
+            (drone_sn, drone_type, version),
+        )
+
+    @_timed
     def ensure_drone(
         self,
         drone_sn: str,
         drone_type: str | None = None,
         version: str | None = None,
     ) -> None:
-        conn = self._conn()
-        try:
-            conn.execute(
-                """
-                INSERT INTO t_drone (drone_sn, drone_type, drone_version, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(drone_sn) DO UPDATE SET
-                  drone_type = COALESCE(excluded.drone_type, t_drone.drone_type),
-                  drone_version = COALESCE(excluded.drone_version, t_drone.drone_version),
-                  updated_at = CURRENT_TIMESTAMP
-                """.strip(),
-                (drone_sn, drone_type, version),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        with self._write() as conn:
+            self._upsert_drone(conn, drone_sn, drone_type, version)
+            self._touch(drones=[drone_sn], drone_list=True)
 
+    @_timed
     def list_drones(self) -> list[Drone]:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             rows = conn.execute(
                 "SELECT drone_sn, drone_type, drone_version FROM t_drone ORDER BY drone_sn"
             ).fetchall()
-            conn.commit()
             return [
                 Drone(
                     drone_sn=r["drone_sn"],
@@ -114,43 +736,37 @@ class SqliteStore:
                 )
                 for r in rows
             ]
-        finally:
-            conn.close()
 
+    @_timed
     def get_latest_total(self, drone_sn: str) -> int | None:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             row = conn.execute(
                 """
                 SELECT total_flight_time
                 FROM t_fly_time
                 WHERE drone_sn = ?
-                ORDER BY fly_date_time DESC
+                ORDER BY fly_date DESC
                 LIMIT 1
                 """.strip(),
                 (drone_sn,),
             ).fetchone()
-            conn.commit()
             return int(row[0]) if row else None
-        finally:
-            conn.close()
 
+    @_timed
     def ensure_today_row(self, drone_sn: str, now: dt.datetime, initial_total: int) -> FlyTimeDay:
         today = now.date().isoformat()
-        conn = self._conn()
-        try:
+        with self._write() as conn:
             row = conn.execute(
                 """
                 SELECT drone_sn, fly_date_time, revised_start_time,
                        today_start_total_flight_time, total_flight_time, today_flight_time
                 FROM t_fly_time
-                WHERE drone_sn = ? AND date(fly_date_time) = ?
+                WHERE drone_sn = ? AND fly_date = ?
                 LIMIT 1
                 """.strip(),
                 (drone_sn, today),
             ).fetchone()
             if row:
-                conn.commit()
                 return FlyTimeDay(
                     drone_sn=row[0],
                     fly_date_time=_text_to_dt(row[1]),
@@ -164,14 +780,14 @@ class SqliteStore:
             conn.execute(
                 """
                 INSERT INTO t_fly_time (
-                    drone_sn, fly_date_time, revised_start_time,
+                    drone_sn, fly_date_time, fly_date, revised_start_time,
                     today_start_total_flight_time, total_flight_time, today_flight_time,
                     updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 """.strip(),
-                (drone_sn, now_text, 0, int(initial_total), int(initial_total), 0),
+                (drone_sn, now_text, today, 0, int(initial_total), int(initial_total), 0),
             )
-            conn.commit()
+            self._touch(days=[now.date()], drones=[drone_sn])
             return FlyTimeDay(
                 drone_sn=drone_sn,
                 fly_date_time=now.replace(microsecond=0),
@@ -180,13 +796,11 @@ class SqliteStore:
                 total_flight_time=int(initial_total),
                 today_flight_time=0,
             )
-        finally:
-            conn.close()
 
+    @_timed
     def update_today_total(self, drone_sn: str, now: dt.datetime, new_total: int) -> None:
         today = now.date().isoformat()
-        conn = self._conn()
-        try:
+        with self._write() as conn:
             conn.execute(
                 """
                 UPDATE t_fly_time
@@ -195,7 +809,7 @@ class SqliteStore:
                   total_flight_time = ?,
                   today_flight_time = MAX(0, ? - today_start_total_flight_time),
                   updated_at = CURRENT_TIMESTAMP
-                WHERE drone_sn = ? AND date(fly_date_time) = ?
+                WHERE drone_sn = ? AND fly_date = ?
                 """.strip(),
                 (
                     _dt_to_text(now),
@@ -205,14 +819,12 @@ class SqliteStore:
                     today,
                 ),
             )
-            conn.commit()
-        finally:
-            conn.close()
+            self._touch(days=[now.date()], drones=[drone_sn])
 
+    @_timed
     def revise_start_on_first_osd(self, drone_sn: str, now: dt.datetime, new_total: int) -> None:
         today = now.date().isoformat()
-        conn = self._conn()
-        try:
+        with self._write() as conn:
             conn.execute(
                 """
                 UPDATE t_fly_time
@@ -224,29 +836,158 @@ class SqliteStore:
                   today_flight_time = 0,
                   updated_at = CURRENT_TIMESTAMP
                 WHERE drone_sn = ?
-                  AND date(fly_date_time) = ?
+                  AND fly_date = ?
                   AND revised_start_time = 0
                 """.strip(),
                 (_dt_to_text(now), int(new_total), int(new_total), drone_sn, today),
             )
-            conn.commit()
-        finally:
-            conn.close()
+            self._touch(days=[now.date()], drones=[drone_sn])
+
+    @_timed
+    def apply_osd(self, events: Iterable[OsdEvent]) -> None:
+        """Apply OSD events in one transaction.
+
+        Equivalent to ensure_drone + ensure_today_row + revise_start_on_first_osd
+        + update_today_total per event, without a connection/commit per step.
+        """
+        with self._write() as conn:
+            for ev in events:
+                today = ev.at.date().isoformat()
+                now_text = _dt_to_text(ev.at)
+                first = int(ev.total if ev.first_total is None else ev.first_total)
+                if ev.new_drone:
+                    self._upsert_drone(conn, ev.drone_sn, None, None)
+                if ev.first_total is not None:
+                    conn.execute(
+                        """
+                        INSERT OR IGNORE INTO t_fly_time (
+                            drone_sn, fly_date_time, fly_date, revised_start_time,
+                            today_start_total_flight_time, total_flight_time, today_flight_time,
+                            updated_at
+                        ) VALUES (?, ?, ?, 0, ?, ?, 0, CURRENT_TIMESTAMP)
+                        """.strip(),
+                        (ev.drone_sn, now_text, today, first, first),
+                    )
+                # Right-hand sides see the pre-update row, so an unrevised row is
+                # revised with the day's first total and updated in one statement.
+                conn.execute(
+                    """
+                    UPDATE t_fly_time
+                    SET
+                      fly_date_time = ?,
+                      today_start_total_flight_time = CASE WHEN revised_start_time = 0
+                        THEN ? ELSE today_start_total_flight_time END,
+                      revised_start_time = 1,
+                      total_flight_time = ?,
+                      today_flight_time = MAX(0, ? - CASE WHEN revised_start_time = 0
+                        THEN ? ELSE today_start_total_flight_time END),
+                      updated_at = CURRENT_TIMESTAMP
+                    WHERE drone_sn = ? AND fly_date = ?
+                    """.strip(),
+                    (now_text, first, int(ev.total), int(ev.total), first, ev.drone_sn, today),
+                )
+                self._touch(days=[ev.at.date()], drones=[ev.drone_sn], drone_list=ev.new_drone)
+
+    @_timed
+    def merge_replayed_days(self, days: Iterable[ReplayedDay]) -> int:
+        """Write re-derived day rows in one transaction; returns the number of rows.
 
+        Unrevised rows (no OSD seen live) take the recorded first total as the
+        day's start. Rows already revised live keep the earlier start and the
+        larger total, so replaying the same or partial logs never loses time.
+        """
+        rows = []
+        skipped = 0
+        for d in days:
+            if d.day.year in self._archives:
+                skipped += 1
+                continue
+            rows.append(
+                (
+                    d.drone_sn,
+                    _dt_to_text(d.last_at),
+                    d.day.isoformat(),
+                    int(d.first_total),
+                    int(d.last_total),
+                    max(0, int(d.last_total) - int(d.first_total)),
+                )
+            )
+        if skipped:
+            logger.warning("Skipped %s replayed day(s) in archived years", skipped)
+        if not rows:
+            return 0
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO t_drone (drone_sn) VALUES (?)",
+                sorted({(r[0],) for r in rows}),
+            )
+            # Right-hand sides of DO UPDATE see the pre-update row.
+            conn.executemany(
+                """
+                INSERT INTO t_fly_time (
+                    drone_sn, fly_date_time, fly_date, revised_start_time,
+                    today_start_total_flight_time, total_flight_time, today_flight_time,
+                    updated_at
+                ) VALUES (?, ?, ?, 1, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(drone_sn, fly_date) DO UPDATE SET
+                  fly_date_time = MAX(t_fly_time.fly_date_time, excluded.fly_date_time),
+                  today_start_total_flight_time = CASE WHEN t_fly_time.revised_start_time = 0
+                    THEN excluded.today_start_total_flight_time
+                    ELSE MIN(t_fly_time.today_start_total_flight_time, excluded.today_start_total_flight_time) END,
+                  revised_start_time = 1,
+                  total_flight_time = MAX(t_fly_time.total_flight_time, excluded.total_flight_time),
+                  today_flight_time = MAX(0, MAX(t_fly_time.total_flight_time, excluded.total_flight_time)
+                    - CASE WHEN t_fly_time.revised_start_time = 0
+                      THEN excluded.today_start_total_flight_time
+                      ELSE MIN(t_fly_time.today_start_total_flight_time, excluded.today_start_total_flight_time) END),
+                  updated_at = CURRENT_TIMESTAMP
+                """.strip(),
+                rows,
+            )
+            self._touch(
+                days={dt.date.fromisoformat(r[2]) for r in rows},
+                drones={r[0] for r in rows},
+                drone_list=True,
+            )
+        return len(rows)
+
+    @_timed
+    def list_day_rows(self, day: dt.date) -> list[FlyTimeDay]:
+        with self._read() as conn:
+            rows = conn.execute(
+                """
+                SELECT drone_sn, fly_date_time, revised_start_time,
+                       today_start_total_flight_time, total_flight_time, today_flight_time
+                FROM t_fly_time
+                WHERE fly_date = ?
+                """.strip(),
+                (day.isoformat(),),
+            ).fetchall()
+            return [
+                FlyTimeDay(
+                    drone_sn=r[0],
+                    fly_date_time=_text_to_dt(r[1]),
+                    revised_start_time=int(r[2]),
+                    today_start_total_flight_time=int(r[3]),
+                    total_flight_time=int(r[4]),
+                    today_flight_time=int(r[5]),
+                )
+                for r in rows
+            ]
+
+    @_timed
     def get_day_row(self, drone_sn: str, day: dt.date) -> FlyTimeDay | None:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             row = conn.execute(
                 """
                 SELECT drone_sn, fly_date_time, revised_start_time,
                        today_start_total_flight_time, total_flight_time, today_flight_time
                 FROM t_fly_time
-                WHERE drone_sn = ? AND date(fly_date_time) = ?
+                WHERE drone_sn = ? AND fly_date = ?
                 LIMIT 1
                 """.strip(),
                 (drone_sn, day.isoformat()),
             ).fetchone()
-            conn.commit()
             if not row:
                 return None
             return FlyTimeDay(
@@ -257,39 +998,129 @@ class SqliteStore:
                 total_flight_time=int(row[4]),
                 today_flight_time=int(row[5]),
             )
-        finally:
-            conn.close()
 
+    def _init_day_rows(
+        self,
+        conn: sqlite3.Connection,
+        day: dt.date,
+        fly_date_time: str,
+        require_history: bool,
+    ) -> int:
+        # One statement for the whole fleet: each drone without a row for `day`
+        # gets one carrying forward its latest total from an earlier day.
+        history_filter = "WHERE latest IS NOT NULL" if require_history else ""
+        cur = conn.execute(
+            f"""
+            INSERT INTO t_fly_time (
+                drone_sn, fly_date_time, fly_date, revised_start_time,
+                today_start_total_flight_time, total_flight_time, today_flight_time,
+                updated_at
+            )
+            SELECT drone_sn, ?, ?, 0, COALESCE(latest, 0), COALESCE(latest, 0), 0, CURRENT_TIMESTAMP
+            FROM (
+                SELECT d.drone_sn,
+                       (SELECT f.total_flight_time
+                        FROM t_fly_time f
+                        WHERE f.drone_sn = d.drone_sn AND f.fly_date < ?
+                        ORDER BY f.fly_date DESC
+                        LIMIT 1) AS latest
+                FROM t_drone d
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM t_fly_time t
+                    WHERE t.drone_sn = d.drone_sn AND t.fly_date = ?
+                )
+            )
+            {history_filter}
+            """.strip(),
+            (fly_date_time, day.isoformat(), day.isoformat(), day.isoformat()),
+        )
+        inserted = int(cur.rowcount or 0)
+        if inserted:
+            self._touch(days=[day], drones=None)
+        return inserted
+
+    @_timed
     def init_today_for_all_drones(self, now: dt.datetime) -> int:
-        drones = self.list_drones()
+        with self._write() as conn:
+            return self._init_day_rows(conn, now.date(), _dt_to_text(now), require_history=False)
+
+    @_timed
+    def init_days_for_all_drones(self, start: dt.date, now: dt.datetime) -> int:
+        """Insert missing day rows for every day from `start` through today.
+
+        Used to backfill days the service was down. Past days only get rows for
+        drones that already had history by then; today behaves like
+        init_today_for_all_drones. Runs in a single transaction.
+        """
+        today = now.date()
+        if self._archives:
+            # Archived years are closed: never add live rows for them.
+            start = max(start, dt.date(max(self._archives) + 1, 1, 1))
         inserted = 0
-        for d in drones:
-            latest = self.get_latest_total(d.drone_sn)
-            if latest is None:
-                latest = 0
-            day_row = self.get_day_row(d.drone_sn, now.date())
-            if day_row is None:
-                self.ensure_today_row(d.drone_sn, now, latest)
-                inserted += 1
+        with self._write() as conn:
+            day = start
+            while day < today:
+                inserted += self._init_day_rows(
+                    conn,
+                    day,
+                    _dt_to_text(dt.datetime.combine(day, dt.time())),
+                    require_history=True,
+                )
+                day += dt.timedelta(days=1)
+            inserted += self._init_day_rows(conn, today, _dt_to_text(now), require_history=False)
         return inserted
 
+    @_timed
+    def get_last_fly_date(self) -> dt.date | None:
+        with self._read() as conn:
+            row = conn.execute("SELECT MAX(fly_date) FROM t_fly_time").fetchone()
+            return dt.date.fromisoformat(row[0]) if row and row[0] else None
+
+    def _range_seconds_expr(
+        self, conn: sqlite3.Connection, start: dt.date, end: dt.date, drone: str = "d.drone_sn"
+    ) -> tuple[str, list[Any]]:
+        """SQL expression for the seconds flown by ``drone`` in [start, end], with its params.
+
+        Live rows answer from cum_flight_time at the range's first and last
+        row (two index lookups, however long the range); archived years have
+        no prefix column and are summed from their own file.
+        """
+        first, last = start.isoformat(), end.isoformat()
+        lookup = (
+            "(SELECT {col} FROM t_fly_time f"
+            f" WHERE f.drone_sn = {drone} AND f.fly_date BETWEEN ? AND ?"
+            " ORDER BY f.fly_date {order} LIMIT 1)"
+        )
+        parts = [
+            "COALESCE("
+            + lookup.format(col="f.cum_flight_time", order="DESC")
+            + " - "
+            + lookup.format(col="f.cum_flight_time - f.today_flight_time", order="ASC")
+            + ", 0)"
+        ]
+        params: list[Any] = [first, last, first, last]
+        for table in self._day_tables(conn, start, end)[1:]:
+            parts.append(
+                f"COALESCE((SELECT SUM(f.today_flight_time) FROM {table} f"
+                f" WHERE f.drone_sn = {drone} AND f.fly_date BETWEEN ? AND ?), 0)"
+            )
+            params += [first, last]
+        return " + ".join(parts), params
+
+    @_timed
     def summary_by_range(self, start: dt.date, end: dt.date) -> list[dict[str, Any]]:
-        conn = self._conn()
-        try:
+        # Prefix totals: the cost per drone does not grow with the range.
+        with self._read() as conn:
+            total_expr, params = self._range_seconds_expr(conn, start, end)
             rows = conn.execute(
-                """
+                f"""
                 SELECT d.drone_sn, d.drone_type, d.drone_version,
-                       COALESCE(SUM(f.today_flight_time), 0) AS total_seconds
+                       {total_expr} AS total_seconds
                 FROM t_drone d
-                LEFT JOIN t_fly_time f
-                  ON f.drone_sn = d.drone_sn
-                 AND date(f.fly_date_time) BETWEEN ? AND ?
-                GROUP BY d.drone_sn, d.drone_type, d.drone_version
                 ORDER BY d.drone_sn
                 """.strip(),
-                (start.isoformat(), end.isoformat()),
+                params,
             ).fetchall()
-            conn.commit()
             result: list[dict[str, Any]] = []
             for r in rows:
                 result.append(
@@ -301,42 +1132,494 @@ class SqliteStore:
                     }
                 )
             return result
-        finally:
-            conn.close()
 
+    def _summary_source(
+        self,
+        conn: sqlite3.Connection,
+        start: dt.date,
+        end: dt.date,
+        drone_type: str | None,
+        drone_version: str | None,
+        today: dt.date | None = None,
+    ) -> tuple[str, list[Any]]:
+        """SELECT of per-drone range totals (filtered), for use as a CTE."""
+        total_expr, params = self._range_seconds_expr(conn, start, end)
+        today_col = ""
+        if today is not None:
+            today_col = (
+                ", (SELECT f.today_flight_time FROM t_fly_time f"
+                " WHERE f.drone_sn = d.drone_sn AND f.fly_date = ?) AS today_seconds"
+            )
+            params.append(today.isoformat())
+        filters: list[str] = []
+        if drone_type is not None:
+            filters.append("d.drone_type = ?")
+            params.append(drone_type)
+        if drone_version is not None:
+            filters.append("d.drone_version = ?")
+            params.append(drone_version)
+        where = f" WHERE {' AND '.join(filters)}" if filters else ""
+        sql = (
+            "SELECT d.drone_sn, d.drone_type, d.drone_version,"
+            f" {total_expr} AS total_seconds{today_col} FROM t_drone d{where}"
+        )
+        return sql, params
+
+    @_timed
+    def summary_page(
+        self,
+        start: dt.date,
+        end: dt.date,
+        sort: str = "sn",
+        descending: bool = False,
+        limit: int = 100,
+        after: tuple[Any, str] | None = None,
+        drone_type: str | None = None,
+        drone_version: str | None = None,
+    ) -> tuple[dict[str, list[Any]], tuple[Any, str] | None]:
+        """One page of range totals ordered by ``sort`` (then drone_sn), column-oriented.
+
+        ``after`` is the (sort value, drone_sn) key of the previous page's last
+        row; returns the page and the key for the next one (None on the last
+        page). Columns include ``today_seconds`` when the range contains today.
+        """
+        key = SUMMARY_SORTS[sort]
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        today = dt.date.today()
+        with self._read() as conn:
+            source, params = self._summary_source(
+                conn, start, end, drone_type, drone_version, today if start <= today <= end else None
+            )
+            keyset = ""
+            if after is not None:
+                keyset = f" WHERE ({key}, drone_sn) {op} (?, ?)"
+                params += list(after)
+            rows = conn.execute(
+                f"WITH s AS ({source}) SELECT *, {key} AS sort_key FROM s{keyset}"
+                f" ORDER BY {key} {direction}, drone_sn {direction} LIMIT ?",
+                params + [max(1, limit) + 1],
+            ).fetchall()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        page: dict[str, list[Any]] = {
+            "drone_sn": [r["drone_sn"] for r in rows],
+            "drone_type": [r["drone_type"] for r in rows],
+            "drone_version": [r["drone_version"] for r in rows],
+            "total_seconds": [int(r["total_seconds"] or 0) for r in rows],
+        }
+        if start <= today <= end:
+            page["today_seconds"] = [int(r["today_seconds"] or 0) for r in rows]
+        next_key = (rows[-1]["sort_key"], rows[-1]["drone_sn"]) if more and rows else None
+        return page, next_key
+
+    @_timed
+    def summary_groups(
+        self,
+        start: dt.date,
+        end: dt.date,
+        by: str = "type",
+        drone_type: str | None = None,
+        drone_version: str | None = None,
+    ) -> dict[str, list[Any]]:
+        """Range totals and drone counts per drone type (or version), column-oriented."""
+        column = SUMMARY_GROUPS[by]
+        with self._read() as conn:
+            source, params = self._summary_source(conn, start, end, drone_type, drone_version)
+            rows = conn.execute(
+                f"WITH s AS ({source}) SELECT {column}, COUNT(*), SUM(total_seconds)"
+                f" FROM s GROUP BY {column} ORDER BY {column}",
+                params,
+            ).fetchall()
+        return {
+            column: [r[0] for r in rows],
+            "drones": [int(r[1]) for r in rows],
+            "total_seconds": [int(r[2] or 0) for r in rows],
+        }
+
+    @_timed
+    def rebuild_cum_flight_time(self) -> int:
+        """Recompute cum_flight_time from t_fly_time; returns the number of rows corrected."""
+        with self._write() as conn:
+            # Same as migration 0006: running totals per drone, applied by id.
+            conn.execute("CREATE TEMP TABLE _cum (id INTEGER PRIMARY KEY, cum INTEGER NOT NULL)")
+            conn.execute(
+                "INSERT INTO _cum (id, cum) SELECT id,"
+                " SUM(today_flight_time) OVER (PARTITION BY drone_sn ORDER BY fly_date) FROM t_fly_time"
+            )
+            cur = conn.execute(
+                "UPDATE t_fly_time SET cum_flight_time = (SELECT c.cum FROM _cum c WHERE c.id = t_fly_time.id)"
+                " WHERE cum_flight_time IS NOT (SELECT c.cum FROM _cum c WHERE c.id = t_fly_time.id)"
+            )
+            fixed = int(cur.rowcount or 0)
+            conn.execute("DROP TABLE _cum")
+            if fixed:
+                self._touch(everything=True)
+            return fixed
+
+    @_timed
     def drone_daily_breakdown(self, drone_sn: str, start: dt.date, end: dt.date) -> list[dict[str, Any]]:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             rows = conn.execute(
-                """
-                SELECT date(fly_date_time) AS fly_date, today_flight_time AS seconds
-                FROM t_fly_time
-                WHERE drone_sn = ? AND date(fly_date_time) BETWEEN ? AND ?
-                ORDER BY date(fly_date_time)
+                f"""
+                SELECT fly_date, today_flight_time AS seconds
+                FROM {self._day_source(conn, start, end)}
+                WHERE drone_sn = ? AND fly_date BETWEEN ? AND ?
+                ORDER BY fly_date
                 """.strip(),
                 (drone_sn, start.isoformat(), end.isoformat()),
             ).fetchall()
-            conn.commit()
             return [
                 {"fly_date": r["fly_date"], "seconds": int(r["seconds"] or 0)}
                 for r in rows
             ]
-        finally:
-            conn.close()
 
+    @_timed
+    def fleet_breakdown(
+        self, start: dt.date, end: dt.date, drone_sns: list[str] | None = None
+    ) -> dict[str, Any]:
+        """Range totals plus every day row for the fleet (or ``drone_sns``), column-oriented.
+
+        ``drones`` holds parallel columns in summary order; ``days`` holds
+        parallel (drone index, date index, seconds) columns, with date indexes
+        into ``dates``.
+        """
+        where = ""
+        params: list[Any] = []
+        if drone_sns:
+            where = f" WHERE drone_sn IN ({','.join('?' * len(drone_sns))})"
+            params = list(drone_sns)
+        with self._read() as conn:
+            drones = conn.execute(
+                f"SELECT drone_sn, drone_type, drone_version FROM t_drone{where} ORDER BY drone_sn",
+                params,
+            ).fetchall()
+            rows = conn.execute(
+                f"""
+                SELECT drone_sn, fly_date, today_flight_time
+                FROM {self._day_source(conn, start, end)}
+                WHERE fly_date BETWEEN ? AND ?{where.replace(" WHERE", " AND")}
+                ORDER BY drone_sn, fly_date
+                """.strip(),
+                [start.isoformat(), end.isoformat()] + params,
+            ).fetchall()
+
+        index = {r[0]: i for i, r in enumerate(drones)}
+        totals = [0] * len(drones)
+        dates = [
+            (start + dt.timedelta(days=i)).isoformat() for i in range((end - start).days + 1)
+        ]
+        date_index = {d: i for i, d in enumerate(dates)}
+        day_drone: list[int] = []
+        day_date: list[int] = []
+        day_seconds: list[int] = []
+        for sn, fly_date, seconds in rows:
+            i = index.get(sn)
+            if i is None:  # day row without a t_drone row
+                continue
+            seconds = int(seconds or 0)
+            totals[i] += seconds
+            day_drone.append(i)
+            day_date.append(date_index[fly_date])
+            day_seconds.append(seconds)
+
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "dates": dates,
+            "drones": {
+                "drone_sn": [r[0] for r in drones],
+                "drone_type": [r[1] for r in drones],
+                "drone_version": [r[2] for r in drones],
+                "total_seconds": totals,
+            },
+            "days": {"drone": day_drone, "date": day_date, "seconds": day_seconds},
+        }
+
+    def iter_day_rows(
+        self,
+        start: dt.date,
+        end: dt.date,
+        drone_sns: list[str] | None = None,
+        drone_type: str | None = None,
+        fetch_size: int = 1000,
+    ) -> Iterator[list[tuple[str, str, int, int, int]]]:
+        """Stream (drone_sn, fly_date, start_total, end_total, seconds) rows in batches.
+
+        Ordered by drone then date. Holds one pooled read connection until the
+        iterator is exhausted or closed, so callers must close it on abort.
+        """
+        sql = """
+            SELECT f.drone_sn, f.fly_date, f.today_start_total_flight_time,
+                   f.total_flight_time, f.today_flight_time
+            FROM {source} f
+        """
+        params: list[Any] = []
+        if drone_type is not None:
+            sql += " JOIN t_drone d ON d.drone_sn = f.drone_sn AND d.drone_type = ?"
+            params.append(drone_type)
+        sql += " WHERE f.fly_date BETWEEN ? AND ?"
+        params += [start.isoformat(), end.isoformat()]
+        if drone_sns:
+            sql += f" AND f.drone_sn IN ({','.join('?' * len(drone_sns))})"
+            params += drone_sns
+        sql += " ORDER BY f.drone_sn, f.fly_date"
+
+        with self._read() as conn:
+            cur = conn.execute(sql.format(source=self._day_source(conn, start, end)), params)
+            try:
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        return
+                    yield [(r[0], r[1], int(r[2]), int(r[3]), int(r[4])) for r in rows]
+            finally:
+                cur.close()
+
+    @_timed
+    def append_sample_blocks(self, blocks: Iterable[SampleBlock]) -> int:
+        """Append encoded segments to each drone-hour block, creating blocks as needed."""
+        rows = [(b.drone_sn, b.hour_start, b.sample_count, b.data) for b in blocks]
+        if not rows:
+            return 0
+        with self._write() as conn:
+            conn.executemany(
+                """
+                INSERT INTO t_flight_sample (drone_sn, hour_start, sample_count, data)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (drone_sn, hour_start) DO UPDATE SET
+                  sample_count = sample_count + excluded.sample_count,
+                  data = data || excluded.data
+                """.strip(),
+                rows,
+            )
+        return len(rows)
+
+    @_timed
+    def list_sample_blocks(
+        self, first_hour: int, last_hour: int, drone_sns: list[str] | None = None
+    ) -> list[SampleBlock]:
+        """Blocks with first_hour <= hour_start <= last_hour, ordered by drone then hour."""
+        where = "WHERE hour_start BETWEEN ? AND ?"
+        params: list[Any] = [first_hour, last_hour]
+        if drone_sns:
+            where += f" AND drone_sn IN ({','.join('?' * len(drone_sns))})"
+            params += drone_sns
+        with self._read() as conn:
+            tables = [
+                t.replace("t_fly_time", "t_flight_sample")
+                for t in self._day_tables(
+                    conn,
+                    dt.datetime.fromtimestamp(first_hour).date(),
+                    dt.datetime.fromtimestamp(last_hour).date(),
+                )
+            ]
+            sql = " UNION ALL ".join(
+                f"SELECT drone_sn, hour_start, sample_count, data FROM {t} {where}" for t in tables
+            )
+            sql += " ORDER BY drone_sn, hour_start"
+            return [
+                SampleBlock(r[0], int(r[1]), int(r[2]), bytes(r[3]))
+                for r in conn.execute(sql, params * len(tables)).fetchall()
+            ]
+
+    @_timed
     def get_revised_flag(self, drone_sn: str, day: dt.date) -> int | None:
-        conn = self._conn()
-        try:
+        with self._read() as conn:
             row = conn.execute(
                 """
                 SELECT revised_start_time
                 FROM t_fly_time
-                WHERE drone_sn = ? AND date(fly_date_time) = ?
+                WHERE drone_sn = ? AND fly_date = ?
                 LIMIT 1
                 """.strip(),
                 (drone_sn, day.isoformat()),
             ).fetchone()
-            conn.commit()
             return int(row[0]) if row else None
-        finally:
-            conn.close()
+
+    # -- multi-site sync --
+
+    @_timed
+    def sync_begin(self) -> tuple[str, int]:
+        """Open a pull: raise t_sync_state.served_seq to the newest change_seq.
+
+        Rows up to it may be handed out from now on, so each is re-stamped
+        when it next changes (see 0007). Returns (node_id, head); nothing is
+        written when no row changed since the last call.
+        """
+        with self._write() as conn:
+            node_id, head = conn.execute(
+                """
+                SELECT node_id, MAX(
+                  served_seq,
+                  COALESCE((SELECT MAX(change_seq) FROM t_drone), 0),
+                  COALESCE((SELECT MAX(change_seq) FROM t_fly_time), 0)
+                )
+                FROM t_sync_state WHERE id = 1
+                """.strip()
+            ).fetchone()
+            conn.execute("UPDATE t_sync_state SET served_seq = ? WHERE id = 1 AND served_seq < ?", (head, head))
+        return node_id, int(head)
+
+    @_timed
+    def changes_since(self, since: int, limit: int) -> dict[str, Any]:
+        """Drone and day rows changed after sequence ``since``, oldest first.
+
+        Read-only: only rows up to served_seq (raised by sync_begin) are
+        handed out, newer ones wait for the next sync_begin. At most
+        ``limit`` rows; ``next`` is the watermark to ask from next time,
+        ``more`` says whether rows past it are already waiting and ``head``
+        is the newest sequence number this response covers up to.
+        """
+        limit = max(1, limit)
+        # One row past the limit from each table tells whether more are waiting.
+        with self._read() as conn:
+            conn.execute("BEGIN")
+            node_id, head = conn.execute("SELECT node_id, served_seq FROM t_sync_state WHERE id = 1").fetchone()
+            drones = conn.execute(
+                f"""
+                SELECT change_seq, {", ".join(SYNC_DRONE_COLUMNS)}
+                FROM t_drone
+                WHERE change_seq > ? AND change_seq <= ?
+                ORDER BY change_seq
+                LIMIT ?
+                """.strip(),
+                (since, head, limit + 1),
+            ).fetchall()
+            days = conn.execute(
+                f"""
+                SELECT change_seq, {", ".join(SYNC_DAY_COLUMNS)}
+                FROM t_fly_time
+                WHERE change_seq > ? AND change_seq <= ?
+                ORDER BY change_seq
+                LIMIT ?
+                """.strip(),
+                (since, head, limit + 1),
+            ).fetchall()
+        more = len(drones) + len(days) > limit
+        upto = int(head)
+        if more:
+            upto = sorted(r[0] for r in drones + days)[limit - 1]
+            drones = [r for r in drones if r[0] <= upto]
+            days = [r for r in days if r[0] <= upto]
+        return {
+            "node_id": node_id,
+            "since": since,
+            "next": max(since, upto),
+            "more": more,
+            "head": int(head),
+            "drones": {c: [r[i + 1] for r in drones] for i, c in enumerate(SYNC_DRONE_COLUMNS)},
+            "days": {c: [r[i + 1] for r in days] for i, c in enumerate(SYNC_DAY_COLUMNS)},
+        }
+
+    @_timed
+    def sync_watermark(self, node: str) -> tuple[str | None, int]:
+        """(node_id, seq) last pulled from ``node``; (None, 0) before the first pull."""
+        with self._read() as conn:
+            row = conn.execute("SELECT node_id, seq FROM t_sync_node WHERE node = ?", (node,)).fetchone()
+            return (row[0], int(row[1])) if row else (None, 0)
+
+    @_timed
+    def apply_sync_batch(self, node: str, url: str, batch: dict[str, Any]) -> int:
+        """Merge one /api/sync/changes batch from ``node`` and advance its watermark.
+
+        The node's day rows replace what it sent before (t_sync_fly_time);
+        each touched drone-day in t_fly_time is then rebuilt from every
+        node's copy: the earliest start total, the largest total, and the sum
+        of each node's seconds. Days in archived years are skipped.
+        Returns the number of rows applied.
+        """
+        drones = list(zip(*(batch["drones"][c] for c in SYNC_DRONE_COLUMNS)))
+        days = [
+            r
+            for r in zip(*(batch["days"][c] for c in SYNC_DAY_COLUMNS))
+            if dt.date.fromisoformat(r[1]).year not in self._archives
+        ]
+        skipped = len(batch["days"]["drone_sn"]) - len(days)
+        if skipped:
+            logger.warning("Skipped %s synced day(s) from %s in archived years", skipped, node)
+        keys = sorted({(r[0], r[1]) for r in days})
+        with self._write() as conn:
+            for sn, drone_type, version in drones:
+                self._upsert_drone(conn, sn, drone_type, version)
+            conn.executemany(
+                "INSERT OR IGNORE INTO t_drone (drone_sn) VALUES (?)",
+                sorted({(k[0],) for k in keys}),
+            )
+            conn.executemany(
+                f"""
+                INSERT OR REPLACE INTO t_sync_fly_time (node, {", ".join(SYNC_DAY_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """.strip(),
+                [(node,) + tuple(r) for r in days],
+            )
+            # Only rows whose merged values changed are written (and re-stamped).
+            conn.executemany(
+                """
+                INSERT INTO t_fly_time (
+                    drone_sn, fly_date, fly_date_time, revised_start_time,
+                    today_start_total_flight_time, total_flight_time, today_flight_time,
+                    updated_at
+                )
+                SELECT drone_sn, fly_date, MAX(fly_date_time), MAX(revised_start_time),
+                       MIN(today_start_total_flight_time), MAX(total_flight_time),
+                       SUM(today_flight_time), CURRENT_TIMESTAMP
+                FROM t_sync_fly_time
+                WHERE drone_sn = ? AND fly_date = ?
+                GROUP BY drone_sn, fly_date
+                ON CONFLICT(drone_sn, fly_date) DO UPDATE SET
+                  fly_date_time = excluded.fly_date_time,
+                  revised_start_time = excluded.revised_start_time,
+                  today_start_total_flight_time = excluded.today_start_total_flight_time,
+                  total_flight_time = excluded.total_flight_time,
+                  today_flight_time = excluded.today_flight_time,
+                  updated_at = CURRENT_TIMESTAMP
+                WHERE t_fly_time.fly_date_time IS NOT excluded.fly_date_time
+                  OR t_fly_time.revised_start_time IS NOT excluded.revised_start_time
+                  OR t_fly_time.today_start_total_flight_time IS NOT excluded.today_start_total_flight_time
+                  OR t_fly_time.total_flight_time IS NOT excluded.total_flight_time
+                  OR t_fly_time.today_flight_time IS NOT excluded.today_flight_time
+                """.strip(),
+                keys,
+            )
+            conn.execute(
+                """
+                INSERT INTO t_sync_node (node, url, node_id, seq, rows, pulled_at, error)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, NULL)
+                ON CONFLICT(node) DO UPDATE SET
+                  url = excluded.url,
+                  node_id = excluded.node_id,
+                  seq = excluded.seq,
+                  rows = t_sync_node.rows + excluded.rows,
+                  pulled_at = excluded.pulled_at,
+                  error = NULL
+                """.strip(),
+                (node, url, batch["node_id"], int(batch["next"]), len(drones) + len(days)),
+            )
+            self._touch(
+                days={dt.date.fromisoformat(k[1]) for k in keys},
+                drones={sn for sn, *_ in drones} | {k[0] for k in keys},
+                drone_list=bool(drones or keys),
+            )
+        return len(drones) + len(days)
+
+    @_timed
+    def record_sync_error(self, node: str, url: str, error: str) -> None:
+        with self._write() as conn:
+            conn.execute(
+                """
+                INSERT INTO t_sync_node (node, url, error) VALUES (?, ?, ?)
+                ON CONFLICT(node) DO UPDATE SET url = excluded.url, error = excluded.error
+                """.strip(),
+                (node, url, error[:500]),
+            )
+
+    @_timed
+    def sync_nodes(self) -> list[dict[str, Any]]:
+        """Sync status of every node this database has pulled from."""
+        with self._read() as conn:
+            rows = conn.execute(
+                "SELECT node, url, node_id, seq, rows, pulled_at, error FROM t_sync_node ORDER BY node"
+            ).fetchall()
+        keys = ("node", "url", "node_id", "seq", "rows", "pulled_at", "error")
+        return [dict(zip(keys, r)) for r in rows]
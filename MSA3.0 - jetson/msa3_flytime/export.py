@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Iterable, Iterator
+
+EXPORT_COLUMNS = ("drone_sn", "fly_date", "start_total_seconds", "end_total_seconds", "seconds")
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+# Rows are buffered into chunks of about this size before being sent.
+CHUNK_BYTES = 64 * 1024
+
+
+def _chunked(pieces: Iterable[str]) -> Iterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf).encode("utf-8")
+            buf.clear()
+            size = 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _csv_pieces(batches: Iterable[list[tuple]]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield out.getvalue()
+    for rows in batches:
+        out.seek(0)
+        out.truncate()
+        writer.writerows(rows)
+        yield out.getvalue()
+
+
+def _ndjson_pieces(batches: Iterable[list[tuple]]) -> Iterator[str]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, r)), ensure_ascii=False, separators=(",", ":")) + "\n"
+            for r in rows
+        )
+
+
+def encode_export(batches: Iterator[list[tuple]], fmt: str) -> Iterator[bytes]:
+    """Encode row batches from SqliteStore.iter_day_rows as CSV or NDJSON chunks.
+
+    Closing the returned iterator closes ``batches`` (and its read connection).
+    """
+    pieces = _csv_pieces(batches) if fmt == "csv" else _ndjson_pieces(batches)
+    try:
+        yield from _chunked(pieces)
+    finally:
+        pieces.close()
+        batches.close()  # type: ignore[attr-defined]
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Callable, Tuple
+
+from .metrics import REGISTRY
+
+try:  # in requirements.txt; the stdlib parser is the fallback
+    import orjson as _orjson  # type: ignore
+except Exception:  # pragma: no cover
+    _orjson = None
+
+FIELD = "total_flight_time"
+FIELD_BYTES = FIELD.encode("ascii")
+
+_WRAPPERS = ("data", "osd", "state", "payload")
+
+JsonPath = Tuple[Any, ...]
+
+OSD_PAYLOADS = REGISTRY.counter(
+    "msa3_osd_payloads_total",
+    "OSD payloads by extraction result (rejected, unparsable, no_field, extracted).",
+    ["result"],
+)
+_RESULTS = ("rejected", "unparsable", "no_field", "extracted")
+_REJECTED, _UNPARSABLE, _NO_FIELD, _EXTRACTED = range(len(_RESULTS))
+
+# Results reach OSD_PAYLOADS in batches: a locked counter update per message
+# costs more than following a learned path.
+_PUBLISH_EVERY = 256
+_PUBLISH_SECONDS = 1.0
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def stdlib_loads(payload: bytes) -> Any:
+    # json.loads(bytes) sniffs the encoding in Python first; MQTT payloads are UTF-8.
+    return _JSON_DECODER.decode(payload.decode("utf-8"))
+
+
+def default_loads() -> Callable[[bytes], Any]:
+    return _orjson.loads if _orjson is not None else stdlib_loads
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def find_total_flight_time_path(payload: Any, _depth: int = 0) -> JsonPath | None:
+    """Locate total_flight_time in an unknown JSON shape; returns the key/index path."""
+    if _depth > 8:
+        return None
+
+    if isinstance(payload, dict):
+        # direct
+        if _is_number(payload.get(FIELD)):
+            return (FIELD,)
+
+        # common wrappers
+        for key in _WRAPPERS:
+            if key in payload:
+                sub = find_total_flight_time_path(payload[key], _depth + 1)
+                if sub is not None:
+                    return (key,) + sub
+
+        # deep scan (bounded)
+        for key, v in list(payload.items())[:50]:
+            if key in _WRAPPERS or not isinstance(v, (dict, list)):
+                continue
+            sub = find_total_flight_time_path(v, _depth + 1)
+            if sub is not None:
+                return (key,) + sub
+
+    elif isinstance(payload, list):
+        for i, item in enumerate(payload[:50]):
+            if not isinstance(item, (dict, list)):
+                continue
+            sub = find_total_flight_time_path(item, _depth + 1)
+            if sub is not None:
+                return (i,) + sub
+
+    return None
+
+
+def _follow(payload: Any, path: JsonPath) -> float | None:
+    node = payload
+    try:
+        for step in path:
+            node = node[step]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return float(node) if _is_number(node) else None
+
+
+class TotalFlightTimeExtractor:
+    """total_flight_time extraction that learns where each drone puts the field.
+
+    Payloads without the field name are rejected before JSON parsing. The first
+    payload from a drone is deep-scanned; afterwards the learned path is followed
+    directly. Paths seen on other drones (same gateway/model shape) are tried
+    before falling back to a scan. Results are published to
+    msa3_osd_payloads_total every 256 messages or second (and by stats()).
+    """
+
+    def __init__(self, loads: Callable[[bytes], Any] | None = None, max_shared_paths: int = 8):
+        self._loads = loads or default_loads()
+        self._paths: dict[str, JsonPath] = {}
+        self._shared: list[JsonPath] = []
+        self._max_shared = max_shared_paths
+
+        self.rejected = 0
+        self.path_hits = 0
+        self.scans = 0
+        self.misses = 0
+        self._unpublished = [0] * len(_RESULTS)
+        self._pending = 0
+        self._published_at = time.monotonic()
+
+    @staticmethod
+    def _parse_lenient(payload: bytes) -> Any:
+        try:
+            return json.loads(payload.decode("utf-8", errors="ignore"))
+        except Exception:
+            return None
+
+    def extract(self, drone_sn: str, payload: bytes) -> float | None:
+        # Publishes the counts of earlier messages; kept inline, this runs per message.
+        self._pending += 1
+        if self._pending >= _PUBLISH_EVERY or time.monotonic() - self._published_at >= _PUBLISH_SECONDS:
+            self.publish()
+        counts = self._unpublished
+
+        if FIELD_BYTES not in payload:
+            self.rejected += 1
+            counts[_REJECTED] += 1
+            return None
+
+        try:
+            doc = self._loads(payload)
+        except Exception:
+            doc = self._parse_lenient(payload)
+        if doc is None:
+            self.misses += 1
+            counts[_UNPARSABLE] += 1
+            return None
+
+        path = self._paths.get(drone_sn)
+        if path is not None:
+            value = _follow(doc, path)
+            if value is not None:
+                self.path_hits += 1
+                counts[_EXTRACTED] += 1
+                return value
+
+        for shared in self._shared:
+            if shared is path:
+                continue
+            value = _follow(doc, shared)
+            if value is not None:
+                self._paths[drone_sn] = shared
+                self.path_hits += 1
+                counts[_EXTRACTED] += 1
+                return value
+
+        self.scans += 1
+        found = find_total_flight_time_path(doc)
+        if found is None:
+            self.misses += 1
+            counts[_NO_FIELD] += 1
+            return None
+        self._learn(drone_sn, found)
+        counts[_EXTRACTED] += 1
+        return _follow(doc, found)
+
+    def publish(self) -> None:
+        """Add results counted since the last call to msa3_osd_payloads_total."""
+        for result, count in enumerate(self._unpublished):
+            if count:
+                OSD_PAYLOADS.inc(count, (_RESULTS[result],))
+                self._unpublished[result] = 0
+        self._pending = 0
+        self._published_at = time.monotonic()
+
+    def _learn(self, drone_sn: str, path: JsonPath) -> None:
+        for shared in self._shared:
+            if shared == path:
+                path = shared
+                break
+        else:
+            self._shared.insert(0, path)
+            del self._shared[self._max_shared:]
+        self._paths[drone_sn] = path
+
+    def stats(self) -> dict[str, int]:
+        self.publish()
+        return {
+            "rejected": self.rejected,
+            "path_hits": self.path_hits,
+            "scans": self.scans,
+            "misses": self.misses,
+            "learned_drones": len(self._paths),
+        }
@@ -1,30 +1,160 @@
 from __future__ import annotations
 
+import base64
+import binascii
 import datetime as dt
 import json
-import mimetypes
-import os
+import time
+from dataclasses import dataclass, field
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Hashable, Iterator, Mapping
 from urllib.parse import parse_qs, unquote, urlparse
 
-from .db import SqliteStore
+from .cache import CacheScope, ResponseCache, etag_matches
+from .db import SUMMARY_GROUPS, SUMMARY_SORTS, SqliteStore
+from .export import EXPORT_FORMATS, encode_export
+from .iostats import WriteAccounting
+from .live import EVENT_STREAM_CONTENT_TYPE, LiveHub
+from .samples import FlightSampler
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from .ratelimit import LIMITED_DRONES
+from .static_assets import StaticAssets
+from .sync import encode_changes
+from .writer import OsdWriter
+
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "msa3_http_request_seconds", "HTTP request latency in seconds by route.", ["route"]
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "msa3_http_requests_total", "HTTP requests by route and status code.", ["route", "status"]
+)
+RESPONSE_CACHE_ENTRIES = REGISTRY.gauge("msa3_http_response_cache_entries", "Cached API responses.")
+RESPONSE_CACHE_HITS = REGISTRY.gauge("msa3_http_response_cache_hits", "API response cache hits since start.")
+RESPONSE_CACHE_MISSES = REGISTRY.gauge("msa3_http_response_cache_misses", "API response cache misses since start.")
+
+_API_ROUTES = (
+    "/api/health",
+    "/api/metrics",
+    "/api/drones",
+    "/api/summary",
+    "/api/fleet",
+    "/api/export",
+    "/api/live",
+    "/api/sessions",
+    "/api/storage",
+    "/api/sync/begin",
+    "/api/sync/changes",
+    "/api/sync/nodes",
+)
+
+# The only routes that write; they take POST and nothing else.
+_POST_ROUTES = ("/api/sync/begin",)
+
+
+@dataclass(frozen=True)
+class Request:
+    """Transport-independent request; header names are lower-case. Bodies are not kept."""
+
+    path: str
+    headers: Mapping[str, str] = field(default_factory=dict)
+    method: str = "GET"
+
+    def header(self, name: str) -> str | None:
+        return self.headers.get(name.lower())
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes = b""
+    headers: list[tuple[str, str]] = field(default_factory=list)
+    # Streamed body (sent chunked); the transport must close() it when done.
+    stream: Iterator[bytes] | None = None
+
+    def header_block(self, chunked: bool = True) -> list[tuple[str, str]]:
+        """Headers to send, with Content-Length unless the status forbids a body.
+
+        A streamed body uses chunked transfer encoding; HTTP/1.0 peers get it
+        unframed and the connection closed after it (``chunked=False``).
+        """
+        if self.status == HTTPStatus.NOT_MODIFIED or self.status < 200:
+            return list(self.headers)
+        if self.stream is not None:
+            return list(self.headers) + ([("Transfer-Encoding", "chunked")] if chunked else [])
+        return list(self.headers) + [("Content-Length", str(len(self.body)))]
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.close()  # type: ignore[attr-defined]
+
+
+def chunk_frame(data: bytes) -> bytes:
+    return b"%x\r\n%s\r\n" % (len(data), data)
+
+
+LAST_CHUNK = b"0\r\n\r\n"
+
+
+def _bytes_response(
+    status: int,
+    body: bytes,
+    content_type: str,
+    cache_control: str = "no-store",
+    etag: str | None = None,
+) -> Response:
+    headers = [("Content-Type", content_type), ("Cache-Control", cache_control)]
+    if etag is not None:
+        headers.append(("ETag", etag))
+    return Response(status, body, headers)
+
+
+def _json(status: int, data: Any) -> Response:
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    return _bytes_response(status, body, JSON_CONTENT_TYPE)
 
 
-def _json(handler: BaseHTTPRequestHandler, status: int, data: Any) -> None:
-    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
-    handler.send_response(status)
-    handler.send_header("Content-Type", "application/json; charset=utf-8")
-    handler.send_header("Content-Length", str(len(body)))
-    handler.send_header("Cache-Control", "no-store")
-    handler.end_headers()
-    handler.wfile.write(body)
+def _bad_request(message: str) -> Response:
+    return _json(HTTPStatus.BAD_REQUEST, {"error": message})
+
+
+def error_response(status: int, message: str | None = None) -> Response:
+    text = message or HTTPStatus(status).phrase
+    return _bytes_response(status, (text + "\n").encode("utf-8"), TEXT_CONTENT_TYPE)
+
+
+# /api/summary query parameters that select the paged (column-oriented) response.
+_SUMMARY_PAGE_PARAMS = ("sort", "order", "limit", "cursor", "type", "version", "group")
 
+# Page size when the client does not pass limit=.
+_DEFAULT_PAGE = 100
 
-def _bad_request(handler: BaseHTTPRequestHandler, message: str) -> None:
-    _json(handler, HTTPStatus.BAD_REQUEST, {"error": message})
+# Most rows one /api/sync/changes response carries.
+_SYNC_LIMIT_MAX = 50000
+
+# Most rate-limited drones listed by /api/health.
+_HEALTH_LIMITED_TOP = 10
+
+
+def _encode_cursor(sort: str, order: str, key: tuple[Any, str]) -> str:
+    raw = json.dumps([sort, order, key[0], key[1]], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple[Any, str] | None:
+    """The keyset key in ``cursor``, or None if it is malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_order, value, sn = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if c_sort != sort or c_order != order or not isinstance(sn, str):
+        return None
+    return value, sn
 
 
 def _parse_date(value: str | None) -> dt.date | None:
@@ -36,6 +166,17 @@ def _parse_date(value: str | None) -> dt.date | None:
         return None
 
 
+def route_label(path: str) -> str:
+    # Bounded label set: never put drone SNs or file names into metric labels.
+    if path in _API_ROUTES:
+        return path
+    if path.startswith("/api/drone/") and path.endswith("/range"):
+        return "/api/drone/{sn}/range"
+    if path.startswith("/api/"):
+        return "/api/other"
+    return "static"
+
+
 def _seconds_to_hhmm(seconds: int) -> str:
     seconds = max(0, int(seconds))
     hours = seconds // 3600
@@ -43,123 +184,477 @@ def _seconds_to_hhmm(seconds: int) -> str:
     return f"{hours:02d}:{minutes:02d}"
 
 
-class AppHandler(BaseHTTPRequestHandler):
-    store: SqliteStore
-    static_dir: Path
-
-    def log_message(self, fmt: str, *args) -> None:  # quiet default
-        return
-
-    def do_GET(self) -> None:
-        parsed = urlparse(self.path)
+class FlyTimeApp:
+    """Routes for the UI and /api/*, independent of the HTTP transport.
+
+    handle() may block on SQLite; the threaded server calls it on the
+    connection thread, the asyncio server on its bounded executor.
+    """
+
+    def __init__(
+        self,
+        store: SqliteStore,
+        static_dir: Path,
+        writer: OsdWriter | None = None,
+        cache_entries: int = 256,
+        past_max_age: int = 3600,
+        static_dev: bool = False,
+        live: LiveHub | None = None,
+        live_interval: float = 1.0,
+        samples: FlightSampler | None = None,
+        storage: WriteAccounting | None = None,
+        page_max: int = 500,
+    ):
+        self.store = store
+        self.assets = StaticAssets(static_dir, dev_mode=static_dev)
+        self.writer = writer
+        self.cache = ResponseCache(store.versions, cache_entries)
+        self.past_max_age = past_max_age
+        self.live = live
+        self.live_interval = live_interval
+        self.samples = samples
+        self.storage = storage
+        self.page_max = max(1, page_max)
+
+        cache = self.cache
+        RESPONSE_CACHE_ENTRIES.set_callback(lambda: cache.stats()["entries"])
+        RESPONSE_CACHE_HITS.set_callback(lambda: cache.hits)
+        RESPONSE_CACHE_MISSES.set_callback(lambda: cache.misses)
+
+    def handle(self, request: Request) -> Response:
+        parsed = urlparse(request.path)
         path = parsed.path
-        qs = parse_qs(parsed.query)
-
-        if path.startswith("/api/"):
-            self._handle_api(path, qs)
-            return
-
-        self._handle_static(path)
-
-    def _handle_api(self, path: str, qs: dict[str, list[str]]) -> None:
+        route = route_label(path)
+
+        t0 = time.perf_counter()
+        resp: Response | None = None
+        try:
+            if path in _POST_ROUTES:
+                resp = self._handle_post(request, path)
+            elif request.method != "GET":
+                resp = error_response(HTTPStatus.NOT_IMPLEMENTED, "Unsupported method")
+            elif path.startswith("/api/"):
+                resp = self._handle_api(request, path, parse_qs(parsed.query))
+            else:
+                resp = self._handle_static(request, path)
+            return resp
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - t0, (route,))
+            HTTP_REQUESTS.inc(labels=(route, str(resp.status if resp is not None else 500)))
+
+    def _cached_json(
+        self, request: Request, key: Hashable, scope: CacheScope, build: Callable[[], Any]
+    ) -> Response:
+        """JSON response from the response cache, honouring If-None-Match."""
+        entry = self.cache.get(key)
+        if entry is None:
+            # Take the version before querying so a concurrent write invalidates us.
+            version = self.store.versions.current()
+            body = json.dumps(build(), ensure_ascii=False).encode("utf-8")
+            entry = self.cache.put(key, version, scope, body)
+
+        if scope.end is not None and scope.end < dt.date.today():
+            cache_control = f"max-age={int(self.past_max_age)}"
+        else:
+            # Live data: browsers revalidate every time and get 304 until a write.
+            cache_control = "no-cache"
+
+        if etag_matches(request.header("If-None-Match"), entry.etag):
+            return Response(HTTPStatus.NOT_MODIFIED, headers=[("ETag", entry.etag), ("Cache-Control", cache_control)])
+        return _bytes_response(HTTPStatus.OK, entry.body, JSON_CONTENT_TYPE, cache_control, entry.etag)
+
+    def _handle_api(self, request: Request, path: str, qs: dict[str, list[str]]) -> Response:
         if path == "/api/health":
-            _json(self, 200, {"ok": True})
-            return
+            data: dict[str, Any] = {"ok": True}
+            if self.writer is not None:
+                data["ingest"] = self.writer.stats()
+            limited = LIMITED_DRONES.top(_HEALTH_LIMITED_TOP)
+            if limited:
+                data["ingest_limited"] = limited
+            data["response_cache"] = self.cache.stats()
+            return _json(200, data)
+
+        if path == "/api/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            return _bytes_response(HTTPStatus.OK, body, METRICS_CONTENT_TYPE)
+
+        if path == "/api/storage":
+            if self.storage is None:
+                return _json(200, {"sqlite": self.store.storage_stats()})
+            return _json(200, self.storage.snapshot())
+
+        if path == "/api/sync/changes":
+            return self._sync_changes(request, qs)
+
+        if path == "/api/sync/nodes":
+            return _json(200, self.store.sync_nodes())
 
         if path == "/api/drones":
-            drones = self.store.list_drones()
-            _json(
-                self,
-                200,
-                [
+            def build_drones() -> Any:
+                return [
                     {"drone_sn": d.drone_sn, "drone_type": d.drone_type, "drone_version": d.drone_version}
-                    for d in drones
-                ],
-            )
-            return
+                    for d in self.store.list_drones()
+                ]
+
+            return self._cached_json(request, ("drones",), CacheScope(), build_drones)
 
         if path == "/api/summary":
             start = _parse_date((qs.get("start") or [None])[0])
             end = _parse_date((qs.get("end") or [None])[0])
             if not start or not end:
-                _bad_request(self, "Missing or invalid start/end (YYYY-MM-DD)")
-                return
+                return _bad_request("Missing or invalid start/end (YYYY-MM-DD)")
+            if end < start:
+                return _bad_request("end must be >= start")
+            if any(p in qs for p in _SUMMARY_PAGE_PARAMS):
+                return self._summary_page(request, qs, start, end)
+
+            def build_summary() -> Any:
+                rows = self.store.summary_by_range(start, end)
+                for r in rows:
+                    r["total_hhmm"] = _seconds_to_hhmm(int(r["total_seconds"]))
+                return rows
+
+            return self._cached_json(request, ("summary", start, end), CacheScope(start, end), build_summary)
+
+        if path == "/api/live":
+            return self._live()
+
+        if path == "/api/sessions":
+            return self._sessions(qs)
+
+        if path == "/api/fleet":
+            start = _parse_date((qs.get("start") or [None])[0])
+            end = _parse_date((qs.get("end") or [None])[0])
+            if not start or not end:
+                return _bad_request("Missing or invalid start/end (YYYY-MM-DD)")
             if end < start:
-                _bad_request(self, "end must be >= start")
-                return
+                return _bad_request("end must be >= start")
+            drones = sorted({sn for value in qs.get("drone", []) for sn in value.split(",") if sn})
 
-            rows = self.store.summary_by_range(start, end)
-            for r in rows:
-                r["total_hhmm"] = _seconds_to_hhmm(int(r["total_seconds"]))
-            _json(self, 200, rows)
-            return
+            def build_fleet() -> Any:
+                return self.store.fleet_breakdown(start, end, drones or None)
+
+            return self._cached_json(
+                request, ("fleet", start, end, tuple(drones)), CacheScope(start, end), build_fleet
+            )
 
         if path.startswith("/api/drone/") and path.endswith("/range"):
             # /api/drone/<sn>/range
             parts = path.split("/")
             if len(parts) != 5:
-                _bad_request(self, "Invalid path")
-                return
+                return _bad_request("Invalid path")
             drone_sn = unquote(parts[3])
             start = _parse_date((qs.get("start") or [None])[0])
             end = _parse_date((qs.get("end") or [None])[0])
             if not start or not end:
-                _bad_request(self, "Missing or invalid start/end (YYYY-MM-DD)")
-                return
+                return _bad_request("Missing or invalid start/end (YYYY-MM-DD)")
             if end < start:
-                _bad_request(self, "end must be >= start")
-                return
+                return _bad_request("end must be >= start")
+
+            def build_range() -> Any:
+                rows = self.store.drone_daily_breakdown(drone_sn, start, end)
+                for r in rows:
+                    r["hhmm"] = _seconds_to_hhmm(int(r["seconds"]))
+                return {"drone_sn": drone_sn, "days": rows}
 
-            rows = self.store.drone_daily_breakdown(drone_sn, start, end)
-            for r in rows:
-                r["hhmm"] = _seconds_to_hhmm(int(r["seconds"]))
-            _json(self, 200, {"drone_sn": drone_sn, "days": rows})
-            return
+            return self._cached_json(
+                request, ("range", drone_sn, start, end), CacheScope(start, end, drone_sn), build_range
+            )
 
-        _json(self, HTTPStatus.NOT_FOUND, {"error": "not found"})
+        if path == "/api/export":
+            return self._export(qs)
+
+        return _json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def _export(self, qs: dict[str, list[str]]) -> Response:
+        """Stream day rows as CSV/NDJSON; filters: drone=<sn>[,<sn>...] (repeatable), type=<drone_type>."""
+        start = _parse_date((qs.get("start") or [None])[0])
+        end = _parse_date((qs.get("end") or [None])[0])
+        if not start or not end:
+            return _bad_request("Missing or invalid start/end (YYYY-MM-DD)")
+        if end < start:
+            return _bad_request("end must be >= start")
+        fmt = (qs.get("format") or ["csv"])[0].lower()
+        if fmt not in EXPORT_FORMATS:
+            return _bad_request("format must be csv or ndjson")
+        drones = [sn for value in qs.get("drone", []) for sn in value.split(",") if sn]
+        drone_type = (qs.get("type") or [None])[0] or None
+
+        batches = self.store.iter_day_rows(start, end, drone_sns=drones or None, drone_type=drone_type)
+        filename = f"flytime_{start.isoformat()}_{end.isoformat()}.{fmt}"
+        headers = [
+            ("Content-Type", EXPORT_FORMATS[fmt]),
+            ("Cache-Control", "no-store"),
+            ("Content-Disposition", f'attachment; filename="{filename}"'),
+        ]
+        return Response(HTTPStatus.OK, headers=headers, stream=encode_export(batches, fmt))
+
+    def _summary_page(
+        self, request: Request, qs: dict[str, list[str]], start: dt.date, end: dt.date
+    ) -> Response:
+        """Sorted, filtered, keyset-paginated range totals (or per-group aggregates with group=).
+
+        sort=total|sn|type|version, order=asc|desc, limit=<n> (at most page_max),
+        cursor=<next_cursor of the previous page>, type=<drone_type>, version=<drone_version>.
+        """
+        def arg(name: str) -> str | None:
+            return (qs.get(name) or [None])[0]
+
+        drone_type, drone_version = arg("type"), arg("version")
+        group = arg("group")
+        if group is not None:
+            if group not in SUMMARY_GROUPS:
+                return _bad_request(f"group must be one of: {', '.join(SUMMARY_GROUPS)}")
+
+            def build_groups() -> Any:
+                groups = self.store.summary_groups(start, end, group, drone_type, drone_version)
+                return {"start": start.isoformat(), "end": end.isoformat(), "group": group, "groups": groups}
+
+            return self._cached_json(
+                request,
+                ("summary_groups", start, end, group, drone_type, drone_version),
+                CacheScope(start, end),
+                build_groups,
+            )
 
-    def _handle_static(self, path: str) -> None:
+        sort = arg("sort") or "sn"
+        if sort not in SUMMARY_SORTS:
+            return _bad_request(f"sort must be one of: {', '.join(SUMMARY_SORTS)}")
+        order = arg("order") or ("desc" if sort == "total" else "asc")
+        if order not in ("asc", "desc"):
+            return _bad_request("order must be asc or desc")
+        try:
+            limit = int(arg("limit") or _DEFAULT_PAGE)
+        except ValueError:
+            return _bad_request("limit must be an integer")
+        if limit < 1:
+            return _bad_request("limit must be >= 1")
+        limit = min(limit, self.page_max)
+        cursor = arg("cursor")
+        after = None
+        if cursor:
+            after = _decode_cursor(cursor, sort, order)
+            if after is None:
+                return _bad_request("Invalid cursor for this sort/order")
+
+        def build_page() -> Any:
+            page, next_key = self.store.summary_page(
+                start, end, sort, order == "desc", limit, after, drone_type, drone_version
+            )
+            return {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "sort": sort,
+                "order": order,
+                "drones": page,
+                "next_cursor": _encode_cursor(sort, order, next_key) if next_key is not None else None,
+            }
+
+        return self._cached_json(
+            request,
+            ("summary_page", start, end, sort, order, limit, cursor, drone_type, drone_version),
+            CacheScope(start, end),
+            build_page,
+        )
+
+    def _handle_post(self, request: Request, path: str) -> Response:
+        if request.method != "POST":
+            resp = error_response(HTTPStatus.METHOD_NOT_ALLOWED)
+            resp.headers.append(("Allow", "POST"))
+            return resp
+        # /api/sync/begin: let an aggregator pull every change made so far (see SqliteStore.sync_begin).
+        node_id, head = self.store.sync_begin()
+        return _json(200, {"node_id": node_id, "head": head})
+
+    def _sync_changes(self, request: Request, qs: dict[str, list[str]]) -> Response:
+        """Rows changed after since=<seq> for an aggregator; limit=<n> rows per response."""
+        try:
+            since = int((qs.get("since") or ["0"])[0])
+            limit = int((qs.get("limit") or ["5000"])[0])
+        except ValueError:
+            return _bad_request("since and limit must be integers")
+        if since < 0 or limit < 1:
+            return _bad_request("since must be >= 0 and limit >= 1")
+        data = self.store.changes_since(since, min(limit, _SYNC_LIMIT_MAX))
+        body, encoding = encode_changes(data, request.header("Accept-Encoding"))
+        resp = _bytes_response(HTTPStatus.OK, body, JSON_CONTENT_TYPE)
+        resp.headers.append(("Vary", "Accept-Encoding"))
+        if encoding != "identity":
+            resp.headers.append(("Content-Encoding", encoding))
+        return resp
+
+    def _sessions(self, qs: dict[str, list[str]]) -> Response:
+        """Flight sessions from the sample store; filter: drone=<sn>[,<sn>...] (repeatable)."""
+        if self.samples is None:
+            return _json(HTTPStatus.NOT_FOUND, {"error": "flight samples disabled"})
+        start = _parse_date((qs.get("start") or [None])[0])
+        end = _parse_date((qs.get("end") or [None])[0])
+        if not start or not end:
+            return _bad_request("Missing or invalid start/end (YYYY-MM-DD)")
+        if end < start:
+            return _bad_request("end must be >= start")
+        drones = [sn for value in qs.get("drone", []) for sn in value.split(",") if sn]
+
+        sessions = self.samples.sessions(start, end, drones or None)
+        return _json(
+            HTTPStatus.OK,
+            {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "sessions": {
+                    "drone_sn": [s.drone_sn for s in sessions],
+                    "start_at": [s.start_at.isoformat(timespec="seconds") for s in sessions],
+                    "end_at": [s.end_at.isoformat(timespec="seconds") for s in sessions],
+                    "seconds": [s.seconds for s in sessions],
+                },
+            },
+        )
+
+    def _live(self) -> Response:
+        """Server-Sent Events of today's totals from the LiveHub (no SQLite reads)."""
+        if self.live is None:
+            return _json(HTTPStatus.NOT_FOUND, {"error": "live updates disabled"})
+        stream = self.live.subscribe(self.live_interval)
+        if stream is None:
+            resp = error_response(HTTPStatus.SERVICE_UNAVAILABLE, "Too many live clients")
+            resp.headers.append(("Retry-After", "5"))
+            return resp
+        headers = [
+            ("Content-Type", EVENT_STREAM_CONTENT_TYPE),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no"),
+        ]
+        return Response(HTTPStatus.OK, headers=headers, stream=stream)
+
+    def _handle_static(self, request: Request, path: str) -> Response:
         if path == "/":
             path = "/index.html"
 
         # Prevent directory traversal
         rel = path.lstrip("/")
         if ".." in rel or rel.startswith("\\"):
-            self.send_error(HTTPStatus.NOT_FOUND)
-            return
+            return error_response(HTTPStatus.NOT_FOUND)
 
-        file_path = (self.static_dir / rel).resolve()
-        if not str(file_path).startswith(str(self.static_dir.resolve())):
-            self.send_error(HTTPStatus.NOT_FOUND)
-            return
+        asset = self.assets.get(rel)
+        if asset is None:
+            return error_response(HTTPStatus.NOT_FOUND)
 
-        if not file_path.exists() or not file_path.is_file():
-            self.send_error(HTTPStatus.NOT_FOUND)
-            return
+        encoding, body = asset.select(request.header("Accept-Encoding"))
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        headers = [("ETag", etag), ("Cache-Control", asset.cache_control), ("Vary", "Accept-Encoding")]
 
-        ctype, _ = mimetypes.guess_type(str(file_path))
-        ctype = ctype or "application/octet-stream"
-        data = file_path.read_bytes()
+        if etag_matches(request.header("If-None-Match"), etag):
+            return Response(HTTPStatus.NOT_MODIFIED, headers=headers)
+        headers.insert(0, ("Content-Type", asset.content_type))
+        if encoding != "identity":
+            headers.append(("Content-Encoding", encoding))
+        return Response(HTTPStatus.OK, body, headers)
 
-        self.send_response(HTTPStatus.OK)
-        self.send_header("Content-Type", ctype)
-        self.send_header("Content-Length", str(len(data)))
-        self.send_header("Cache-Control", "no-store")
-        self.end_headers()
-        self.wfile.write(data)
 
+class AppHandler(BaseHTTPRequestHandler):
+    # Keep-alive: browsers reuse one connection for the UI's API calls.
+    protocol_version = "HTTP/1.1"
+    app: FlyTimeApp
 
-def serve(store: SqliteStore, host: str, port: int, static_dir: str) -> ThreadingHTTPServer:
+    def log_message(self, fmt: str, *args) -> None:  # quiet default
+        return
+
+    def do_GET(self) -> None:
+        self._respond("GET")
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)  # no API takes a body
+        self._respond("POST")
+
+    def _respond(self, method: str) -> None:
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        resp = self.app.handle(Request(self.path, headers, method))
+        chunked = self.request_version == "HTTP/1.1"
+        try:
+            self.send_response(resp.status)
+            for name, value in resp.header_block(chunked):
+                self.send_header(name, value)
+            if resp.stream is not None and not chunked:
+                self.close_connection = True
+            self.end_headers()
+            if resp.stream is not None:
+                for data in resp.stream:
+                    self.wfile.write(chunk_frame(data) if chunked else data)
+                if chunked:
+                    self.wfile.write(LAST_CHUNK)
+            elif resp.body and resp.status != HTTPStatus.NOT_MODIFIED:
+                self.wfile.write(resp.body)
+        except ConnectionError:
+            # Client went away (e.g. cancelled a download).
+            self.close_connection = True
+        finally:
+            resp.close()
+
+
+def serve(
+    store: SqliteStore,
+    host: str,
+    port: int,
+    static_dir: str,
+    writer: OsdWriter | None = None,
+    cache_entries: int = 256,
+    past_max_age: int = 3600,
+    static_dev: bool = False,
+    mode: str = "threaded",
+    workers: int = 4,
+    queue_max: int = 64,
+    request_timeout: float = 15.0,
+    keepalive_timeout: float = 15.0,
+    max_connections: int = 256,
+    live: LiveHub | None = None,
+    live_interval: float = 1.0,
+    samples: FlightSampler | None = None,
+    storage: WriteAccounting | None = None,
+    page_max: int = 500,
+) -> Any:
+    """Build the HTTP server; both modes expose serve_forever(), shutdown() and server_address."""
     static_path = Path(static_dir)
     if not static_path.exists():
         raise RuntimeError(f"static_dir not found: {static_dir}")
 
-    # Bind store/static to handler class
+    app = FlyTimeApp(
+        store,
+        static_path,
+        writer=writer,
+        cache_entries=cache_entries,
+        past_max_age=past_max_age,
+        static_dev=static_dev,
+        live=live,
+        live_interval=live_interval,
+        samples=samples,
+        storage=storage,
+        page_max=page_max,
+    )
+
+    if mode == "asyncio":
+        from .aio_server import AsyncHttpServer
+
+        return AsyncHttpServer(
+            app,
+            host,
+            port,
+            workers=workers,
+            queue_max=queue_max,
+            request_timeout=request_timeout,
+            keepalive_timeout=keepalive_timeout,
+            max_connections=max_connections,
+        )
+    if mode != "threaded":
+        raise ValueError(f"unknown HTTP server mode: {mode}")
+
+    # Bind the app to the handler class
     class _Handler(AppHandler):
         pass
 
-    _Handler.store = store
-    _Handler.static_dir = static_path
+    _Handler.app = app
+    _Handler.timeout = keepalive_timeout  # idle keep-alive connections release their thread
 
     server = ThreadingHTTPServer((host, port), _Handler)
     return server
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+import zlib
+from typing import Any
+
+from .config import Config
+from .extract import FIELD_BYTES, TotalFlightTimeExtractor
+from .metrics import REGISTRY
+from .mqtt_client import DEFERRED_POLL_S, MqttRunner, _extract_drone_sn_from_topic, connect_client, osd_subscription
+from .ratelimit import INGEST_LIMITED, LIMITED_DRONES, IngestLimiter, LimitedTally
+from .recorder import OsdRecorder
+
+logger = logging.getLogger(__name__)
+
+WORKER_MESSAGES = REGISTRY.gauge(
+    "msa3_mqtt_worker_messages",
+    "Messages seen by each ingest worker process since it started, by result.",
+    ["worker", "result"],
+)
+WORKER_RESTARTS = REGISTRY.counter("msa3_mqtt_worker_restarts_total", "Ingest worker processes restarted.")
+WORKER_STALE = REGISTRY.counter(
+    "msa3_mqtt_worker_stale_total", "Totals older than one already applied for the drone (dropped)."
+)
+
+_FLUSH_ITEMS = 500
+_FLUSH_SECONDS = 0.05
+_STATS_SECONDS = 5.0
+
+
+def shard_of(drone_sn: str, workers: int) -> int:
+    # crc32, not hash(): must agree across processes (hash() is salted per process).
+    return zlib.crc32(drone_sn.encode("utf-8")) % workers
+
+
+def _worker_main(index: int, cfg: Config, out: Any, stop: Any) -> None:
+    """Worker process: subscribe, extract totals, ship (sn, ts, total) batches to the parent."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s %(levelname)s worker-{index} %(name)s - %(message)s")
+    workers = cfg.mqtt_workers
+    shared = bool(cfg.mqtt_shared_group)
+    extractor = TotalFlightTimeExtractor()
+    recorder = OsdRecorder.from_config(cfg)
+    # Each worker gets an equal share of the budget; its per-drone counts are shipped to the parent.
+    tally = LimitedTally()
+    limiter = IngestLimiter.from_config(cfg, share=workers, tally=tally)
+    counts = {"received": 0, "topic": 0, "other_shard": 0, "limited": 0, "no_total": 0, "extracted": 0, "coalesced": 0}
+    # Latest (ts, total) per drone and day, like OsdWriter's queue: bounded by
+    # the fleet even while out.put() blocks on a slow parent.
+    buf: dict[tuple[str, dt.date], tuple[float, float]] = {}
+    lock = threading.Lock()
+    process_lock = threading.Lock()
+
+    def on_message(topic: str, payload: bytes) -> None:
+        ts = time.time()
+        counts["received"] += 1
+        drone_sn = _extract_drone_sn_from_topic(topic)
+        if not drone_sn:
+            counts["topic"] += 1
+            return
+        if not shared and shard_of(drone_sn, workers) != index:
+            counts["other_shard"] += 1
+            return
+        if limiter is not None and not limiter.admit(drone_sn, topic, payload, ts):
+            counts["limited"] += 1
+            return
+        with process_lock:
+            process(drone_sn, topic, payload, ts)
+
+    def process(drone_sn: str, topic: str, payload: bytes, ts: float) -> None:
+        if recorder is not None and FIELD_BYTES in payload:
+            recorder.record(topic, payload, ts)
+        total = extractor.extract(drone_sn, payload)
+        if total is None:
+            counts["no_total"] += 1
+            return
+        counts["extracted"] += 1
+        key = (drone_sn, dt.date.fromtimestamp(ts))
+        with lock:
+            older = buf.get(key)
+            if older is not None:
+                counts["coalesced"] += 1
+                if older[0] > ts:
+                    return
+            buf[key] = (ts, float(total))
+
+    client = connect_client(cfg, osd_subscription(cfg.mqtt_shared_group), on_message)
+    client.loop_start()
+    last_stats = time.monotonic()
+    last_deferred = time.monotonic()
+    try:
+        while not stop.is_set():
+            time.sleep(_FLUSH_SECONDS)
+            if limiter is not None and time.monotonic() - last_deferred >= DEFERRED_POLL_S:
+                last_deferred = time.monotonic()
+                for d in limiter.due():
+                    with process_lock:
+                        process(d.drone_sn, d.topic, d.payload, d.ts)
+            with lock:
+                items = sorted(buf.items(), key=lambda kv: kv[1][0])
+                buf.clear()
+            batch = [(drone_sn, ts, total) for (drone_sn, _), (ts, total) in items]
+            for i in range(0, len(batch), _FLUSH_ITEMS):
+                out.put(("totals", index, batch[i:i + _FLUSH_ITEMS]))
+            if time.monotonic() - last_stats >= _STATS_SECONDS:
+                last_stats = time.monotonic()
+                out.put(("stats", index, dict(counts)))
+                if limiter is not None:
+                    limited = tally.take()
+                    if limited:
+                        out.put(("limited", index, limited))
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        if recorder is not None:
+            recorder.close()
+
+
+class IngestWorkerPool:
+    """N worker processes doing MQTT receive and JSON extraction in parallel.
+
+    Workers split the fleet with an MQTT shared subscription
+    (``$share/<MQTT_SHARED_GROUP>/thing/product/+/osd``) or, when no group is
+    configured, each subscribes to everything and keeps only the drones whose
+    SN hashes to it. Extracted totals come back over one queue and go through
+    ``MqttRunner.apply_total``, so day state and the SQLite writer stay single.
+    """
+
+    def __init__(self, cfg: Config, runner: MqttRunner):
+        self._cfg = cfg
+        self._runner = runner
+        self._ctx = mp.get_context("spawn")
+        self._queue = self._ctx.Queue(maxsize=max(16, cfg.ingest_queue_max // _FLUSH_ITEMS * 4))
+        self._stop = self._ctx.Event()
+        self._procs: list[Any] = []
+        # Shared subscriptions may deliver one drone's messages to different
+        # workers; never let an older total overwrite a newer one.
+        self._last_ts: dict[str, float] = {}
+
+    def _spawn(self, index: int) -> Any:
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self._cfg, self._queue, self._stop),
+            name=f"mqtt-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def start(self) -> None:
+        mode = f"shared group {self._cfg.mqtt_shared_group}" if self._cfg.mqtt_shared_group else "SN hash"
+        logger.info("Starting %s MQTT ingest workers (%s)", self._cfg.mqtt_workers, mode)
+        self._procs = [self._spawn(i) for i in range(self._cfg.mqtt_workers)]
+
+    def _check_workers(self) -> None:
+        for i, proc in enumerate(self._procs):
+            if not proc.is_alive() and not self._stop.is_set():
+                logger.error("MQTT worker %s exited code=%s, restarting", i, proc.exitcode)
+                WORKER_RESTARTS.inc()
+                self._procs[i] = self._spawn(i)
+
+    def _apply(self, items: list[tuple[str, float, float]]) -> None:
+        last_ts = self._last_ts
+        for drone_sn, ts, total in items:
+            if ts < last_ts.get(drone_sn, 0.0):
+                WORKER_STALE.inc()
+                continue
+            last_ts[drone_sn] = ts
+            self._runner.apply_total(drone_sn, dt.datetime.fromtimestamp(ts), int(round(total)))
+
+    def run_forever(self, stop_event: threading.Event) -> None:
+        self.start()
+        last_check = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                try:
+                    kind, index, body = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    body = None
+                    kind = index = None
+                if kind == "totals":
+                    self._apply(body)
+                elif kind == "stats":
+                    for result, value in body.items():
+                        WORKER_MESSAGES.set(value, (str(index), result))
+                elif kind == "limited":
+                    LIMITED_DRONES.merge(body)
+                    for row in body.values():
+                        for result, value in row.items():
+                            INGEST_LIMITED.inc(value, (result,))
+                if time.monotonic() - last_check >= 2.0:
+                    last_check = time.monotonic()
+                    self._check_workers()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        # Totals already shipped before shutdown still reach the writer.
+        while True:
+            try:
+                kind, _, body = self._queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            if kind == "totals":
+                self._apply(body)
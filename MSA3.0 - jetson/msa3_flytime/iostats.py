@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from .db import SqliteStore
+from .metrics import REGISTRY
+
+PROCESS_WRITE_BYTES = REGISTRY.gauge(
+    "msa3_process_write_bytes", "Bytes this process has caused to be sent to storage (/proc/self/io write_bytes)."
+)
+
+# /proc/self/io fields reported by snapshot().
+_IO_FIELDS = ("write_bytes", "wchar", "syscw")
+
+
+def read_proc_io() -> dict[str, int] | None:
+    """The process's I/O counters from /proc/self/io, or None where unavailable."""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            text = f.read()
+    except OSError:
+        return None
+    out: dict[str, int] = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(":")
+        if name in _IO_FIELDS:
+            out[name] = int(value)
+    return out
+
+
+def _per(numerator: float, denominator: float) -> float | None:
+    return round(numerator / denominator, 1) if denominator else None
+
+
+class WriteAccounting:
+    """Write amplification since start: bytes written per OSD total applied.
+
+    ``osd_totals`` returns how many OSD totals ingest has handled so far
+    (whatever their outcome). Counters are taken relative to the values
+    when this object was created, so startup work is left out.
+    """
+
+    def __init__(self, store: SqliteStore, osd_totals: Callable[[], float], profile: str = "default"):
+        self._store = store
+        self._osd_totals = osd_totals
+        self.profile = profile
+        self._base_io = read_proc_io() or {}
+        self._base_totals = osd_totals()
+        self._base_wal = store.storage_stats()["wal_bytes_written"]
+        PROCESS_WRITE_BYTES.set_callback(lambda: (read_proc_io() or {}).get("write_bytes", 0))
+
+    def snapshot(self) -> dict[str, Any]:
+        sqlite = self._store.storage_stats()
+        io = read_proc_io()
+        totals = self._osd_totals() - self._base_totals
+        wal_bytes = sqlite["wal_bytes_written"] - self._base_wal
+        data: dict[str, Any] = {
+            "profile": self.profile,
+            "osd_totals": int(totals),
+            "sqlite": sqlite,
+            "wal_bytes_per_total": _per(wal_bytes, totals),
+            "process": None,
+            "write_bytes_per_total": None,
+        }
+        if io is not None:
+            process = {name: io.get(name, 0) - self._base_io.get(name, 0) for name in _IO_FIELDS}
+            data["process"] = process
+            data["write_bytes_per_total"] = _per(process["write_bytes"], totals)
+        return data
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from .metrics import REGISTRY
+
+LIVE_CLIENTS = REGISTRY.gauge("msa3_live_clients", "Open /api/live event streams.")
+LIVE_EVENTS = REGISTRY.counter("msa3_live_events_total", "Events sent on /api/live streams.", ["kind"])
+
+EVENT_STREAM_CONTENT_TYPE = "text/event-stream; charset=utf-8"
+
+# A comment line keeps idle streams open through proxies.
+_HEARTBEAT = b": ping\n\n"
+
+
+class LiveTotal(NamedTuple):
+    seq: int
+    total_seconds: int
+    today_seconds: int
+
+
+class LiveHub:
+    """Latest per-drone totals for today, as applied by MqttRunner.
+
+    publish() is an in-memory update on the ingest path; readers ask for what
+    changed since the sequence number they last saw, so streams never touch
+    SQLite. The table starts empty and resets when the day rolls over.
+    """
+
+    def __init__(self, max_clients: int = 64):
+        self.max_clients = max(1, max_clients)
+        self._lock = threading.Lock()
+        self._day: dt.date | None = None
+        self._seq = 0
+        # Least recently changed first, so changes() can stop at the first old entry.
+        self._latest: OrderedDict[str, LiveTotal] = OrderedDict()
+        self._clients = 0
+        self._closed = False
+        LIVE_CLIENTS.set_callback(lambda: self._clients)
+
+    def publish(self, drone_sn: str, day: dt.date, total_seconds: int, today_seconds: int) -> None:
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._latest.clear()
+            self._seq += 1
+            self._latest[drone_sn] = LiveTotal(self._seq, total_seconds, today_seconds)
+            self._latest.move_to_end(drone_sn)
+
+    def changes(self, since: int) -> tuple[dt.date | None, int, list[tuple[str, LiveTotal]]]:
+        """(day, current seq, entries changed after ``since``); since=0 is a snapshot."""
+        with self._lock:
+            out: list[tuple[str, LiveTotal]] = []
+            for sn in reversed(self._latest):
+                entry = self._latest[sn]
+                if entry.seq <= since:
+                    break
+                out.append((sn, entry))
+            return self._day, self._seq, out
+
+    def subscribe(self, interval: float, heartbeat: float = 15.0) -> LiveStream | None:
+        """A new event stream, or None when max_clients streams are already open."""
+        with self._lock:
+            if self._closed or self._clients >= self.max_clients:
+                return None
+            self._clients += 1
+        return LiveStream(self, interval, heartbeat)
+
+    def _unsubscribe(self) -> None:
+        with self._lock:
+            self._clients -= 1
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        """End every open stream (at its next tick)."""
+        self._closed = True
+
+
+def _encode(day: dt.date | None, entries: list[tuple[str, LiveTotal]]) -> bytes:
+    # Same column layout as /api/fleet.
+    data: dict[str, Any] = {
+        "day": day.isoformat() if day else None,
+        "drone_sn": [sn for sn, _ in entries],
+        "total_seconds": [e.total_seconds for _, e in entries],
+        "today_seconds": [e.today_seconds for _, e in entries],
+    }
+    return b"event: totals\ndata: " + json.dumps(data, separators=(",", ":")).encode("utf-8") + b"\n\n"
+
+
+class LiveStream:
+    """Server-Sent Events body for one client, coalesced to one event per ``interval``.
+
+    Iterates blocking (threaded server) or asynchronously (asyncio server);
+    the first event is a snapshot, later ones hold only drones that changed.
+    """
+
+    def __init__(self, hub: LiveHub, interval: float, heartbeat: float):
+        self._hub = hub
+        self._interval = max(0.05, interval)
+        self._heartbeat = heartbeat
+        self._since = -1
+        self._last_sent = 0.0
+        self._done = False
+
+    def _next_event(self) -> bytes | None:
+        """The event due now, if any; raises StopIteration once closed."""
+        if self._done or self._hub.closed:
+            self.close()
+            raise StopIteration
+        if self._since < 0:
+            day, seq, entries = self._hub.changes(0)
+            self._since = seq
+            self._last_sent = time.monotonic()
+            LIVE_EVENTS.inc(labels=("snapshot",))
+            return _encode(day, entries)
+        day, seq, entries = self._hub.changes(self._since)
+        self._since = seq
+        if entries:
+            self._last_sent = time.monotonic()
+            LIVE_EVENTS.inc(labels=("totals",))
+            return _encode(day, entries)
+        if time.monotonic() - self._last_sent >= self._heartbeat:
+            self._last_sent = time.monotonic()
+            return _HEARTBEAT
+        return None
+
+    def __iter__(self) -> LiveStream:
+        return self
+
+    def __next__(self) -> bytes:
+        first = self._since < 0
+        while True:
+            if not first:
+                time.sleep(self._interval)
+            first = False
+            event = self._next_event()
+            if event is not None:
+                return event
+
+    def __aiter__(self) -> LiveStream:
+        return self
+
+    async def __anext__(self) -> bytes:
+        first = self._since < 0
+        while True:
+            if not first:
+                await asyncio.sleep(self._interval)
+            first = False
+            try:
+                event = self._next_event()
+            except StopIteration:
+                raise StopAsyncIteration from None
+            if event is not None:
+                return event
+
+    def close(self) -> None:
+        if not self._done:
+            self._done = True
+            self._hub._unsubscribe()
+
+    async def aclose(self) -> None:
+        self.close()
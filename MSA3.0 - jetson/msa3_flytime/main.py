@@ -8,12 +8,21 @@ from logging.handlers import RotatingFileHandler
 from .config import load_config
 from .db import SqliteStore
 from .http_server import serve
-from .mqtt_client import MqttRunner
-from .scheduler import InitDailyScheduler
+from .iostats import WriteAccounting
+from .ingest_workers import IngestWorkerPool
+from .live import LiveHub
+from .mqtt_client import OSD_OUTCOMES, MqttRunner
+from .recorder import OsdRecorder
+from .samples import FlightSampler
+from .scheduler import InitDailyScheduler, Job, every
+from .sync import SyncAggregator
+from .writer import OsdWriter
 
 
 def main() -> None:
-    log_dir = Path(__file__).resolve().parent.parent / "logs"
+    cfg = load_config()
+
+    log_dir = Path(cfg.log_dir)
     log_dir.mkdir(parents=True, exist_ok=True)
     log_file = log_dir / "msa3_flytime.log"
 
@@ -27,31 +36,107 @@ def main() -> None:
 
     fh = RotatingFileHandler(str(log_file), maxBytes=10 * 1024 * 1024, backupCount=10, encoding="utf-8")
     fh.setFormatter(fmt)
+    # low_wear: the log file only gets warnings; the console still gets everything.
+    fh.setLevel(cfg.log_file_level)
 
     root.handlers.clear()
     root.addHandler(sh)
     root.addHandler(fh)
 
-    cfg = load_config()
     store = SqliteStore(cfg)
     store.ping()
 
     stop_event = threading.Event()
 
-    # Scheduler thread
-    scheduler = InitDailyScheduler(store, stop_event)
+    # MQTT thread hands OSD events to the writer thread, which group-commits them.
+    live = LiveHub(max_clients=cfg.live_max_clients)
+    samples: FlightSampler | None = None
+    if cfg.flight_samples:
+        samples = FlightSampler(store, cfg.flight_sample_flush_s, cfg.flight_session_gap_s)
+    mqtt_runner = MqttRunner(cfg, store, recorder=OsdRecorder.from_config(cfg), live=live, samples=samples)
+    writer = OsdWriter.from_config(cfg, store, on_failed=lambda ev: mqtt_runner.state.forget(ev.drone_sn))
+    mqtt_runner.writer = writer
+    # Stopped after ingest so totals still in flight from workers get written.
+    writer_stop = threading.Event()
+    t_writer = threading.Thread(target=writer.run_forever, args=(writer_stop,), name="osd-writer", daemon=True)
+    t_writer.start()
+
+    # Scheduler thread: daily rows, archiving and SQLite upkeep (upkeep waits while OSD flows).
+    scheduler = InitDailyScheduler(
+        store,
+        stop_event,
+        backfill_days=cfg.init_backfill_days,
+        archive_dir=cfg.archive_dir,
+        archive_grace_days=cfg.archive_grace_days,
+        busy=lambda: writer.idle_seconds() < cfg.maint_idle_s,
+        max_defer=cfg.maint_max_defer_s,
+        optimize_s=cfg.maint_optimize_s,
+        checkpoint_s=cfg.maint_checkpoint_s,
+        vacuum_s=cfg.maint_vacuum_s,
+        vacuum_pages=cfg.maint_vacuum_pages,
+    )
+    if cfg.sync_nodes:
+        # Aggregator: pull every site's changed rows on a timer (and once at startup).
+        aggregator = SyncAggregator(store, cfg.sync_nodes, cfg.sync_batch_rows, cfg.sync_timeout_s)
+        scheduler.add(
+            Job("sync_pull", aggregator.pull_all, every(cfg.sync_interval_s), deferrable=False, run_on_start=True)
+        )
     t_scheduler = threading.Thread(target=scheduler.run_forever, name="scheduler", daemon=True)
     t_scheduler.start()
 
-    # MQTT thread
-    mqtt_runner = MqttRunner(cfg, store)
-    t_mqtt = threading.Thread(target=mqtt_runner.run_forever, name="mqtt", daemon=True)
-    t_mqtt.start()
+    t_samples: threading.Thread | None = None
+    if samples is not None:
+        t_samples = threading.Thread(
+            target=samples.run_forever, args=(writer_stop,), name="flight-samples", daemon=True
+        )
+        t_samples.start()
+
+    t_mqtt: threading.Thread | None = None
+    if cfg.sync_nodes:
+        # The aggregator's data comes from the sites, not from its own broker.
+        logging.getLogger(__name__).info("Sync aggregator for %s node(s); MQTT ingest off", len(cfg.sync_nodes))
+    elif cfg.mqtt_workers > 1:
+        # Worker processes receive and parse; this thread applies their totals.
+        pool = IngestWorkerPool(cfg, mqtt_runner)
+        t_mqtt = threading.Thread(target=pool.run_forever, args=(stop_event,), name="mqtt-ingest", daemon=True)
+    else:
+        t_mqtt = threading.Thread(target=mqtt_runner.run_forever, name="mqtt", daemon=True)
+    if t_mqtt is not None:
+        t_mqtt.start()
+
+    # Write amplification per OSD total, from here on (/api/storage).
+    storage = WriteAccounting(
+        store,
+        lambda: sum(OSD_OUTCOMES.value((o,)) for o in ("unchanged", "written", "queued", "dropped", "error")),
+        profile=cfg.storage_profile,
+    )
 
     # HTTP server (main thread)
     static_dir = str(Path(__file__).resolve().parent / "static")
-    server = serve(store, cfg.http_host, cfg.http_port, static_dir=static_dir)
-    logging.getLogger(__name__).info("HTTP serving on http://%s:%s", cfg.http_host, cfg.http_port)
+    server = serve(
+        store,
+        cfg.http_host,
+        cfg.http_port,
+        static_dir=static_dir,
+        writer=writer,
+        cache_entries=cfg.http_cache_entries,
+        past_max_age=cfg.http_past_max_age_s,
+        static_dev=cfg.http_static_dev,
+        mode=cfg.http_server,
+        workers=cfg.http_workers,
+        queue_max=cfg.http_queue_max,
+        request_timeout=cfg.http_request_timeout_s,
+        keepalive_timeout=cfg.http_keepalive_s,
+        max_connections=cfg.http_max_connections,
+        page_max=cfg.http_page_max,
+        live=live,
+        live_interval=cfg.live_interval_s,
+        samples=samples,
+        storage=storage,
+    )
+    logging.getLogger(__name__).info(
+        "HTTP serving on http://%s:%s (%s)", cfg.http_host, cfg.http_port, cfg.http_server
+    )
 
     try:
         server.serve_forever(poll_interval=0.5)
@@ -59,7 +144,18 @@ def main() -> None:
         pass
     finally:
         stop_event.set()
+        live.close()
         server.shutdown()
+        if t_mqtt is not None and cfg.mqtt_workers > 1:
+            t_mqtt.join(timeout=10)
+        # Flush OSD events still queued for the writer.
+        writer_stop.set()
+        t_writer.join(timeout=10)
+        if t_samples is not None:
+            t_samples.join(timeout=10)
+        if mqtt_runner.recorder is not None:
+            mqtt_runner.recorder.close()
+        store.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 -- SQLite schema for drone flight time tracking
+-- 0001: 初始結構（與舊版 migrations.sql 相同，既有資料庫可重複執行）
 
 CREATE TABLE IF NOT EXISTS t_drone (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -0,0 +1,19 @@
+-- 0002: 以實體 fly_date 欄位取代 date(fly_date_time) 查詢
+-- fly_date 由程式寫入時維護（'YYYY-MM-DD'），查詢可直接走 (drone_sn, fly_date) 索引做範圍掃描。
+
+ALTER TABLE t_fly_time ADD COLUMN fly_date TEXT;
+
+UPDATE t_fly_time SET fly_date = date(fly_date_time);
+
+-- 舊索引：expression index 僅能服務等值查詢；fly_date_time 每次更新都會改動 idx_t_fly_time_time。
+DROP INDEX IF EXISTS uk_t_fly_time_drone_day;
+DROP INDEX IF EXISTS idx_t_fly_time_drone;
+DROP INDEX IF EXISTS idx_t_fly_time_time;
+
+-- 每台無人機每天僅一筆
+CREATE UNIQUE INDEX IF NOT EXISTS uk_t_fly_time_drone_date
+ON t_fly_time (drone_sn, fly_date);
+
+-- 區間彙總只需讀索引（covering today_flight_time）
+CREATE INDEX IF NOT EXISTS idx_t_fly_time_drone_date_secs
+ON t_fly_time (drone_sn, fly_date, today_flight_time);
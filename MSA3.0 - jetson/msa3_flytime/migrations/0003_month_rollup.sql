@@ -0,0 +1,33 @@
+-- 0003: 每台無人機每月飛行秒數彙總（/api/summary 整月區段直接讀此表）
+-- 由 t_fly_time 的 trigger 在同一交易內增量維護；可用
+-- `python -m msa3_flytime.admin rebuild-rollups` 由 t_fly_time 重建。
+
+CREATE TABLE IF NOT EXISTS t_fly_time_month (
+  drone_sn TEXT NOT NULL,
+  fly_month TEXT NOT NULL,
+  seconds INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (drone_sn, fly_month)
+) WITHOUT ROWID;
+
+INSERT INTO t_fly_time_month (drone_sn, fly_month, seconds)
+SELECT drone_sn, substr(fly_date, 1, 7), SUM(today_flight_time)
+FROM t_fly_time
+GROUP BY drone_sn, substr(fly_date, 1, 7);
+
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_month_insert
+AFTER INSERT ON t_fly_time
+WHEN NEW.today_flight_time <> 0
+BEGIN
+  INSERT INTO t_fly_time_month (drone_sn, fly_month, seconds)
+  VALUES (NEW.drone_sn, substr(NEW.fly_date, 1, 7), NEW.today_flight_time)
+  ON CONFLICT (drone_sn, fly_month) DO UPDATE SET seconds = seconds + excluded.seconds;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_month_update
+AFTER UPDATE OF today_flight_time ON t_fly_time
+WHEN NEW.today_flight_time <> OLD.today_flight_time
+BEGIN
+  INSERT INTO t_fly_time_month (drone_sn, fly_month, seconds)
+  VALUES (NEW.drone_sn, substr(NEW.fly_date, 1, 7), NEW.today_flight_time - OLD.today_flight_time)
+  ON CONFLICT (drone_sn, fly_month) DO UPDATE SET seconds = seconds + excluded.seconds;
+END;
@@ -0,0 +1,13 @@
+-- 0004: 高解析度飛行樣本（FLIGHT_SAMPLES=1 時寫入）
+-- 每台無人機每小時一列；data 為一或多段差分編碼（varint）的 (時間, total_flight_time)，
+-- 每次 flush 以 `data || 新段` 附加，不需先讀出舊資料。hour_start 為該小時的 epoch 秒數。
+
+CREATE TABLE IF NOT EXISTS t_flight_sample (
+  drone_sn TEXT NOT NULL,
+  hour_start INTEGER NOT NULL,
+  sample_count INTEGER NOT NULL DEFAULT 0,
+  data BLOB NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uk_t_flight_sample_drone_hour ON t_flight_sample (drone_sn, hour_start);
+CREATE INDEX IF NOT EXISTS ix_t_flight_sample_hour ON t_flight_sample (hour_start);
@@ -0,0 +1,11 @@
+-- 0005: 已歸檔年度（t_fly_time / t_flight_sample 已搬到 path 指向的唯讀 SQLite 檔）
+-- 登記與刪除在同一交易內完成；查詢區間涉及已歸檔年度時才 ATTACH 該檔。
+-- t_fly_time_month 不搬移，整月彙總仍直接讀主資料庫。
+
+CREATE TABLE IF NOT EXISTS t_archive (
+  year INTEGER PRIMARY KEY,
+  path TEXT NOT NULL,
+  day_rows INTEGER NOT NULL DEFAULT 0,
+  sample_rows INTEGER NOT NULL DEFAULT 0,
+  archived_at TEXT NOT NULL DEFAULT (CURRENT_TIMESTAMP)
+);
@@ -0,0 +1,60 @@
+-- 0006: 每台無人機的累計飛行秒數（prefix sum），任意區間只需兩次索引查詢
+-- cum_flight_time = 該機 fly_date <= 本列日期的 today_flight_time 總和；
+-- 區間 [start, end] = 區間內最後一列的 cum - (第一列的 cum - 第一列的 today_flight_time)。
+-- 以每日 today_flight_time（已排除里程歸零的負值）累加，不直接相減 total_flight_time，
+-- 因此離線缺日與韌體更換後 total 歸零都不影響結果。只比較同一台的相對值，歸檔刪除舊年份不需調整。
+
+ALTER TABLE t_fly_time ADD COLUMN cum_flight_time INTEGER NOT NULL DEFAULT 0;
+
+CREATE TEMP TABLE _cum (id INTEGER PRIMARY KEY, cum INTEGER NOT NULL);
+
+INSERT INTO _cum (id, cum)
+SELECT id, SUM(today_flight_time) OVER (PARTITION BY drone_sn ORDER BY fly_date)
+FROM t_fly_time;
+
+UPDATE t_fly_time SET cum_flight_time = (SELECT c.cum FROM _cum c WHERE c.id = t_fly_time.id);
+
+DROP TABLE _cum;
+
+-- 兩端查詢只讀索引（covering today_flight_time 與 cum_flight_time），取代 0002 的索引
+DROP INDEX IF EXISTS idx_t_fly_time_drone_date_secs;
+CREATE INDEX IF NOT EXISTS idx_t_fly_time_drone_date_cum
+ON t_fly_time (drone_sn, fly_date, today_flight_time, cum_flight_time);
+
+-- 新增一天：接續前一列的累計；補入較早的日期時，之後各列一併加上
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_cum_insert
+AFTER INSERT ON t_fly_time
+BEGIN
+  UPDATE t_fly_time
+  SET cum_flight_time = NEW.today_flight_time + COALESCE((
+    SELECT p.cum_flight_time FROM t_fly_time p
+    WHERE p.drone_sn = NEW.drone_sn AND p.fly_date < NEW.fly_date
+    ORDER BY p.fly_date DESC LIMIT 1
+  ), 0)
+  WHERE id = NEW.id;
+  UPDATE t_fly_time
+  SET cum_flight_time = cum_flight_time + NEW.today_flight_time
+  WHERE NEW.today_flight_time <> 0 AND drone_sn = NEW.drone_sn AND fly_date > NEW.fly_date;
+END;
+
+-- 當日秒數變動：本列與之後各列（通常只有本列）
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_cum_update
+AFTER UPDATE OF today_flight_time ON t_fly_time
+WHEN NEW.today_flight_time <> OLD.today_flight_time
+BEGIN
+  UPDATE t_fly_time
+  SET cum_flight_time = cum_flight_time + NEW.today_flight_time - OLD.today_flight_time
+  WHERE drone_sn = NEW.drone_sn AND fly_date >= NEW.fly_date;
+END;
+
+-- 刪除中間的列：之後各列扣回；刪除最早的列（歸檔）不需調整
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_cum_delete
+AFTER DELETE ON t_fly_time
+WHEN OLD.today_flight_time <> 0 AND EXISTS (
+  SELECT 1 FROM t_fly_time p WHERE p.drone_sn = OLD.drone_sn AND p.fly_date < OLD.fly_date
+)
+BEGIN
+  UPDATE t_fly_time
+  SET cum_flight_time = cum_flight_time - OLD.today_flight_time
+  WHERE drone_sn = OLD.drone_sn AND fly_date > OLD.fly_date;
+END;
@@ -0,0 +1,96 @@
+-- 0007: 多站點同步
+-- 每列的 change_seq 為不重複的同步序號：/api/sync/changes 依序號分頁，只送出大於對方水位的列。
+-- 新增的列取號 1 + MAX(served_seq, 兩表 change_seq 最大值)。t_sync_state.served_seq 是已送出過
+-- 的最大序號；只有序號不大於它的列（可能已被彙整端取走）變動時才重新取號，尚未送出的列再變動
+-- 不需取號，飛行中的當日列在兩次同步之間最多取號一次，一般寫入幾乎不增加寫入量。
+-- node_id 讓彙整端發現節點資料庫被換掉時從頭同步。刪除（年度歸檔）不同步：彙整端保留歷史。
+
+CREATE TABLE IF NOT EXISTS t_sync_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  node_id TEXT NOT NULL,
+  served_seq INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO t_sync_state (id, node_id, served_seq) VALUES (1, lower(hex(randomblob(8))), 0);
+
+-- 既有資料列依 id 編號，第一次同步（水位 0）全部送出
+ALTER TABLE t_drone ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE t_fly_time ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_drone SET change_seq = id;
+UPDATE t_fly_time SET change_seq = id + COALESCE((SELECT MAX(id) FROM t_drone), 0);
+
+CREATE INDEX IF NOT EXISTS idx_t_drone_change_seq ON t_drone (change_seq);
+CREATE INDEX IF NOT EXISTS idx_t_fly_time_change_seq ON t_fly_time (change_seq);
+
+CREATE TRIGGER IF NOT EXISTS trg_t_drone_sync_insert
+AFTER INSERT ON t_drone
+BEGIN
+  UPDATE t_drone SET change_seq = 1 + MAX(
+    (SELECT served_seq FROM t_sync_state WHERE id = 1),
+    COALESCE((SELECT MAX(change_seq) FROM t_drone), 0),
+    COALESCE((SELECT MAX(change_seq) FROM t_fly_time), 0)
+  ) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_t_drone_sync_update
+AFTER UPDATE OF drone_sn, drone_type, drone_version ON t_drone
+WHEN NEW.change_seq <= (SELECT served_seq FROM t_sync_state WHERE id = 1)
+  AND (NEW.drone_sn IS NOT OLD.drone_sn
+    OR NEW.drone_type IS NOT OLD.drone_type
+    OR NEW.drone_version IS NOT OLD.drone_version)
+BEGIN
+  UPDATE t_drone SET change_seq = 1 + MAX(
+    (SELECT served_seq FROM t_sync_state WHERE id = 1),
+    COALESCE((SELECT MAX(change_seq) FROM t_drone), 0),
+    COALESCE((SELECT MAX(change_seq) FROM t_fly_time), 0)
+  ) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_sync_insert
+AFTER INSERT ON t_fly_time
+BEGIN
+  UPDATE t_fly_time SET change_seq = 1 + MAX(
+    (SELECT served_seq FROM t_sync_state WHERE id = 1),
+    COALESCE((SELECT MAX(change_seq) FROM t_drone), 0),
+    COALESCE((SELECT MAX(change_seq) FROM t_fly_time), 0)
+  ) WHERE id = NEW.id;
+END;
+
+-- cum_flight_time 與 change_seq 本身不在欄位清單內：衍生值的更新不取號
+CREATE TRIGGER IF NOT EXISTS trg_t_fly_time_sync_update
+AFTER UPDATE OF drone_sn, fly_date, fly_date_time, revised_start_time,
+  today_start_total_flight_time, total_flight_time, today_flight_time ON t_fly_time
+WHEN NEW.change_seq <= (SELECT served_seq FROM t_sync_state WHERE id = 1)
+BEGIN
+  UPDATE t_fly_time SET change_seq = 1 + MAX(
+    (SELECT served_seq FROM t_sync_state WHERE id = 1),
+    COALESCE((SELECT MAX(change_seq) FROM t_drone), 0),
+    COALESCE((SELECT MAX(change_seq) FROM t_fly_time), 0)
+  ) WHERE id = NEW.id;
+END;
+
+-- 彙整端：各節點的同步水位與狀態
+CREATE TABLE IF NOT EXISTS t_sync_node (
+  node TEXT PRIMARY KEY,
+  url TEXT NOT NULL,
+  node_id TEXT NULL,
+  seq INTEGER NOT NULL DEFAULT 0,
+  rows INTEGER NOT NULL DEFAULT 0,
+  pulled_at TEXT NULL,
+  error TEXT NULL
+);
+
+-- 彙整端：各節點送來的每日資料列（各節點各自覆寫）；同一台同一天在多個站點飛行時，
+-- t_fly_time 取最早的起始累計、最大的累計，當日秒數為各站點相加
+CREATE TABLE IF NOT EXISTS t_sync_fly_time (
+  drone_sn TEXT NOT NULL,
+  fly_date TEXT NOT NULL,
+  node TEXT NOT NULL,
+  fly_date_time TEXT NOT NULL,
+  revised_start_time INTEGER NOT NULL,
+  today_start_total_flight_time INTEGER NOT NULL,
+  total_flight_time INTEGER NOT NULL,
+  today_flight_time INTEGER NOT NULL,
+  PRIMARY KEY (drone_sn, fly_date, node)
+) WITHOUT ROWID;
@@ -0,0 +1,7 @@
+-- 0008: 移除每月彙總 t_fly_time_month
+-- 0006 起 /api/summary 以 cum_flight_time 頭尾相減計算區間總計，已不再讀取此表；
+-- 移除兩個 trigger 後，每次 OSD total 寫入少一次 UPSERT，排程也不再每小時校正。
+
+DROP TRIGGER IF EXISTS trg_t_fly_time_month_insert;
+DROP TRIGGER IF EXISTS trg_t_fly_time_month_update;
+DROP TABLE IF EXISTS t_fly_time_month;
@@ -1,16 +1,43 @@
 from __future__ import annotations
 
 import datetime as dt
-import json
 import logging
-from dataclasses import dataclass
-from typing import Any
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
 from .config import Config
-from .db import SqliteStore
+from .db import OsdEvent, SqliteStore
+from .extract import FIELD_BYTES, TotalFlightTimeExtractor
+from .live import LiveHub
+from .metrics import REGISTRY
+from .ratelimit import IngestLimiter
+from .recorder import OsdRecorder
+from .samples import FlightSampler
+from .state import DayStateTable
+from .writer import OsdWriter
 
 logger = logging.getLogger(__name__)
 
+OSD_TOPIC = "thing/product/+/osd"
+
+MQTT_MESSAGES = REGISTRY.counter("msa3_mqtt_messages_total", "MQTT messages received.")
+MQTT_REJECTED = REGISTRY.counter(
+    "msa3_mqtt_messages_rejected_total", "MQTT messages ignored before reaching state.", ["reason"]
+)
+OSD_OUTCOMES = REGISTRY.counter(
+    "msa3_osd_events_total", "Extracted OSD totals by outcome (unchanged, written, queued, late, dropped, error).", ["outcome"]
+)
+MQTT_HANDLE_SECONDS = REGISTRY.histogram(
+    "msa3_mqtt_handle_seconds", "Time spent handling one MQTT message in seconds."
+)
+MQTT_CONNECTS = REGISTRY.counter("msa3_mqtt_connects_total", "MQTT connection attempts by result.", ["result"])
+MQTT_DISCONNECTS = REGISTRY.counter("msa3_mqtt_disconnects_total", "MQTT disconnects (reconnects follow).")
+
+# How often messages held back by the rate limiter are retried.
+DEFERRED_POLL_S = 0.2
+
 
 def _extract_drone_sn_from_topic(topic: str) -> str | None:
     # thing/product/{device_sn}/osd
@@ -20,100 +47,176 @@ def _extract_drone_sn_from_topic(topic: str) -> str | None:
     return None
 
 
-def _find_total_flight_time(payload: Any) -> float | None:
-    """Best-effort extraction of total_flight_time (seconds) from unknown JSON shapes."""
-    if payload is None:
-        return None
+def osd_subscription(shared_group: str | None) -> str:
+    # MQTT 5 / EMQX / Mosquitto 2 shared subscription: the broker spreads the
+    # topic's messages over every client subscribed with the same group.
+    return f"$share/{shared_group}/{OSD_TOPIC}" if shared_group else OSD_TOPIC
 
-    if isinstance(payload, (int, float)):
-        return float(payload)
 
-    if isinstance(payload, dict):
-        # direct
-        if "total_flight_time" in payload and isinstance(payload["total_flight_time"], (int, float)):
-            return float(payload["total_flight_time"])
+def connect_client(cfg: Config, subscription: str, on_message: Callable[[str, bytes], None]) -> Any:
+    """Create a connected paho client that (re)subscribes on every connect."""
+    try:
+        import paho.mqtt.client as mqtt  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise RuntimeError(
+            "paho-mqtt not installed. Install requirements.txt first."
+        ) from e
 
-        # common wrappers
-        for key in ("data", "osd", "state", "payload"):
-            if key in payload:
-                v = _find_total_flight_time(payload.get(key))
-                if v is not None:
-                    return v
+    client = mqtt.Client()
+    if cfg.mqtt_username:
+        client.username_pw_set(cfg.mqtt_username, cfg.mqtt_password or "")
 
-        # deep scan (bounded)
-        for _, v in list(payload.items())[:50]:
-            vv = _find_total_flight_time(v)
-            if vv is not None:
-                return vv
+    def on_connect(_client, _userdata, _flags, rc, *_args):
+        if rc == 0:
+            MQTT_CONNECTS.inc(labels=("ok",))
+            logger.info("MQTT connected, subscribing %s", subscription)
+            _client.subscribe(subscription)
+        else:
+            MQTT_CONNECTS.inc(labels=("failed",))
+            logger.error("MQTT connect failed rc=%s", rc)
 
-    if isinstance(payload, list):
-        for item in payload[:50]:
-            v = _find_total_flight_time(item)
-            if v is not None:
-                return v
+    def on_disconnect(_client, _userdata, rc, *_args):
+        MQTT_DISCONNECTS.inc()
+        logger.warning("MQTT disconnected rc=%s", rc)
 
-    return None
+    def _on_message(_client, _userdata, msg):
+        on_message(msg.topic, msg.payload)
+
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.on_message = _on_message
+
+    logger.info("Connecting MQTT %s:%s", cfg.mqtt_host, cfg.mqtt_port)
+    client.connect(cfg.mqtt_host, cfg.mqtt_port, keepalive=60)
+    return client
 
 
 @dataclass
 class MqttRunner:
     cfg: Config
     store: SqliteStore
-
-    def run_forever(self) -> None:
+    # When set, writes go through the group-commit writer instead of inline.
+    writer: OsdWriter | None = None
+    # When set, raw OSD carrying total_flight_time is logged for replay.
+    recorder: OsdRecorder | None = None
+    # When set, applied totals are pushed to /api/live subscribers.
+    live: LiveHub | None = None
+    # When set, every total change is kept as a flight sample.
+    samples: FlightSampler | None = None
+    state: DayStateTable = field(init=False)
+    extractor: TotalFlightTimeExtractor = field(init=False)
+    # Per-drone / global rate limits (None when off); see IngestLimiter.
+    limiter: IngestLimiter | None = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.state = DayStateTable(self.store)
+        self.extractor = TotalFlightTimeExtractor()
+        self.limiter = IngestLimiter.from_config(self.cfg)
+        # Held-back messages are processed off the MQTT thread (drain_deferred).
+        self._lock = threading.Lock()
+
+    def handle_message(self, topic: str, payload_bytes: bytes) -> None:
+        t0 = time.perf_counter()
+        MQTT_MESSAGES.inc()
         try:
-            import paho.mqtt.client as mqtt  # type: ignore
-        except Exception as e:  # pragma: no cover
-            raise RuntimeError(
-                "paho-mqtt not installed. Install requirements.txt first."
-            ) from e
-
-        client = mqtt.Client()
-        if self.cfg.mqtt_username:
-            client.username_pw_set(self.cfg.mqtt_username, self.cfg.mqtt_password or "")
-
-        def on_connect(_client, _userdata, _flags, rc, *_args):
-            if rc == 0:
-                logger.info("MQTT connected")
-                _client.subscribe("thing/product/+/osd")
+            self._handle_message(topic, payload_bytes)
+        finally:
+            MQTT_HANDLE_SECONDS.observe(time.perf_counter() - t0)
+
+    def _handle_message(self, topic: str, payload_bytes: bytes) -> None:
+        drone_sn = _extract_drone_sn_from_topic(topic)
+        if not drone_sn:
+            MQTT_REJECTED.inc(labels=("topic",))
+            return
+
+        ts = time.time()
+        # Before any parsing: a flooding drone costs a dict lookup per message.
+        if self.limiter is not None and not self.limiter.admit(drone_sn, topic, payload_bytes, ts):
+            return
+        with self._lock:
+            self._process(drone_sn, topic, payload_bytes, ts)
+
+    def _process(self, drone_sn: str, topic: str, payload_bytes: bytes, ts: float) -> None:
+        if self.recorder is not None and FIELD_BYTES in payload_bytes:
+            self.recorder.record(topic, payload_bytes, ts)
+
+        total = self.extractor.extract(drone_sn, payload_bytes)
+        if total is None:
+            MQTT_REJECTED.inc(labels=("no_total",))
+            return
+
+        self.apply_total(drone_sn, dt.datetime.fromtimestamp(ts), int(round(float(total))))
+
+    def drain_deferred(self) -> int:
+        """Process held-back messages that the rate limits now allow; returns how many."""
+        if self.limiter is None:
+            return 0
+        held = self.limiter.due()
+        for d in held:
+            with self._lock:
+                self._process(d.drone_sn, d.topic, d.payload, d.ts)
+        return len(held)
+
+    def apply_total(self, drone_sn: str, now: dt.datetime, total_int: int) -> None:
+        """Fold one extracted total into day state and hand any write to the store."""
+        day = self.state.day
+        if day is not None and now.date() < day:
+            self._apply_late(drone_sn, now, total_int)
+            return
+        try:
+            # Spec: if revised_start_time == 0, revise today's start exactly once
+            # using the first OSD total_flight_time received today; afterwards
+            # only a changed total needs a write.
+            event = self.state.observe(drone_sn, now, total_int)
+            if event is None:
+                OSD_OUTCOMES.inc(labels=("unchanged",))
+                return
+            if self.samples is not None:
+                self.samples.add(drone_sn, now, total_int)
+            if self.writer is None:
+                self.store.apply_osd([event])
+                OSD_OUTCOMES.inc(labels=("written",))
+            elif self.writer.submit(event):
+                OSD_OUTCOMES.inc(labels=("queued",))
             else:
-                logger.error("MQTT connect failed rc=%s", rc)
-
-        def on_message(_client, _userdata, msg):
-            topic = msg.topic
-            drone_sn = _extract_drone_sn_from_topic(topic)
-            if not drone_sn:
+                self.state.forget(drone_sn)
+                OSD_OUTCOMES.inc(labels=("dropped",))
+                logger.warning("OSD writer queue full, dropped %s", drone_sn)
                 return
-
-            try:
-                raw = msg.payload.decode("utf-8", errors="ignore")
-                payload = json.loads(raw) if raw else None
-            except Exception:
-                payload = None
-
-            total = _find_total_flight_time(payload)
-            if total is None:
+            if self.live is not None:
+                state = self.state.get(drone_sn)
+                if state is not None:
+                    self.live.publish(drone_sn, state.day, state.total, state.today_seconds)
+        except Exception:
+            self.state.forget(drone_sn)
+            OSD_OUTCOMES.inc(labels=("error",))
+            logger.exception("Failed to process OSD for %s", drone_sn)
+
+    def _apply_late(self, drone_sn: str, now: dt.datetime, total_int: int) -> None:
+        # A total from a day the state table has already left (another worker's
+        # batch from before midnight): observing it would reload that day and
+        # then today from SQLite, losing today's first totals still queued in
+        # the writer. It is written for its own day instead; the row's start is
+        # only set here if that day had no row yet.
+        event = OsdEvent(drone_sn=drone_sn, at=now, total=total_int, first_total=total_int, new_drone=True)
+        try:
+            if self.writer is None:
+                self.store.apply_osd([event])
+            elif not self.writer.submit(event):
+                OSD_OUTCOMES.inc(labels=("dropped",))
+                logger.warning("OSD writer queue full, dropped late total for %s", drone_sn)
                 return
+            OSD_OUTCOMES.inc(labels=("late",))
+        except Exception:
+            OSD_OUTCOMES.inc(labels=("error",))
+            logger.exception("Failed to write late OSD for %s", drone_sn)
 
-            total_int = int(round(float(total)))
-            now = dt.datetime.now()
-
-            try:
-                self.store.ensure_drone(drone_sn)
-                self.store.ensure_today_row(drone_sn, now, total_int)
-
-                # Spec: if revised_start_time == 0, revise today's start exactly once
-                # using the first OSD total_flight_time received today.
-                self.store.revise_start_on_first_osd(drone_sn, now, total_int)
-
-                # Always update today's total & computed today_flight_time.
-                self.store.update_today_total(drone_sn, now, total_int)
-            except Exception:
-                logger.exception("Failed to process OSD for %s", drone_sn)
-
-        client.on_connect = on_connect
-        client.on_message = on_message
-
-        logger.info("Connecting MQTT %s:%s", self.cfg.mqtt_host, self.cfg.mqtt_port)
-        client.connect(self.cfg.mqtt_host, self.cfg.mqtt_port, keepalive=60)
-        client.loop_forever()
+    def run_forever(self) -> None:
+        client = connect_client(self.cfg, OSD_TOPIC, self.handle_message)
+        if self.limiter is None:
+            client.loop_forever()
+            return
+        client.loop_start()
+        while True:
+            time.sleep(DEFERRED_POLL_S)
+            self.drain_deferred()
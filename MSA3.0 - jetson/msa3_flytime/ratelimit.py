@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .config import Config
+from .metrics import REGISTRY
+
+INGEST_LIMITED = REGISTRY.counter(
+    "msa3_ingest_limited_total",
+    "OSD messages held back by ingest rate limits, by result (deferred, dropped).",
+    ["result"],
+)
+INGEST_DEFERRED = REGISTRY.gauge("msa3_ingest_deferred", "Drones with a held-back OSD message waiting for tokens.")
+
+# Drones kept by LimitedTally; past this the least-limited half is forgotten.
+_TALLY_MAX_DRONES = 4096
+
+
+class Deferred(NamedTuple):
+    drone_sn: str
+    topic: str
+    payload: bytes
+    ts: float
+
+
+class LimitedTally:
+    """Per-drone deferred/dropped counts, for /api/health rather than metric labels.
+
+    Bounded: topic SNs come from the network, so once more than
+    _TALLY_MAX_DRONES drones are tracked the least-limited half is dropped.
+    """
+
+    def __init__(self, max_drones: int = _TALLY_MAX_DRONES):
+        self._max = max(2, max_drones)
+        self._lock = threading.Lock()
+        self._counts: dict[str, dict[str, int]] = {}
+
+    def add(self, drone_sn: str, result: str, amount: int = 1) -> None:
+        with self._lock:
+            row = self._counts.get(drone_sn)
+            if row is None:
+                if len(self._counts) >= self._max:
+                    keep = sorted(self._counts.items(), key=lambda kv: -sum(kv[1].values()))[: self._max // 2]
+                    self._counts = dict(keep)
+                row = self._counts[drone_sn] = {}
+            row[result] = row.get(result, 0) + amount
+
+    def merge(self, counts: dict[str, dict[str, int]]) -> None:
+        for drone_sn, row in counts.items():
+            for result, amount in row.items():
+                self.add(drone_sn, result, amount)
+
+    def take(self) -> dict[str, dict[str, int]]:
+        """Counts since the last call (worker processes ship these to the parent)."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
+
+    def top(self, n: int = 10) -> list[dict[str, object]]:
+        """The ``n`` most-limited drones, most first."""
+        with self._lock:
+            rows = sorted(self._counts.items(), key=lambda kv: (-sum(kv[1].values()), kv[0]))[:n]
+        return [
+            {"drone_sn": sn, "deferred": row.get("deferred", 0), "dropped": row.get("dropped", 0)}
+            for sn, row in rows
+        ]
+
+
+# This process's tally; /api/health reports its top drones.
+LIMITED_DRONES = LimitedTally()
+
+
+class _Bucket:
+    __slots__ = ("tokens", "at")
+
+    def __init__(self, tokens: float, at: float):
+        self.tokens = tokens
+        self.at = at
+
+    def refill(self, now: float, rate: float, burst: float) -> float:
+        self.tokens = min(burst, self.tokens + (now - self.at) * rate)
+        self.at = now
+        return self.tokens
+
+
+class IngestLimiter:
+    """Per-drone token buckets plus a global ingest budget, checked before parsing.
+
+    admit() decides on the topic's SN alone. The first message of the day per
+    drone always passes. A message over either limit is held as that drone's
+    pending value, replacing (dropping) an older held one, so the newest total
+    is never lost; due() hands held messages back once tokens allow, except
+    ones from before today, which are dropped. A rate of 0 disables that
+    limit. Per-drone counts go to ``tally``.
+    """
+
+    def __init__(
+        self,
+        drone_rate: float,
+        drone_burst: float,
+        global_rate: float = 0.0,
+        global_burst: float = 0.0,
+        tally: LimitedTally | None = None,
+    ):
+        self._drone_rate = max(0.0, drone_rate)
+        self._drone_burst = max(1.0, drone_burst)
+        self._global_rate = max(0.0, global_rate)
+        self._global_burst = max(1.0, global_burst or global_rate)
+        self._lock = threading.Lock()
+        self._buckets: dict[str, _Bucket] = {}
+        self._global = _Bucket(self._global_burst, time.monotonic())
+        self._held: OrderedDict[str, Deferred] = OrderedDict()
+        self._seen_today: set[str] = set()
+        self._day_end = 0.0
+        self._tally = LIMITED_DRONES if tally is None else tally
+        INGEST_DEFERRED.set_callback(lambda: len(self._held))
+
+    @classmethod
+    def from_config(cls, cfg: Config, share: int = 1, tally: LimitedTally | None = None) -> IngestLimiter | None:
+        """Limiter for one of ``share`` ingest processes, or None if off.
+
+        The global budget is always split ``share`` ways. With a shared
+        subscription one drone's messages are spread over every process, so
+        the per-drone budget is split too; with SN sharding each drone has a
+        single process and keeps its full budget.
+        """
+        if cfg.ingest_drone_rate <= 0 and cfg.ingest_global_rate <= 0:
+            return None
+        drone_share = share if cfg.mqtt_shared_group else 1
+        return cls(
+            cfg.ingest_drone_rate / drone_share,
+            cfg.ingest_drone_burst / drone_share,
+            cfg.ingest_global_rate / share,
+            cfg.ingest_global_burst / share,
+            tally,
+        )
+
+    def _new_day(self, ts: float) -> None:
+        # Buckets of drones that went quiet are dropped with the day's SN set.
+        day = dt.date.fromtimestamp(ts)
+        self._day_end = dt.datetime.combine(day + dt.timedelta(days=1), dt.time()).timestamp()
+        self._seen_today.clear()
+        self._buckets.clear()
+
+    def _take(self, drone_sn: str, now: float, force: bool = False) -> bool:
+        # Caller holds self._lock.
+        bucket = None
+        if self._drone_rate > 0:
+            bucket = self._buckets.get(drone_sn)
+            if bucket is None:
+                bucket = self._buckets[drone_sn] = _Bucket(self._drone_burst, now)
+            bucket.refill(now, self._drone_rate, self._drone_burst)
+        if self._global_rate > 0:
+            self._global.refill(now, self._global_rate, self._global_burst)
+        if not force and (
+            (bucket is not None and bucket.tokens < 1.0)
+            or (self._global_rate > 0 and self._global.tokens < 1.0)
+        ):
+            return False
+        # Forced takes may run a bucket negative: that drone (and the fleet) pays it back.
+        if bucket is not None:
+            bucket.tokens -= 1.0
+        if self._global_rate > 0:
+            self._global.tokens -= 1.0
+        return True
+
+    def admit(self, drone_sn: str, topic: str, payload: bytes, ts: float) -> bool:
+        """True to process the message now; False if it was held (or dropped an older held one)."""
+        now = time.monotonic()
+        with self._lock:
+            if ts >= self._day_end:
+                self._new_day(ts)
+            first = drone_sn not in self._seen_today
+            if self._take(drone_sn, now, force=first):
+                self._seen_today.add(drone_sn)
+                # A newer message got through: the held one is stale.
+                if self._held.pop(drone_sn, None) is not None:
+                    self._count(drone_sn, "dropped")
+                return True
+            if self._held.pop(drone_sn, None) is not None:
+                self._count(drone_sn, "dropped")
+            self._held[drone_sn] = Deferred(drone_sn, topic, payload, ts)
+            self._count(drone_sn, "deferred")
+        return False
+
+    def _count(self, drone_sn: str, result: str) -> None:
+        # Caller holds self._lock.
+        INGEST_LIMITED.inc(labels=(result,))
+        self._tally.add(drone_sn, result)
+
+    def due(self, ts: float | None = None) -> list[Deferred]:
+        """Held messages whose drone (and the global budget) has tokens again, oldest first.
+
+        Messages received before the day of ``ts`` (default now) are dropped:
+        day state has moved on, and replaying them would reload yesterday.
+        """
+        if not self._held:
+            return []
+        now = time.monotonic()
+        today = dt.date.fromtimestamp(time.time() if ts is None else ts)
+        day_start = dt.datetime.combine(today, dt.time()).timestamp()
+        out: list[Deferred] = []
+        with self._lock:
+            for drone_sn in list(self._held):
+                if self._held[drone_sn].ts < day_start:
+                    del self._held[drone_sn]
+                    self._count(drone_sn, "dropped")
+                    continue
+                if self._take(drone_sn, now):
+                    out.append(self._held.pop(drone_sn))
+                elif self._global_rate > 0 and self._global.tokens < 1.0:
+                    break
+        return out
+
+    def pending(self) -> int:
+        return len(self._held)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import heapq
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# ts_ms (int64), topic length (uint16), payload length (uint32)
+_HEADER = struct.Struct("<qHI")
+SEGMENT_GLOB = "osd-*.rec.gz"
+
+
+class OsdRecord(NamedTuple):
+    ts_ms: int
+    topic: str
+    payload: bytes
+
+
+def _segment_name(ts: float, seq: int) -> str:
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(ts))
+    return f"osd-{stamp}-{os.getpid()}-{seq:04d}.rec.gz"
+
+
+class OsdRecorder:
+    """Append-only, gzip-compressed log of raw (timestamp, topic, payload) records.
+
+    Segments rotate by uncompressed size and at each local midnight, so replay
+    can pick the files for a date range by name. The stream is sync-flushed
+    every ``flush_interval`` seconds: a crash loses at most that much, and the
+    reader accepts a truncated final record.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        keep_days: int = 0,
+        flush_interval: float = 5.0,
+    ):
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._rotate_bytes = max(1024, rotate_bytes)
+        self._keep_days = max(0, keep_days)
+        self._flush_interval = max(0.0, flush_interval)
+        self._lock = threading.Lock()
+        self._raw: BinaryIO | None = None
+        self._gz: gzip.GzipFile | None = None
+        self._day: dt.date | None = None
+        self._written = 0
+        self._seq = 0
+        self._last_flush = 0.0
+
+        self.records = 0
+        self.errors = 0
+
+    @classmethod
+    def from_config(cls, cfg: Config) -> "OsdRecorder | None":
+        if not cfg.osd_record_dir:
+            return None
+        return cls(
+            Path(cfg.osd_record_dir),
+            rotate_bytes=cfg.osd_record_rotate_mb * 1024 * 1024,
+            keep_days=cfg.osd_record_keep_days,
+        )
+
+    def record(self, topic: str, payload: bytes, ts: float | None = None) -> None:
+        ts = time.time() if ts is None else ts
+        topic_bytes = topic.encode("utf-8")
+        with self._lock:
+            try:
+                day = dt.date.fromtimestamp(ts)
+                if self._gz is None or self._day != day or self._written >= self._rotate_bytes:
+                    self._rotate(ts, day)
+                assert self._gz is not None
+                self._gz.write(_HEADER.pack(int(ts * 1000), len(topic_bytes), len(payload)))
+                self._gz.write(topic_bytes)
+                self._gz.write(payload)
+                self._written += _HEADER.size + len(topic_bytes) + len(payload)
+                self.records += 1
+                now = time.monotonic()
+                if now - self._last_flush >= self._flush_interval:
+                    self._gz.flush(zlib.Z_SYNC_FLUSH)
+                    self._last_flush = now
+            except OSError:
+                # Recording is best effort; never let it stop ingest.
+                self.errors += 1
+                if self.errors == 1 or self.errors % 1000 == 0:
+                    logger.exception("OSD recorder write failed errors=%s", self.errors)
+                self._close()
+
+    def _rotate(self, ts: float, day: dt.date) -> None:
+        self._close()
+        self._seq += 1
+        path = self._dir / _segment_name(ts, self._seq)
+        self._raw = open(path, "ab")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=1)
+        self._day = day
+        self._written = 0
+        self._last_flush = time.monotonic()
+        logger.info("OSD recorder segment %s", path.name)
+        if self._keep_days:
+            self._prune(day - dt.timedelta(days=self._keep_days))
+
+    def _prune(self, before: dt.date) -> None:
+        cutoff = before.strftime("osd-%Y%m%d")
+        for path in self._dir.glob(SEGMENT_GLOB):
+            if path.name < cutoff:
+                try:
+                    path.unlink()
+                except OSError:
+                    logger.warning("Could not remove old OSD segment %s", path)
+
+    def _close(self) -> None:
+        gz, raw = self._gz, self._raw
+        self._gz = self._raw = None
+        try:
+            if gz is not None:
+                gz.close()
+        except OSError:
+            pass
+        finally:
+            if raw is not None:
+                raw.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"records": self.records, "errors": self.errors}
+
+
+def _decompress(data: bytes) -> bytes:
+    # Concatenated gzip members (one per writer session); a truncated final
+    # member yields whatever was sync-flushed before the cut.
+    out: list[bytes] = []
+    while data:
+        d = zlib.decompressobj(wbits=31)
+        try:
+            out.append(d.decompress(data))
+        except zlib.error:
+            break
+        if not d.eof:
+            break
+        data = d.unused_data
+    return b"".join(out)
+
+
+def read_segment(path: Path) -> Iterator[OsdRecord]:
+    """Yield the records of one segment, stopping quietly at a truncated tail."""
+    buf = memoryview(_decompress(Path(path).read_bytes()))
+    size = len(buf)
+    pos = 0
+    unpack = _HEADER.unpack_from
+    header_size = _HEADER.size
+    while pos + header_size <= size:
+        ts_ms, topic_len, payload_len = unpack(buf, pos)
+        pos += header_size
+        end = pos + topic_len + payload_len
+        if end > size:
+            logger.warning("OSD segment %s ends early", Path(path).name)
+            return
+        topic = bytes(buf[pos:pos + topic_len]).decode("utf-8", errors="replace")
+        yield OsdRecord(ts_ms, topic, bytes(buf[pos + topic_len:end]))
+        pos = end
+
+
+def segments_for_range(directory: Path, start: dt.date | None, end: dt.date | None) -> list[Path]:
+    """Segment files that may hold records in [start, end].
+
+    A segment never spans local midnight, so its name (its first record's day)
+    is enough to select it.
+    """
+    paths = sorted(Path(directory).glob(SEGMENT_GLOB))
+    lo = start.strftime("osd-%Y%m%d") if start else ""
+    hi = (end + dt.timedelta(days=1)).strftime("osd-%Y%m%d") if end else "~"
+    return [p for p in paths if lo <= p.name < hi]
+
+
+def _chain(paths: list[Path]) -> Iterator[OsdRecord]:
+    for path in paths:
+        yield from read_segment(path)
+
+
+def iter_records(paths: Iterable[Path]) -> Iterator[OsdRecord]:
+    """Merge segments into one stream ordered by timestamp.
+
+    Segments of one writer process follow each other, so only the streams of
+    different processes are merged; one segment per process is in memory.
+    """
+    by_day: dict[str, dict[str, list[Path]]] = {}
+    for path in sorted(paths, key=lambda p: p.name):
+        # osd-<YYYYmmdd>T<HHMMSS>-<pid>-<seq>.rec.gz
+        parts = path.name.split("-")
+        day, writer = parts[1][:8], parts[2] if len(parts) > 3 else ""
+        by_day.setdefault(day, {}).setdefault(writer, []).append(path)
+    for day in sorted(by_day):
+        writers = list(by_day[day].values())
+        if len(writers) == 1:
+            yield from _chain(writers[0])
+        else:
+            yield from heapq.merge(*(_chain(w) for w in writers), key=lambda r: r.ts_ms)
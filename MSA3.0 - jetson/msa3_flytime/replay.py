@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from .db import ReplayedDay, SqliteStore
+from .extract import FIELD_BYTES, TotalFlightTimeExtractor
+from .mqtt_client import _extract_drone_sn_from_topic
+from .recorder import OsdRecord
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReplayStats:
+    records: int = 0
+    totals: int = 0
+    skipped: int = 0
+    day_rows: int = 0
+    transactions: int = 0
+    elapsed_s: float = 0.0
+
+
+def _day_bounds_ms(day: dt.date) -> tuple[int, int]:
+    start = dt.datetime.combine(day, dt.time())
+    end = start + dt.timedelta(days=1)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def replay_records(
+    store: SqliteStore,
+    records: Iterable[OsdRecord],
+    start: dt.date | None = None,
+    end: dt.date | None = None,
+    batch_rows: int = 20000,
+) -> ReplayStats:
+    """Re-derive t_fly_time day rows from a time-ordered record stream.
+
+    Only the first and last total per drone per day are kept. Every payload
+    is parsed, so one that names the field but carries no usable value (null,
+    truncated) is skipped instead of hiding the day's last good total.
+    Finished days are written with merge_replayed_days, at least
+    ``batch_rows`` rows per transaction.
+    """
+    stats = ReplayStats()
+    extractor = TotalFlightTimeExtractor()
+    # (sn, day) -> [first_total, last_ts_ms, last_total]
+    pending: dict[tuple[str, dt.date], list] = {}
+    day: dt.date | None = None
+    day_lo = day_hi = 0
+    t0 = time.perf_counter()
+
+    def flush() -> None:
+        rows: list[ReplayedDay] = []
+        for (sn, row_day), (first_total, last_ts_ms, last_total) in pending.items():
+            rows.append(
+                ReplayedDay(
+                    drone_sn=sn,
+                    day=row_day,
+                    last_at=dt.datetime.fromtimestamp(last_ts_ms / 1000.0),
+                    first_total=first_total,
+                    last_total=last_total,
+                )
+            )
+        pending.clear()
+        if rows:
+            stats.day_rows += store.merge_replayed_days(rows)
+            stats.transactions += 1
+
+    for rec in records:
+        stats.records += 1
+        ts_ms = rec.ts_ms
+        if not day_lo <= ts_ms < day_hi:
+            new_day = dt.datetime.fromtimestamp(ts_ms / 1000.0).date()
+            if new_day != day and len(pending) >= batch_rows:
+                # Every pending row belongs to a finished day (the stream is ordered).
+                flush()
+            day = new_day
+            day_lo, day_hi = _day_bounds_ms(day)
+        if (start is not None and day < start) or (end is not None and day > end):
+            stats.skipped += 1
+            continue
+
+        drone_sn = _extract_drone_sn_from_topic(rec.topic)
+        if not drone_sn or FIELD_BYTES not in rec.payload:
+            stats.skipped += 1
+            continue
+
+        total = extractor.extract(drone_sn, rec.payload)
+        if total is None:
+            stats.skipped += 1
+            continue
+        total_int = int(round(float(total)))
+        entry = pending.get((drone_sn, day))
+        if entry is None:
+            pending[(drone_sn, day)] = [total_int, ts_ms, total_int]
+        else:
+            entry[1] = ts_ms
+            entry[2] = total_int
+        stats.totals += 1
+
+    flush()
+    stats.elapsed_s = round(time.perf_counter() - t0, 3)
+    return stats
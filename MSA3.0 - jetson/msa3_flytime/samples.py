@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+from .db import SampleBlock, SqliteStore
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_ADDED = REGISTRY.counter("msa3_flight_samples_total", "Flight samples buffered for the sample store.")
+SAMPLE_BYTES = REGISTRY.counter("msa3_flight_sample_bytes_total", "Encoded flight sample bytes written.")
+SAMPLE_FLUSH_SECONDS = REGISTRY.histogram("msa3_flight_sample_flush_seconds", "Sample store flush time in seconds.")
+SAMPLES_PENDING = REGISTRY.gauge("msa3_flight_samples_pending", "Flight samples buffered in memory.")
+
+_HOUR_MS = 3600 * 1000
+
+
+# -- block encoding --
+#
+# A block's data is one or more segments, each appended by one flush:
+#   varint count, varint first ts (ms after hour_start), zigzag varint first total,
+#   then count-1 pairs of (varint ts delta ms, zigzag varint total delta).
+# A drone flying reports a new total about once a second: ~3 bytes per sample.
+
+
+def _put_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def encode_segment(hour_start: int, ts_ms: Sequence[int], totals: Sequence[int]) -> bytes:
+    out = bytearray()
+    _put_varint(out, len(ts_ms))
+    prev_ts = max(ts_ms[0], hour_start * 1000)
+    prev_total = totals[0]
+    _put_varint(out, prev_ts - hour_start * 1000)
+    _put_varint(out, _zigzag(prev_total))
+    for i in range(1, len(ts_ms)):
+        ts = max(ts_ms[i], prev_ts)  # a clock step back must not go negative
+        _put_varint(out, ts - prev_ts)
+        _put_varint(out, _zigzag(totals[i] - prev_total))
+        prev_ts, prev_total = ts, totals[i]
+    return bytes(out)
+
+
+def decode_block(hour_start: int, data: bytes) -> Iterator[tuple[int, int]]:
+    """Yield (ts_ms, total) for every sample in a block, in append order."""
+    pos = 0
+    end = len(data)
+
+    def varint() -> int:
+        nonlocal pos
+        shift = result = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    while pos < end:
+        count = varint()
+        ts = hour_start * 1000 + varint()
+        total = _unzigzag(varint())
+        yield ts, total
+        for _ in range(count - 1):
+            ts += varint()
+            total += _unzigzag(varint())
+            yield ts, total
+
+
+# -- sessions --
+
+
+@dataclass(frozen=True)
+class FlightSession:
+    drone_sn: str
+    start_at: dt.datetime
+    end_at: dt.datetime
+    start_total: int
+    end_total: int
+    seconds: int
+
+
+def detect_sessions(drone_sn: str, samples: Sequence[tuple[int, int]], gap_s: float) -> list[FlightSession]:
+    """Turn (ts_ms, total) samples into flights.
+
+    Each rise of the total between two samples is flight time ending at the
+    later sample and lasting the rise (at most the time between them, so a
+    drone that went quiet mid-flight is not stretched). Flight intervals less
+    than ``gap_s`` apart are one session. Falls (odometer resets) are skipped.
+    """
+    gap_ms = gap_s * 1000
+    spans: list[list[int]] = []  # [start_ms, end_ms, start_total, end_total, seconds]
+    for (ta, va), (tb, vb) in zip(samples, samples[1:]):
+        rise = vb - va
+        if rise <= 0:
+            continue
+        start = tb - min(rise * 1000, tb - ta)
+        if spans and start - spans[-1][1] <= gap_ms:
+            span = spans[-1]
+            span[1], span[3], span[4] = tb, vb, span[4] + rise
+        else:
+            spans.append([start, tb, va, vb, rise])
+    return [
+        FlightSession(
+            drone_sn=drone_sn,
+            start_at=dt.datetime.fromtimestamp(s[0] / 1000.0),
+            end_at=dt.datetime.fromtimestamp(s[1] / 1000.0),
+            start_total=s[2],
+            end_total=s[3],
+            seconds=s[4],
+        )
+        for s in spans
+    ]
+
+
+class FlightSampler:
+    """Optional store of every total change per drone, for flight sessions.
+
+    MqttRunner adds a (time, total) sample whenever a drone's total changes.
+    Samples are buffered in per drone-hour arrays and appended to
+    t_flight_sample as delta-encoded segments every ``flush_interval`` seconds
+    (run_forever); queries see buffered samples too.
+    """
+
+    def __init__(self, store: SqliteStore, flush_interval: float = 300.0, session_gap: float = 60.0):
+        self._store = store
+        self._flush_interval = max(1.0, flush_interval)
+        self.session_gap = session_gap
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (drone_sn, hour_start) -> (ts_ms, totals)
+        self._buf: dict[tuple[str, int], tuple[array, array]] = {}
+        # Being written by flush(); still visible to queries until committed.
+        self._flushing: dict[tuple[str, int], tuple[array, array]] = {}
+        self._pending = 0
+        SAMPLES_PENDING.set_callback(lambda: self._pending)
+
+    def add(self, drone_sn: str, at: dt.datetime, total: int) -> None:
+        ts_ms = int(at.timestamp() * 1000)
+        key = (drone_sn, ts_ms // _HOUR_MS * 3600)
+        with self._lock:
+            arrays = self._buf.get(key)
+            if arrays is None:
+                arrays = self._buf[key] = (array("q"), array("q"))
+            arrays[0].append(ts_ms)
+            arrays[1].append(total)
+            self._pending += 1
+        SAMPLES_ADDED.inc()
+
+    def flush(self) -> int:
+        """Write buffered samples; returns the number of samples written."""
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._buf = self._buf, {}
+            if not self._flushing:
+                return 0
+            t0 = time.perf_counter()
+            blocks = [
+                SampleBlock(sn, hour, len(ts), encode_segment(hour, ts, totals))
+                for (sn, hour), (ts, totals) in self._flushing.items()
+            ]
+            count = sum(b.sample_count for b in blocks)
+            try:
+                self._store.append_sample_blocks(blocks)
+            except Exception:
+                # Keep the samples for the next flush (ahead of newer ones).
+                with self._lock:
+                    for key, (ts, totals) in self._flushing.items():
+                        newer = self._buf.get(key)
+                        if newer is not None:
+                            ts.extend(newer[0])
+                            totals.extend(newer[1])
+                        self._buf[key] = (ts, totals)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+                self._pending -= count
+            SAMPLE_BYTES.inc(sum(len(b.data) for b in blocks))
+            SAMPLE_FLUSH_SECONDS.observe(time.perf_counter() - t0)
+            return count
+
+    def run_forever(self, stop_event: threading.Event) -> None:
+        try:
+            while not stop_event.wait(self._flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Flight sample flush failed")
+        finally:
+            self.flush()
+
+    def samples(
+        self, start_ms: int, end_ms: int, drone_sns: list[str] | None = None
+    ) -> dict[str, list[tuple[int, int]]]:
+        """(ts_ms, total) per drone with start_ms <= ts_ms < end_ms, stored and buffered."""
+        wanted = set(drone_sns) if drone_sns else None
+        first_hour = start_ms // _HOUR_MS * 3600
+        last_hour = (end_ms - 1) // _HOUR_MS * 3600
+        with self._lock:
+            buffered = [
+                (key, arrays[0].tolist(), arrays[1].tolist())
+                for source in (self._flushing, self._buf)
+                for key, arrays in source.items()
+                if first_hour <= key[1] <= last_hour and (wanted is None or key[0] in wanted)
+            ]
+        out: dict[str, list[tuple[int, int]]] = {}
+        for block in self._store.list_sample_blocks(first_hour, last_hour, drone_sns):
+            out.setdefault(block.drone_sn, []).extend(decode_block(block.hour_start, block.data))
+        for (sn, _), ts, totals in buffered:
+            out.setdefault(sn, []).extend(zip(ts, totals))
+        for sn, rows in out.items():
+            rows.sort()
+            out[sn] = [r for r in rows if start_ms <= r[0] < end_ms]
+        return out
+
+    def sessions(
+        self, start: dt.date, end: dt.date, drone_sns: list[str] | None = None
+    ) -> list[FlightSession]:
+        """Sessions overlapping [start, end], ordered by drone then start time."""
+        lo = int(dt.datetime.combine(start, dt.time()).timestamp() * 1000)
+        hi = int(dt.datetime.combine(end + dt.timedelta(days=1), dt.time()).timestamp() * 1000)
+        # Read a little past both ends so sessions crossing midnight stay whole.
+        margin = int(self.session_gap * 1000) + _HOUR_MS
+        found: list[FlightSession] = []
+        for sn, rows in sorted(self.samples(lo - margin, hi + margin, drone_sns).items()):
+            for s in detect_sessions(sn, rows, self.session_gap):
+                if s.end_at.timestamp() * 1000 >= lo and s.start_at.timestamp() * 1000 < hi:
+                    found.append(s)
+        return found
@@ -2,56 +2,219 @@ from __future__ import annotations
 
 import datetime as dt
 import logging
+import random
 import threading
 import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
 from .db import SqliteStore
+from .metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
+SCHEDULER_RUN_SECONDS = REGISTRY.histogram(
+    "msa3_scheduler_run_seconds", "Scheduled job run time in seconds.", ["job"]
+)
+SCHEDULER_RUNS = REGISTRY.counter("msa3_scheduler_runs_total", "Scheduled job runs by result.", ["job", "result"])
+SCHEDULER_DEFERRED = REGISTRY.counter(
+    "msa3_scheduler_deferred_total", "Scheduled job runs postponed because ingest was busy.", ["job"]
+)
+SCHEDULER_LAST_OK = REGISTRY.gauge(
+    "msa3_scheduler_last_success_timestamp_seconds", "Unix time of each job's last successful run.", ["job"]
+)
 
-def _next_run_after(now: dt.datetime) -> dt.datetime:
-    """Return next scheduled time at 00:00/06:00/12:00/18:00."""
-    candidates = [0, 6, 12, 18]
-    for h in candidates:
-        t = now.replace(hour=h, minute=0, second=0, microsecond=0)
-        if t > now:
-            return t
-    # next day 00:00
-    next_day = (now + dt.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-    return next_day
+# Cadence: given the time a run finished (or the scheduler started), when to run next.
+Cadence = Callable[[dt.datetime], dt.datetime]
 
+# Wall-clock waits are re-checked at least this often (the clock may be stepped, e.g. NTP at boot).
+_MAX_WAIT_S = 60.0
 
-class InitDailyScheduler:
-    def __init__(self, store: SqliteStore, stop_event: threading.Event):
-        self._store = store
+
+def at_hours(*hours: int) -> Cadence:
+    """Run at the start of each of ``hours`` (local time)."""
+    ordered = sorted(hours)
+
+    def next_run(now: dt.datetime) -> dt.datetime:
+        for h in ordered:
+            t = now.replace(hour=h, minute=0, second=0, microsecond=0)
+            if t > now:
+                return t
+        next_day = now + dt.timedelta(days=1)
+        return next_day.replace(hour=ordered[0], minute=0, second=0, microsecond=0)
+
+    return next_run
+
+
+def every(seconds: float) -> Cadence:
+    def next_run(now: dt.datetime) -> dt.datetime:
+        return now + dt.timedelta(seconds=seconds)
+
+    return next_run
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    # None: run once at startup only (with run_on_start).
+    cadence: Cadence | None
+    # Up to this many seconds are added to each run time, so jobs spread out.
+    jitter: float = 0.0
+    # Postponed while ingest is busy (up to the scheduler's max_defer).
+    deferrable: bool = True
+    run_on_start: bool = False
+    next_at: dt.datetime | None = field(default=None, init=False)
+    deferred_since: dt.datetime | None = field(default=None, init=False)
+
+
+class Scheduler:
+    """Runs registered jobs on one thread, each on its own cadence.
+
+    Sleeps with ``stop_event.wait`` until the next job is due. A deferrable
+    job that comes due while ``busy()`` is true is retried every
+    ``defer_retry`` seconds, and runs anyway once it has waited ``max_defer``.
+    """
+
+    def __init__(
+        self,
+        stop_event: threading.Event,
+        busy: Callable[[], bool] | None = None,
+        max_defer: float = 3600.0,
+        defer_retry: float = 30.0,
+    ):
         self._stop = stop_event
+        self._busy = busy
+        self._max_defer = max_defer
+        self._defer_retry = defer_retry
+        self._jobs: list[Job] = []
 
-    def run_forever(self) -> None:
-        # Run once on startup.
+    def add(self, job: Job) -> Job:
+        self._jobs.append(job)
+        return job
+
+    @property
+    def jobs(self) -> list[Job]:
+        return list(self._jobs)
+
+    def _schedule(self, job: Job, now: dt.datetime) -> dt.datetime | None:
+        if job.cadence is None:
+            return None
+        at = job.cadence(now)
+        if job.jitter > 0:
+            at += dt.timedelta(seconds=random.uniform(0, job.jitter))
+        return at
+
+    def _run(self, job: Job) -> None:
+        t0 = time.perf_counter()
         try:
-            inserted = self._store.init_today_for_all_drones(dt.datetime.now())
-            logger.info("Init daily rows on startup inserted=%s", inserted)
+            result = job.func()
+            SCHEDULER_RUNS.inc(labels=(job.name, "ok"))
+            SCHEDULER_LAST_OK.set(time.time(), (job.name,))
+            logger.info("Job %s done result=%s elapsed_s=%.3f", job.name, result, time.perf_counter() - t0)
         except Exception:
-            logger.exception("Init daily rows on startup failed")
+            SCHEDULER_RUNS.inc(labels=(job.name, "error"))
+            logger.exception("Job %s failed", job.name)
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - t0, (job.name,))
+
+    def _should_defer(self, job: Job, now: dt.datetime) -> bool:
+        if not job.deferrable or self._busy is None or not self._busy():
+            return False
+        if job.deferred_since is None:
+            job.deferred_since = now
+        return (now - job.deferred_since).total_seconds() < self._max_defer
+
+    def run_forever(self) -> None:
+        now = dt.datetime.now()
+        for job in self._jobs:
+            if job.run_on_start:
+                self._run(job)
+            job.next_at = self._schedule(job, now)
 
         while not self._stop.is_set():
-            now = dt.datetime.now()
-            nxt = _next_run_after(now)
-            sleep_seconds = (nxt - now).total_seconds()
-
-            # Sleep in small chunks so stop_event is responsive.
-            remaining = max(0.0, sleep_seconds)
-            while remaining > 0 and not self._stop.is_set():
-                chunk = min(remaining, 5.0)
-                time.sleep(chunk)
-                remaining -= chunk
-
-            if self._stop.is_set():
+            due = [j.next_at for j in self._jobs if j.next_at is not None]
+            if not due:
+                self._stop.wait()
                 break
+            delay = (min(due) - dt.datetime.now()).total_seconds()
+            if delay > 0 and self._stop.wait(min(delay, _MAX_WAIT_S)):
+                break
+
+            for job in self._jobs:
+                now = dt.datetime.now()
+                if job.next_at is None or job.next_at > now or self._stop.is_set():
+                    continue
+                if self._should_defer(job, now):
+                    SCHEDULER_DEFERRED.inc(labels=(job.name,))
+                    job.next_at = now + dt.timedelta(seconds=self._defer_retry)
+                    continue
+                job.deferred_since = None
+                self._run(job)
+                job.next_at = self._schedule(job, dt.datetime.now())
+
+
+class InitDailyScheduler(Scheduler):
+    """The service's scheduler: daily rows, archiving and SQLite upkeep.
+
+    Day-row creation is never deferred. Upkeep jobs with an interval of 0
+    are not registered.
+    """
+
+    def __init__(
+        self,
+        store: SqliteStore,
+        stop_event: threading.Event,
+        backfill_days: int = 0,
+        archive_dir: str | None = None,
+        archive_grace_days: int = 35,
+        busy: Callable[[], bool] | None = None,
+        max_defer: float = 3600.0,
+        optimize_s: float = 6 * 3600.0,
+        checkpoint_s: float = 900.0,
+        vacuum_s: float = 24 * 3600.0,
+        vacuum_pages: int = 2048,
+    ):
+        super().__init__(stop_event, busy=busy, max_defer=max_defer)
+        self._store = store
+        self._backfill_days = max(0, backfill_days)
+        self._archive_dir = archive_dir
+        self._archive_grace_days = max(0, archive_grace_days)
+        self._vacuum_pages = max(1, vacuum_pages)
+
+        self.add(Job("init_startup", self._init_on_startup, None, deferrable=False, run_on_start=True))
+        self.add(Job("init_daily", self._init_daily, at_hours(0, 6, 12, 18), deferrable=False))
+        if archive_dir:
+            self.add(Job("archive", self._archive, at_hours(3), jitter=600))
+        for name, func, interval in (
+            ("optimize", store.optimize, optimize_s),
+            ("checkpoint", self._checkpoint, checkpoint_s),
+            ("incremental_vacuum", self._vacuum, vacuum_s),
+        ):
+            if interval > 0:
+                self.add(Job(name, func, every(interval), jitter=interval * 0.1))
+
+    def _init_on_startup(self) -> int:
+        now = dt.datetime.now()
+        if self._backfill_days == 0:
+            return self._store.init_today_for_all_drones(now)
+        # Fill the days the service was down, up to backfill_days back.
+        today = now.date()
+        start = today - dt.timedelta(days=self._backfill_days)
+        last = self._store.get_last_fly_date()
+        if last is not None and last >= start:
+            start = min(today, last + dt.timedelta(days=1))
+        return self._store.init_days_for_all_drones(start, now)
+
+    def _init_daily(self) -> int:
+        return self._store.init_today_for_all_drones(dt.datetime.now())
+
+    def _archive(self) -> list[int]:
+        return self._store.archive_closed_years(
+            self._archive_dir, dt.date.today(), self._archive_grace_days  # type: ignore[arg-type]
+        )
+
+    def _checkpoint(self) -> tuple[int, int, int]:
+        return self._store.checkpoint("TRUNCATE")
 
-            try:
-                inserted = self._store.init_today_for_all_drones(dt.datetime.now())
-                logger.info("Init daily rows inserted=%s", inserted)
-            except Exception:
-                logger.exception("Init daily rows failed")
+    def _vacuum(self) -> int:
+        return self._store.incremental_vacuum(self._vacuum_pages)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+from dataclasses import dataclass
+
+from .db import OsdEvent, SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DroneDayState:
+    drone_sn: str
+    day: dt.date
+    revised: bool
+    today_start_total: int
+    total: int
+
+    @property
+    def today_seconds(self) -> int:
+        return max(0, self.total - self.today_start_total)
+
+
+class DayStateTable:
+    """In-memory mirror of today's t_fly_time rows, keyed by drone SN.
+
+    Lets the OSD path decide without touching SQLite whether a message changes
+    anything. Rebuilt from t_fly_time on first use and whenever the day rolls over.
+    """
+
+    def __init__(self, store: SqliteStore):
+        self._store = store
+        self._day: dt.date | None = None
+        self._known: set[str] = set()
+        self._rows: dict[str, DroneDayState] = {}
+        # observe() runs on the MQTT thread, forget() on the writer thread.
+        self._lock = threading.Lock()
+
+    @property
+    def day(self) -> dt.date | None:
+        return self._day
+
+    def reload(self, day: dt.date) -> None:
+        with self._lock:
+            self._reload(day)
+
+    def _reload(self, day: dt.date) -> None:
+        self._known = {d.drone_sn for d in self._store.list_drones()}
+        self._rows = {
+            r.drone_sn: DroneDayState(
+                drone_sn=r.drone_sn,
+                day=day,
+                revised=bool(r.revised_start_time),
+                today_start_total=r.today_start_total_flight_time,
+                total=r.total_flight_time,
+            )
+            for r in self._store.list_day_rows(day)
+        }
+        self._day = day
+        logger.info("Day state loaded day=%s drones=%s rows=%s", day, len(self._known), len(self._rows))
+
+    def get(self, drone_sn: str) -> DroneDayState | None:
+        return self._rows.get(drone_sn)
+
+    def forget(self, drone_sn: str) -> None:
+        """Drop cached state so the next OSD for this drone is written again."""
+        with self._lock:
+            self._rows.pop(drone_sn, None)
+            self._known.discard(drone_sn)
+
+    def observe(self, drone_sn: str, now: dt.datetime, total: int) -> OsdEvent | None:
+        """Fold an OSD total into the table; return the write it needs, or None."""
+        with self._lock:
+            return self._observe(drone_sn, now, total)
+
+    def _observe(self, drone_sn: str, now: dt.datetime, total: int) -> OsdEvent | None:
+        day = now.date()
+        if self._day != day:
+            self._reload(day)
+
+        new_drone = drone_sn not in self._known
+        state = self._rows.get(drone_sn)
+        if state is not None and state.revised and state.total == total and not new_drone:
+            return None
+
+        first_total: int | None = None
+        if state is None or not state.revised:
+            # First OSD today: the day's start is revised to this total.
+            first_total = total
+            state = DroneDayState(
+                drone_sn=drone_sn, day=day, revised=True, today_start_total=total, total=total
+            )
+            self._rows[drone_sn] = state
+        else:
+            state.total = total
+
+        self._known.add(drone_sn)
+        return OsdEvent(
+            drone_sn=drone_sn, at=now, total=total, first_total=first_total, new_drone=new_drone
+        )
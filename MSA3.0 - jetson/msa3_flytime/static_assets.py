@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+try:  # optional: smaller than gzip for the UI bundle
+    import brotli as _brotli  # type: ignore
+except Exception:  # pragma: no cover
+    _brotli = None
+
+logger = logging.getLogger(__name__)
+
+_COMPRESSIBLE_PREFIXES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    content_type: str
+    etag: str
+    cache_control: str
+    mtime_ns: int
+    # encoding ("identity", "gzip", "br") -> body
+    bodies: dict[str, bytes]
+
+    def select(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accepted.get(encoding, 0.0) > 0:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies["identity"]
+
+
+def _parse_accept_encoding(value: str | None) -> dict[str, float]:
+    result: dict[str, float] = {}
+    if not value:
+        return result
+    for item in value.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            result[name.strip().lower()] = q
+    if "*" in result:
+        for encoding in ("br", "gzip"):
+            result.setdefault(encoding, result["*"])
+    return result
+
+
+def _build_asset(path: Path) -> StaticAsset:
+    data = path.read_bytes()
+    ctype, _ = mimetypes.guess_type(str(path))
+    ctype = ctype or "application/octet-stream"
+    if ctype.startswith("text/") and "charset" not in ctype:
+        ctype += "; charset=utf-8"
+
+    bodies = {"identity": data}
+    if ctype.startswith(_COMPRESSIBLE_PREFIXES) and len(data) > 256:
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gz) < len(data):
+            bodies["gzip"] = gz
+        if _brotli is not None:
+            br = _brotli.compress(data, quality=11)
+            if len(br) < len(data):
+                bodies["br"] = br
+
+    # HTML is not fingerprinted, so browsers revalidate it (cheap 304).
+    cache_control = "no-cache" if ctype.startswith("text/html") else "public, max-age=86400"
+    return StaticAsset(
+        content_type=ctype,
+        etag=hashlib.blake2b(data, digest_size=12).hexdigest(),
+        cache_control=cache_control,
+        mtime_ns=path.stat().st_mtime_ns,
+        bodies=bodies,
+    )
+
+
+class StaticAssets:
+    """The static/ directory held in memory with precompressed variants.
+
+    In dev mode each lookup re-stats the file and reloads it when it changed,
+    so edits show up without restarting the service.
+    """
+
+    def __init__(self, root: Path, dev_mode: bool = False):
+        self._root = root.resolve()
+        self._dev_mode = dev_mode
+        self._assets: dict[str, StaticAsset] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        assets: dict[str, StaticAsset] = {}
+        for path in sorted(self._root.rglob("*")):
+            if path.is_file():
+                assets[path.relative_to(self._root).as_posix()] = _build_asset(path)
+        with self._lock:
+            self._assets = assets
+        logger.info(
+            "Static assets loaded count=%s bytes=%s",
+            len(assets),
+            sum(len(a.bodies["identity"]) for a in assets.values()),
+        )
+
+    def get(self, rel: str) -> StaticAsset | None:
+        if self._dev_mode:
+            return self._get_fresh(rel)
+        return self._assets.get(rel)
+
+    def _get_fresh(self, rel: str) -> StaticAsset | None:
+        path = (self._root / rel).resolve()
+        if self._root not in path.parents or not path.is_file():
+            with self._lock:
+                self._assets.pop(rel, None)
+            return None
+        with self._lock:
+            asset = self._assets.get(rel)
+        if asset is None or asset.mtime_ns != path.stat().st_mtime_ns:
+            asset = _build_asset(path)
+            with self._lock:
+                self._assets[rel] = asset
+        return asset
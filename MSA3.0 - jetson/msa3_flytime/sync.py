@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Sequence
+from urllib.parse import urlencode
+
+from .db import SqliteStore
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SYNC_PULL_SECONDS = REGISTRY.histogram("msa3_sync_pull_seconds", "Time to pull one node to its head.", ["node"])
+SYNC_ROWS = REGISTRY.counter("msa3_sync_rows_total", "Rows merged from each node.", ["node", "table"])
+SYNC_BYTES = REGISTRY.counter("msa3_sync_bytes_total", "Response bytes received from each node.", ["node"])
+SYNC_ERRORS = REGISTRY.counter("msa3_sync_errors_total", "Failed pulls by node.", ["node"])
+SYNC_LAST_OK = REGISTRY.gauge(
+    "msa3_sync_last_success_timestamp_seconds", "Unix time each node was last pulled to its head.", ["node"]
+)
+
+BEGIN_PATH = "/api/sync/begin"
+CHANGES_PATH = "/api/sync/changes"
+
+# Responses smaller than this are sent uncompressed.
+_GZIP_MIN_BYTES = 1024
+
+
+def encode_changes(data: dict[str, Any], accept_encoding: str | None) -> tuple[bytes, str]:
+    """(body, content encoding) of a changes_since batch; gzip when the client takes it."""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(body) >= _GZIP_MIN_BYTES and "gzip" in (accept_encoding or "").lower():
+        return gzip.compress(body, 6), "gzip"
+    return body, "identity"
+
+
+class SyncAggregator:
+    """Pulls every site's changed rows into the local database.
+
+    Each pull first POSTs /api/sync/begin, which fixes the node's head, then
+    asks for rows changed after the watermark, in batches of ``batch`` rows,
+    up to that head; nodes are pulled in parallel
+    and each batch is merged in one write transaction (apply_sync_batch), so
+    an interrupted pull resumes where it stopped. A node whose database was
+    replaced (new node_id) is pulled again from the start.
+    """
+
+    def __init__(
+        self, store: SqliteStore, nodes: Sequence[tuple[str, str]], batch: int = 5000, timeout: float = 30.0
+    ):
+        self._store = store
+        self._nodes = list(nodes)
+        self._batch = max(1, batch)
+        self._timeout = timeout
+
+    def _begin(self, url: str) -> dict[str, Any]:
+        req = urllib.request.Request(f"{url}{BEGIN_PATH}", data=b"", method="POST")
+        with urllib.request.urlopen(req, timeout=self._timeout) as resp:
+            return json.loads(resp.read())
+
+    def _fetch(self, node: str, url: str, since: int) -> dict[str, Any]:
+        query = urlencode({"since": since, "limit": self._batch})
+        req = urllib.request.Request(f"{url}{CHANGES_PATH}?{query}", headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(req, timeout=self._timeout) as resp:
+            body = resp.read()
+            encoding = resp.headers.get("Content-Encoding", "identity")
+        SYNC_BYTES.inc(len(body), (node,))
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def pull(self, node: str, url: str) -> int:
+        """Pull ``node`` up to the head its /api/sync/begin reported; returns the rows merged.
+
+        Later changes wait for the next pull, so a busy node cannot keep one
+        pull going forever.
+        """
+        t0 = time.perf_counter()
+        node_id, since = self._store.sync_watermark(node)
+        rows = 0
+        try:
+            begin = self._begin(url)
+            if node_id is not None and begin["node_id"] != node_id and since > 0:
+                logger.warning("Sync node %s has a new database (%s); pulling from the start", node, begin["node_id"])
+                since = 0
+            node_id, target = begin["node_id"], int(begin["head"])
+            while since < target:
+                batch = self._fetch(node, url, since)
+                if batch["node_id"] != node_id:
+                    raise RuntimeError(f"node database changed during the pull ({batch['node_id']})")
+                rows += self._store.apply_sync_batch(node, url, batch)
+                SYNC_ROWS.inc(len(batch["drones"]["drone_sn"]), (node, "t_drone"))
+                SYNC_ROWS.inc(len(batch["days"]["drone_sn"]), (node, "t_fly_time"))
+                since = int(batch["next"])
+                if not batch["more"]:
+                    break
+        except Exception as e:
+            SYNC_ERRORS.inc(labels=(node,))
+            try:
+                self._store.record_sync_error(node, url, f"{type(e).__name__}: {e}")
+            except Exception:
+                logger.exception("Could not record sync error for %s", node)
+            raise
+        SYNC_LAST_OK.set(time.time(), (node,))
+        SYNC_PULL_SECONDS.observe(time.perf_counter() - t0, (node,))
+        return rows
+
+    def pull_all(self) -> dict[str, Any]:
+        """Pull every node; returns rows merged (or the error) per node."""
+        if not self._nodes:
+            return {}
+        results: dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=len(self._nodes), thread_name_prefix="sync") as pool:
+            futures = {node: pool.submit(self.pull, node, url) for node, url in self._nodes}
+            for node, future in futures.items():
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    logger.warning("Sync pull from %s failed: %s", node, e)
+                    results[node] = f"error: {e}"
+        return results
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Callable
+
+from .config import Config
+from .db import OsdEvent, SqliteStore
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_DEPTH = REGISTRY.gauge("msa3_ingest_queue_depth", "Drone-days waiting in the OSD writer.")
+INGEST_BATCH_SIZE = REGISTRY.histogram(
+    "msa3_ingest_batch_size", "Events per OSD writer commit.", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+INGEST_COMMIT_SECONDS = REGISTRY.histogram("msa3_ingest_commit_seconds", "OSD writer batch commit time in seconds.")
+INGEST_EVENTS = REGISTRY.counter(
+    "msa3_ingest_events_total", "OSD writer events by fate (coalesced, dropped, failed, written).", ["fate"]
+)
+
+
+def _merge(older: OsdEvent, newer: OsdEvent) -> OsdEvent:
+    # Keep the day's first total (it revises today's start) and the newest total.
+    return replace(
+        newer,
+        first_total=older.first_total if older.first_total is not None else newer.first_total,
+        new_drone=older.new_drone or newer.new_drone,
+    )
+
+
+class OsdWriter:
+    """Group-commit stage between the MQTT thread and SqliteStore.
+
+    Holds at most one pending event per drone per day: a newer total for a
+    drone that is still queued replaces the queued one. When ``max_pending``
+    distinct drones are queued, submit() blocks up to ``put_timeout`` seconds
+    and then drops the event (the caller should forget its state).
+
+    With ``min_flush`` > 0 a drone-day's total is written at most once per
+    ``min_flush`` seconds (the first OSD of the day and new drones are not
+    held back), trading that much durability for fewer page writes.
+    """
+
+    def __init__(
+        self,
+        store: SqliteStore,
+        max_pending: int,
+        batch_size: int,
+        linger: float,
+        put_timeout: float,
+        on_failed: Callable[[OsdEvent], None] | None = None,
+        min_flush: float = 0.0,
+    ):
+        self._store = store
+        self._max_pending = max(1, max_pending)
+        self._batch_size = max(1, batch_size)
+        self._linger = max(0.0, linger)
+        self._put_timeout = max(0.0, put_timeout)
+        self._on_failed = on_failed
+        self._min_flush = max(0.0, min_flush)
+
+        self._pending: OrderedDict[tuple[str, dt.date], OsdEvent] = OrderedDict()
+        # (drone_sn, day) -> monotonic time of its last write; only kept within min_flush.
+        self._flushed_at: dict[tuple[str, dt.date], float] = {}
+        self._cond = threading.Condition()
+
+        self._submitted = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+        self._written = 0
+        self._max_depth = 0
+        self._last_batch_size = 0
+        self._last_commit_ms = 0.0
+        self._max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+        self._last_submit = 0.0
+
+        INGEST_QUEUE_DEPTH.set_callback(lambda: len(self._pending))
+
+    @classmethod
+    def from_config(
+        cls,
+        cfg: Config,
+        store: SqliteStore,
+        on_failed: Callable[[OsdEvent], None] | None = None,
+    ) -> "OsdWriter":
+        return cls(
+            store,
+            max_pending=cfg.ingest_queue_max,
+            batch_size=cfg.ingest_batch_size,
+            linger=cfg.ingest_linger_ms / 1000.0,
+            put_timeout=cfg.ingest_put_timeout_ms / 1000.0,
+            on_failed=on_failed,
+            min_flush=cfg.ingest_min_flush_s,
+        )
+
+    def submit(self, event: OsdEvent) -> bool:
+        key = (event.drone_sn, event.at.date())
+        with self._cond:
+            self._submitted += 1
+            self._last_submit = time.monotonic()
+            older = self._pending.get(key)
+            if older is not None:
+                self._pending[key] = _merge(older, event)
+                self._coalesced += 1
+                INGEST_EVENTS.inc(labels=("coalesced",))
+                return True
+
+            if len(self._pending) >= self._max_pending:
+                deadline = time.monotonic() + self._put_timeout
+                while len(self._pending) >= self._max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._dropped += 1
+                        INGEST_EVENTS.inc(labels=("dropped",))
+                        return False
+                    self._cond.wait(remaining)
+
+            self._pending[key] = event
+            self._max_depth = max(self._max_depth, len(self._pending))
+            self._cond.notify_all()
+            return True
+
+    def _take_batch(self, stop_event: threading.Event) -> list[OsdEvent]:
+        with self._cond:
+            while not self._pending and not stop_event.is_set():
+                self._cond.wait(0.5)
+            if not self._pending:
+                return []
+
+            # Linger so bursts from many drones share one commit.
+            deadline = time.monotonic() + self._linger
+            while len(self._pending) < self._batch_size and not stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if self._min_flush > 0:
+                return self._take_due(stop_event)
+
+            batch: list[OsdEvent] = []
+            while self._pending and len(batch) < self._batch_size:
+                _, ev = self._pending.popitem(last=False)
+                batch.append(ev)
+            self._cond.notify_all()
+            return batch
+
+    def _take_due(self, stop_event: threading.Event) -> list[OsdEvent]:
+        # Caller holds self._cond. Waits until some pending drone-day is due.
+        while True:
+            now = time.monotonic()
+            cutoff = now - self._min_flush
+            for key in [k for k, t in self._flushed_at.items() if t <= cutoff]:
+                del self._flushed_at[key]
+
+            stopping = stop_event.is_set()
+            due: list[tuple[str, dt.date]] = []
+            for key, ev in self._pending.items():
+                if (
+                    stopping
+                    or key not in self._flushed_at
+                    or ev.first_total is not None
+                    or ev.new_drone
+                ):
+                    due.append(key)
+                    if len(due) >= self._batch_size:
+                        break
+            if due or not self._pending:
+                batch = [self._pending.pop(key) for key in due]
+                for key in due:
+                    self._flushed_at[key] = now
+                self._cond.notify_all()
+                return batch
+
+            # Everything pending was written recently: wait for the oldest to come due.
+            wait = min(self._flushed_at[k] for k in self._pending) + self._min_flush - now
+            self._cond.wait(max(0.01, min(wait, 0.5)))
+
+    def run_forever(self, stop_event: threading.Event) -> None:
+        last_log = time.monotonic()
+        while True:
+            batch = self._take_batch(stop_event)
+            if not batch:
+                if stop_event.is_set():
+                    break
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                self._store.apply_osd(batch)
+            except Exception:
+                logger.exception("OSD batch commit failed size=%s", len(batch))
+                with self._cond:
+                    self._failed += len(batch)
+                INGEST_EVENTS.inc(len(batch), ("failed",))
+                if self._on_failed is not None:
+                    for ev in batch:
+                        self._on_failed(ev)
+                continue
+            elapsed = time.perf_counter() - t0
+            elapsed_ms = elapsed * 1000.0
+            INGEST_COMMIT_SECONDS.observe(elapsed)
+            INGEST_BATCH_SIZE.observe(len(batch))
+            INGEST_EVENTS.inc(len(batch), ("written",))
+
+            with self._cond:
+                self._batches += 1
+                self._written += len(batch)
+                self._last_batch_size = len(batch)
+                self._last_commit_ms = elapsed_ms
+                self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
+                self._total_commit_ms += elapsed_ms
+
+            if time.monotonic() - last_log >= 60.0:
+                last_log = time.monotonic()
+                logger.info("OSD writer stats %s", self.stats())
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last submitted event (inf before the first)."""
+        last = self._last_submit
+        return time.monotonic() - last if last else float("inf")
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._pending),
+                "queue_max_depth": self._max_depth,
+                "queue_capacity": self._max_pending,
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "written": self._written,
+                "batches": self._batches,
+                "last_batch_size": self._last_batch_size,
+                "avg_batch_size": round(self._written / self._batches, 2) if self._batches else 0.0,
+                "last_commit_ms": round(self._last_commit_ms, 3),
+                "max_commit_ms": round(self._max_commit_ms, 3),
+                "avg_commit_ms": round(self._total_commit_ms / self._batches, 3) if self._batches else 0.0,
+            }